@@ -0,0 +1,275 @@
+import hashlib
+import json
+import os
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+import numpy as np
+
+# Topic analytics over classified event histories. Events are reduced to integer codes (day, label
+# pair, event type) and counted into a dense [days, pairs, types] array; every report (per-day/week
+# distributions, shorts vs feed shares, drift between windows) is a group-by over that array.
+# The state is kept in one .npz so new exports only add their unseen events:
+#   pair_t0 / pair_t1  -> label pair table (codes are append-only; t1 '' = parent-only)
+#   type_names         -> event type table ('feed_video', 'shorts_video', ...)
+#   counts             -> int64 [days, pairs, types], day 0 = day0 (days since epoch at utc_offset)
+#   seen               -> sorted uint64 hashes of counted events, so overlapping exports count once
+#   files              -> JSON {path: [size, mtime_ns]} of exports already read in full
+# Events whose title has no classification are not marked seen; a later run with tags counts them.
+
+STATE_VERSION = 1
+DAY_MS = 86400000
+_EMPTY_HASHES = np.zeros(0, dtype=np.uint64)
+
+
+def event_hash(ev: Dict[str, Any]) -> int:
+    key = f"{ev.get('ts')}\x1f{ev.get('type')}\x1f{ev.get('videoId')}\x1f{ev.get('page')}\x1f{ev.get('title')}"
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def _js_divergence(p: np.ndarray, q: np.ndarray) -> np.ndarray:
+    # Jensen-Shannon divergence (base 2, in [0, 1]) between row distributions
+    m = 0.5 * (p + q)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        kl = lambda a: np.where(a > 0, a * np.log2(a / m), 0.0).sum(axis=-1)
+        return 0.5 * kl(p) + 0.5 * kl(q)
+
+
+def _normalize_rows(x: np.ndarray) -> np.ndarray:
+    total = x.sum(axis=-1, keepdims=True)
+    return np.divide(x, total, out=np.zeros_like(x, dtype=np.float64), where=total > 0)
+
+
+def _day_str(day: int) -> str:
+    return str(np.datetime64(int(day), 'D'))
+
+
+class TopicState:
+    def __init__(self, utc_offset_minutes: int = 0):
+        self.utc_offset_minutes = utc_offset_minutes
+        self.pairs: List[Tuple[str, str]] = []
+        self.types: List[str] = []
+        self.day0 = 0
+        self.counts = np.zeros((0, 0, 0), dtype=np.int64)
+        self.seen = _EMPTY_HASHES
+        self.files: Dict[str, List[int]] = {}
+        self._pair_index: Dict[Tuple[str, str], int] = {}
+        self._type_index: Dict[str, int] = {}
+
+    @classmethod
+    def load(cls, path: str, utc_offset_minutes: int = 0) -> 'TopicState':
+        state = cls(utc_offset_minutes)
+        if not os.path.exists(path):
+            return state
+        with np.load(path) as z:
+            if int(z['version']) != STATE_VERSION:
+                raise ValueError(f"Unsupported analytics state version {int(z['version'])} in {path}")
+            if int(z['utc_offset_minutes']) != utc_offset_minutes:
+                raise ValueError(f"{path} was built with utc_offset_minutes={int(z['utc_offset_minutes'])}; rebuild it (--restart) to change the day boundary")
+            state.pairs = list(zip(z['pair_t0'].tolist(), z['pair_t1'].tolist()))
+            state.types = z['type_names'].tolist()
+            state.day0 = int(z['day0'])
+            state.counts = z['counts']
+            state.seen = z['seen']
+            state.files = json.loads(str(z['files']))
+        state._pair_index = {p: i for i, p in enumerate(state.pairs)}
+        state._type_index = {t: i for i, t in enumerate(state.types)}
+        return state
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with open(tmp, 'wb') as f:
+            np.savez(
+                f,
+                version=np.int64(STATE_VERSION),
+                utc_offset_minutes=np.int64(self.utc_offset_minutes),
+                pair_t0=np.array([p[0] for p in self.pairs], dtype=str),
+                pair_t1=np.array([p[1] for p in self.pairs], dtype=str),
+                type_names=np.array(self.types, dtype=str),
+                day0=np.int64(self.day0),
+                counts=self.counts,
+                seen=self.seen,
+                files=np.array(json.dumps(self.files)),
+            )
+        os.replace(tmp, path)
+
+    @property
+    def events(self) -> int:
+        return int(self.counts.sum())
+
+    def file_done(self, path: str, sig: List[int]) -> bool:
+        return self.files.get(path) == sig
+
+    def _code(self, index: Dict, table: List, key) -> int:
+        c = index.get(key)
+        if c is None:
+            c = index[key] = len(table)
+            table.append(key)
+        return c
+
+    def add_events(self, events: Iterable[Dict[str, Any]], tag_for: Callable[[Dict[str, Any]], Tuple[str, str] | None]) -> Dict[str, int]:
+        # tag_for(event) -> (t0, t1) or None. One Python pass extracts codes; counting is vectorized.
+        ts: List[int] = []
+        hashes: List[int] = []
+        type_codes: List[int] = []
+        pair_codes: List[int] = []
+        stats = {'read': 0, 'invalid': 0, 'unclassified': 0}
+        for ev in events:
+            if not isinstance(ev.get('ts'), (int, float)) or not ev.get('title'):
+                if 'meta' not in ev and 'profile' not in ev:
+                    stats['invalid'] += 1
+                continue
+            stats['read'] += 1
+            pair = tag_for(ev)
+            if pair is None:
+                stats['unclassified'] += 1
+                continue
+            ts.append(int(ev['ts']))
+            hashes.append(event_hash(ev))
+            type_codes.append(self._code(self._type_index, self.types, str(ev.get('type') or '')))
+            pair_codes.append(self._code(self._pair_index, self.pairs, pair))
+
+        h = np.array(hashes, dtype=np.uint64)
+        # Drop repeats within this batch and events counted by earlier runs
+        _, first = np.unique(h, return_index=True)
+        keep = np.zeros(h.shape[0], dtype=bool)
+        keep[first] = True
+        if self.seen.shape[0]:
+            pos = np.minimum(np.searchsorted(self.seen, h), self.seen.shape[0] - 1)
+            keep &= self.seen[pos] != h
+        stats['duplicates'] = int(h.shape[0] - keep.sum())
+        stats['added'] = int(keep.sum())
+        if not stats['added']:
+            return stats
+
+        day = (np.array(ts, dtype=np.int64)[keep] + self.utc_offset_minutes * 60000) // DAY_MS
+        pair = np.array(pair_codes, dtype=np.int64)[keep]
+        etype = np.array(type_codes, dtype=np.int64)[keep]
+        self._grow(int(day.min()), int(day.max()))
+        shape = self.counts.shape
+        flat = ((day - self.day0) * shape[1] + pair) * shape[2] + etype
+        self.counts += np.bincount(flat, minlength=self.counts.size).reshape(shape)
+        self.seen = np.union1d(self.seen, h[keep])
+        return stats
+
+    def _grow(self, lo: int, hi: int):
+        days, pairs, types = self.counts.shape
+        if days == 0:
+            self.day0, days = lo, 0
+        first = min(self.day0, lo)
+        last = max(self.day0 + days - 1, hi)
+        new_shape = (last - first + 1, len(self.pairs), len(self.types))
+        if new_shape == self.counts.shape:
+            return
+        grown = np.zeros(new_shape, dtype=np.int64)
+        at = self.day0 - first
+        grown[at:at + days, :pairs, :types] = self.counts
+        self.counts, self.day0 = grown, first
+
+    def label_codes(self, level: str = 't0') -> Tuple[np.ndarray, List[str]]:
+        # pair code -> level label code, and the label names ('t0' or 't0 > t1')
+        names: List[str] = []
+        index: Dict[str, int] = {}
+        codes = np.array([self._code(index, names, p[0] if level == 't0' or not p[1] else f'{p[0]} > {p[1]}') for p in self.pairs], dtype=np.int64)
+        return codes, names
+
+    def by_label(self, level: str = 't0') -> Tuple[np.ndarray, List[str]]:
+        # counts regrouped to [days, labels, types]
+        codes, names = self.label_codes(level)
+        # Pairs coded after the last count (their events were all duplicates) have no column yet
+        codes = codes[:self.counts.shape[1]]
+        onehot = np.zeros((codes.shape[0], len(names)), dtype=np.int64)
+        onehot[np.arange(codes.shape[0]), codes] = 1
+        return np.einsum('dpt,pl->dlt', self.counts, onehot), names
+
+    def period_starts(self, period: str = 'day') -> np.ndarray:
+        # Absolute start day of each period that has days in the state (weeks start on Monday)
+        days = self.day0 + np.arange(self.counts.shape[0])
+        if period == 'day':
+            return days
+        if period == 'week':
+            # 1970-01-01 was a Thursday
+            return (days + 3) // 7 * 7 - 3
+        raise ValueError(f"Unknown period {period!r}; expected 'day' or 'week'")
+
+    def by_period(self, period: str = 'day', level: str = 't0') -> Tuple[np.ndarray, np.ndarray, List[str]]:
+        # ([periods] start days, [periods, labels, types] counts, label names)
+        counts, names = self.by_label(level)
+        starts = self.period_starts(period)
+        if not starts.shape[0]:
+            return starts, counts, names
+        bounds = np.flatnonzero(np.r_[True, starts[1:] != starts[:-1]])
+        return starts[bounds], np.add.reduceat(counts, bounds, axis=0), names
+
+    def report(self, period: str = 'day', level: str = 't0', window_days: int = 7, top: int = 10) -> Dict[str, Any]:
+        starts, counts, names = self.by_period(period, level)
+        if not starts.shape[0]:
+            return {'events': 0, 'period': period, 'level': level, 'types': {}, 'topics': [], 'periods': [], 'drift': None}
+        per_label = counts.sum(axis=2)                     # [periods, labels]
+        per_type = counts.sum(axis=1)                      # [periods, types]
+        totals = per_label.sum(axis=1)
+        shares = _normalize_rows(per_label)
+        type_shares = _normalize_rows(per_type)
+
+        overall = counts.sum(axis=0)                       # [labels, types]
+        label_totals = overall.sum(axis=1)
+        label_type_share = _normalize_rows(overall)
+        order = np.argsort(-label_totals, kind='stable')
+        topics = [{
+            'label': names[i],
+            'events': int(label_totals[i]),
+            'share': round(float(label_totals[i] / label_totals.sum()), 4),
+            'type_share': {t: round(float(label_type_share[i, j]), 4) for j, t in enumerate(self.types[:per_type.shape[1]])},
+        } for i in order if label_totals[i]]
+
+        # Change of the topic distribution against the previous period with events
+        step_js = np.full(starts.shape[0], np.nan)
+        active = np.flatnonzero(totals)
+        step_js[active[1:]] = _js_divergence(shares[active[1:]], shares[active[:-1]])
+        periods = []
+        for k in range(starts.shape[0]):
+            if not totals[k]:
+                continue
+            best = np.argsort(-per_label[k], kind='stable')[:top]
+            periods.append({
+                'start': _day_str(starts[k]),
+                'events': int(totals[k]),
+                'type_share': {t: round(float(type_shares[k, j]), 4) for j, t in enumerate(self.types[:per_type.shape[1]])},
+                'topics': {names[i]: round(float(shares[k, i]), 4) for i in best if per_label[k, i]},
+                'drift_js': None if np.isnan(step_js[k]) else round(float(step_js[k]), 4),
+            })
+        return {
+            'events': int(totals.sum()),
+            'first_day': _day_str(self.day0),
+            'last_day': _day_str(self.day0 + self.counts.shape[0] - 1),
+            'period': period,
+            'level': level,
+            'types': {t: int(per_type[:, j].sum()) for j, t in enumerate(self.types[:per_type.shape[1]])},
+            'topics': topics[:top] if top else topics,
+            'periods': periods,
+            'drift': self.window_drift(window_days, level, top),
+        }
+
+    def window_drift(self, window_days: int = 7, level: str = 't0', top: int = 10) -> Dict[str, Any] | None:
+        # Last `window_days` days (ending at the newest day) against the `window_days` before them
+        counts, names = self.by_label(level)
+        per_day = counts.sum(axis=2)
+        n = per_day.shape[0]
+        if window_days <= 0 or n == 0:
+            return None
+        cur = per_day[max(0, n - window_days):].sum(axis=0)
+        prev = per_day[max(0, n - 2 * window_days):max(0, n - window_days)].sum(axis=0)
+        p, q = _normalize_rows(cur), _normalize_rows(prev)
+        delta = p - q
+        movers = np.argsort(-np.abs(delta), kind='stable')[:top]
+        last = self.day0 + n - 1
+        return {
+            'window_days': window_days,
+            'current': [_day_str(last - window_days + 1), _day_str(last)],
+            'previous': [_day_str(last - 2 * window_days + 1), _day_str(last - window_days)],
+            'current_events': int(cur.sum()),
+            'previous_events': int(prev.sum()),
+            'js_divergence': round(float(_js_divergence(p, q)), 4) if prev.sum() and cur.sum() else None,
+            'total_variation': round(float(0.5 * np.abs(delta).sum()), 4) if prev.sum() and cur.sum() else None,
+            'movers': [{'label': names[i], 'previous_share': round(float(q[i]), 4), 'current_share': round(float(p[i]), 4), 'delta': round(float(delta[i]), 4)} for i in movers if delta[i]],
+        }
@@ -0,0 +1,127 @@
+import json
+import os
+import shutil
+from typing import Any, Dict, Iterable, List
+
+import numpy as np
+
+# Column-wise result files, an alternative to the JSON document for large and --detail runs.
+# Layout of a result directory:
+#   meta.json          -> {"version", "kind", "rows", "columns": {name: {"dtype", "shape"}}, "labels", "output_format", "run"}
+#   titles.bin         -> UTF-8 titles back to back
+#   title_offsets.bin  -> int64 [rows + 1] byte offsets into titles.bin
+#   <column>.bin       -> raw row-major array [rows, *shape] (little-endian), memory-mapped on load
+# kind is 'joint', 'flat' or 'tree' and decides the columns (see *_columns in tools/apply_titles.py);
+# label names live once in meta.json and columns hold indices into them. The directory is written
+# under a temporary name and renamed on close, so readers never see a partial result.
+
+COLUMNAR_VERSION = 1
+
+
+class ColumnarWriter:
+    def __init__(self, path: str, kind: str, labels: Dict[str, Any], run: Dict[str, Any], output_format: str = 'pair-array'):
+        self.path = path.rstrip('/\\')
+        self.meta: Dict[str, Any] = {'version': COLUMNAR_VERSION, 'kind': kind, 'rows': 0, 'columns': {}, 'labels': labels, 'output_format': output_format, 'run': run}
+        self._tmp = f'{self.path}.{os.getpid()}.tmp'
+        shutil.rmtree(self._tmp, ignore_errors=True)
+        os.makedirs(self._tmp)
+        self._files: Dict[str, Any] = {}
+        self._titles = open(os.path.join(self._tmp, 'titles.bin'), 'wb')
+        self._offsets = open(os.path.join(self._tmp, 'title_offsets.bin'), 'wb')
+        self._offsets.write(np.zeros(1, dtype='<i8').tobytes())
+        self._pos = 0
+
+    def append(self, titles: List[str], cols: Dict[str, np.ndarray]):
+        enc = [t.encode('utf-8') for t in titles]
+        self._titles.write(b''.join(enc))
+        ends = self._pos + np.cumsum(np.fromiter(map(len, enc), dtype=np.int64, count=len(enc)))
+        self._offsets.write(ends.astype('<i8').tobytes())
+        if len(enc):
+            self._pos = int(ends[-1])
+        for name, arr in cols.items():
+            arr = np.asarray(arr)
+            if arr.shape[0] != len(titles):
+                raise ValueError(f"Column {name!r} has {arr.shape[0]} rows for {len(titles)} titles")
+            dtype = arr.dtype.newbyteorder('<')
+            spec = {'dtype': dtype.str, 'shape': list(arr.shape[1:])}
+            known = self.meta['columns'].setdefault(name, spec)
+            if known != spec:
+                raise ValueError(f"Column {name!r} changed from {known} to {spec} between chunks")
+            f = self._files.get(name)
+            if f is None:
+                f = self._files[name] = open(os.path.join(self._tmp, f'{name}.bin'), 'wb')
+            f.write(np.ascontiguousarray(arr, dtype=dtype).tobytes())
+        self.meta['rows'] += len(titles)
+
+    def close(self):
+        for f in (self._titles, self._offsets, *self._files.values()):
+            f.close()
+        with open(os.path.join(self._tmp, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump(self.meta, f, ensure_ascii=False)
+        shutil.rmtree(self.path, ignore_errors=True)
+        os.replace(self._tmp, self.path)
+
+    def abort(self):
+        for f in (self._titles, self._offsets, *self._files.values()):
+            f.close()
+        shutil.rmtree(self._tmp, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+
+class ColumnarResult:
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, 'meta.json'), 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        if self.meta.get('version') != COLUMNAR_VERSION:
+            raise ValueError(f"Unsupported columnar result version {self.meta.get('version')!r} in {path}")
+        self.kind: str = self.meta['kind']
+        self.rows: int = int(self.meta['rows'])
+        self.labels: Dict[str, Any] = self.meta['labels']
+        self.run: Dict[str, Any] = self.meta['run']
+        self._cache: Dict[str, np.ndarray] = {}
+
+    @property
+    def columns(self) -> List[str]:
+        return list(self.meta['columns'])
+
+    def _map(self, name: str, dtype, shape) -> np.ndarray:
+        path = os.path.join(self.path, f'{name}.bin')
+        if int(np.prod(shape)) == 0:
+            # np.memmap cannot map empty files
+            return np.zeros(shape, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode='r', shape=tuple(shape))
+
+    def column(self, name: str) -> np.ndarray:
+        arr = self._cache.get(name)
+        if arr is None:
+            spec = self.meta['columns'][name]
+            arr = self._cache[name] = self._map(name, np.dtype(spec['dtype']), [self.rows, *spec['shape']])
+        return arr
+
+    __getitem__ = column
+
+    def titles(self, start: int = 0, stop: int | None = None) -> List[str]:
+        stop = self.rows if stop is None else min(stop, self.rows)
+        offsets = self._map('title_offsets', np.dtype('<i8'), [self.rows + 1])
+        lo, hi = int(offsets[start]), int(offsets[stop])
+        with open(os.path.join(self.path, 'titles.bin'), 'rb') as f:
+            f.seek(lo)
+            blob = f.read(hi - lo)
+        bounds = (np.asarray(offsets[start:stop + 1]) - lo).tolist()
+        return [blob[a:b].decode('utf-8') for a, b in zip(bounds, bounds[1:])]
+
+    def chunks(self, size: int = 65536) -> Iterable[tuple[List[str], Dict[str, np.ndarray]]]:
+        # (titles, {column: rows}) in order; column slices stay memory-mapped
+        for start in range(0, self.rows, size):
+            stop = min(start + size, self.rows)
+            yield self.titles(start, stop), {name: self.column(name)[start:stop] for name in self.columns}
@@ -0,0 +1,241 @@
+import hashlib
+import json
+import os
+import re
+import unicodedata
+from typing import Dict, Iterable, List
+
+import numpy as np
+
+from ml.src.quant import quantize
+
+# Append-only, content-addressed embedding store.
+# Layout of a store directory:
+#   meta.json    -> {"version", "dim", "dtype"}
+#   keys.bin     -> 20-byte sha1 digests, one per row (append-only)
+#   vectors.bin  -> raw row-major vectors, one row per key (append-only, memory-mapped for reads)
+#   scales.bin   -> int8 stores only: float32 per-row scale (vector ~= codes * scale, see ml/src/quant.py)
+# Rows are written before their keys, so a crash mid-append leaves at worst an orphan vector
+# row that is truncated on the next open. Single writer per directory is assumed.
+
+STORE_VERSION = 1
+KEY_BYTES = 20
+# Eviction trims to this share of max_bytes, so the following appends do not each trigger a rewrite
+EVICT_LOW_WATER = 0.8
+
+
+def normalize_text(text: str) -> str:
+    # Unicode-compatible form + collapsed whitespace so trivially different exports share a key
+    text = unicodedata.normalize('NFKC', str(text))
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def text_key(text: str) -> bytes:
+    return hashlib.sha1(normalize_text(text).encode('utf-8')).digest()
+
+
+class EmbeddingStore:
+    def __init__(self, root: str, max_bytes: int | None = None, dtype: str = 'float32'):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.dtype = np.dtype(dtype)
+        self.dim: int | None = None
+        self._index: Dict[bytes, int] = {}
+        self._keys: List[bytes] = []
+        self._touched: set[int] = set()
+        self._mmap = None
+        self._scale_mmap = None
+        os.makedirs(root, exist_ok=True)
+        self._open()
+
+    @property
+    def _meta_path(self) -> str:
+        return os.path.join(self.root, 'meta.json')
+
+    @property
+    def _keys_path(self) -> str:
+        return os.path.join(self.root, 'keys.bin')
+
+    @property
+    def _vec_path(self) -> str:
+        return os.path.join(self.root, 'vectors.bin')
+
+    @property
+    def _scale_path(self) -> str:
+        return os.path.join(self.root, 'scales.bin')
+
+    @property
+    def _scaled(self) -> bool:
+        return self.dtype == np.int8
+
+    def _open(self):
+        if not os.path.exists(self._meta_path):
+            return
+        try:
+            with open(self._meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except Exception:
+            meta = {}
+        if meta.get('version') != STORE_VERSION or np.dtype(meta.get('dtype', 'float32')) != self.dtype:
+            # Incompatible layout: start over rather than misread rows
+            self.clear()
+            return
+        self.dim = int(meta['dim'])
+        blob = b''
+        if os.path.exists(self._keys_path):
+            with open(self._keys_path, 'rb') as f:
+                blob = f.read()
+        # Slice raw bytes (numpy 'S' dtypes would strip trailing NUL bytes of a digest)
+        keys = [blob[i:i + KEY_BYTES] for i in range(0, len(blob) - KEY_BYTES + 1, KEY_BYTES)]
+        vec_size = os.path.getsize(self._vec_path) if os.path.exists(self._vec_path) else 0
+        rows = min(len(keys), vec_size // self._row_bytes)
+        scale_size = 0
+        if self._scaled:
+            scale_size = os.path.getsize(self._scale_path) if os.path.exists(self._scale_path) else 0
+            rows = min(rows, scale_size // 4)
+        if len(blob) != rows * KEY_BYTES or vec_size != rows * self._row_bytes or (self._scaled and scale_size != rows * 4):
+            # Repair a torn append
+            idx = np.arange(rows)
+            self._rewrite(keys[:rows], self._read_rows(idx) if rows else None, self._read_scales(idx) if rows and self._scaled else None)
+            return
+        self._keys = keys
+        self._index = {k: i for i, k in enumerate(self._keys)}
+
+    @property
+    def _row_bytes(self) -> int:
+        return int(self.dim) * self.dtype.itemsize
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._keys) * self._entry_bytes if self.dim else 0
+
+    @property
+    def _entry_bytes(self) -> int:
+        return self._row_bytes + KEY_BYTES + (4 if self._scaled else 0)
+
+    def _vectors(self):
+        if self._mmap is None or self._mmap.shape[0] != len(self._keys):
+            if not self._keys:
+                return np.zeros((0, self.dim or 0), dtype=self.dtype)
+            self._mmap = np.memmap(self._vec_path, dtype=self.dtype, mode='r', shape=(len(self._keys), self.dim))
+        return self._mmap
+
+    def _scales(self):
+        if self._scale_mmap is None or self._scale_mmap.shape[0] != len(self._keys):
+            if not self._keys:
+                return np.zeros(0, dtype=np.float32)
+            self._scale_mmap = np.memmap(self._scale_path, dtype=np.float32, mode='r', shape=(len(self._keys),))
+        return self._scale_mmap
+
+    def _read_rows(self, rows: np.ndarray) -> np.ndarray:
+        mm = np.memmap(self._vec_path, dtype=self.dtype, mode='r', shape=(int(rows.max()) + 1 if rows.size else 0, self.dim))
+        return np.array(mm[rows])
+
+    def _read_scales(self, rows: np.ndarray) -> np.ndarray:
+        # Only for repairing a torn store, whose files disagree on the row count
+        return np.fromfile(self._scale_path, dtype=np.float32)[rows]
+
+    def lookup(self, keys: Iterable[bytes]) -> np.ndarray:
+        # Row index per key, -1 for misses
+        rows = np.fromiter((self._index.get(k, -1) for k in keys), dtype=np.int64)
+        self._touched.update(rows[rows >= 0].tolist())
+        return rows
+
+    def get(self, rows: np.ndarray) -> np.ndarray:
+        out = np.asarray(self._vectors()[rows], dtype=np.float32)
+        if self._scaled:
+            out *= self._scales()[rows][:, None]
+        return out
+
+    def append(self, keys: List[bytes], vectors: np.ndarray):
+        scales = None
+        if self._scaled:
+            q = quantize(vectors, 'int8')
+            vectors, scales = q.data, q.scale
+        vectors = np.ascontiguousarray(vectors, dtype=self.dtype)
+        if vectors.ndim != 2 or vectors.shape[0] != len(keys):
+            raise ValueError(f"Expected {len(keys)} vectors, got shape {vectors.shape}")
+        if self.dim is None:
+            self.dim = int(vectors.shape[1])
+            self._write_meta()
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(f"Embedding dim mismatch for store {self.root}: {vectors.shape[1]} != {self.dim}")
+        # Skip keys already present (e.g. duplicates within one batch)
+        fresh, seen = [], set()
+        for i, k in enumerate(keys):
+            if k in self._index or k in seen:
+                continue
+            seen.add(k)
+            fresh.append(i)
+        if not fresh:
+            return
+        self._mmap = self._scale_mmap = None
+        with open(self._vec_path, 'ab') as f:
+            f.write(vectors[fresh].tobytes())
+        if scales is not None:
+            with open(self._scale_path, 'ab') as f:
+                f.write(scales[fresh].astype(np.float32).tobytes())
+        with open(self._keys_path, 'ab') as f:
+            f.write(b''.join(keys[i] for i in fresh))
+        start = len(self._keys)
+        for j, i in enumerate(fresh):
+            self._keys.append(keys[i])
+            self._index[keys[i]] = start + j
+            self._touched.add(start + j)
+        if self.max_bytes is not None and self.nbytes > self.max_bytes:
+            self.evict()
+
+    def evict(self):
+        # Keep rows used in this session first, then the most recently appended rows, until the store is
+        # down to EVICT_LOW_WATER of its budget
+        capacity = max(0, int(self.max_bytes // self._entry_bytes))
+        n = len(self._keys)
+        if n <= capacity:
+            return
+        touched = np.zeros(n, dtype=bool)
+        touched[np.fromiter(self._touched, dtype=np.int64, count=len(self._touched))] = True
+        newest = np.arange(n - 1, -1, -1)
+        ranked = np.concatenate([newest[touched[newest]], newest[~touched[newest]]])
+        # Rows used in this session are only dropped when they alone exceed the budget
+        keep = np.sort(ranked[:max(int(capacity * EVICT_LOW_WATER), min(len(self._touched), capacity))])
+        vecs = np.array(self._vectors()[keep]) if keep.size else None
+        scales = np.array(self._scales()[keep]) if keep.size and self._scaled else None
+        blob = np.frombuffer(b''.join(self._keys), dtype=np.uint8).reshape(n, KEY_BYTES)[keep].tobytes()
+        self._rewrite([blob[i:i + KEY_BYTES] for i in range(0, len(blob), KEY_BYTES)], vecs, scales)
+        remap = np.full(n, -1, dtype=np.int64)
+        remap[keep] = np.arange(keep.size)
+        moved = remap[touched]
+        self._touched = set(moved[moved >= 0].tolist())
+
+    def _rewrite(self, keys: List[bytes], vectors, scales=None):
+        self._mmap = self._scale_mmap = None
+        tmp_vec, tmp_keys = self._vec_path + '.tmp', self._keys_path + '.tmp'
+        with open(tmp_vec, 'wb') as f:
+            if vectors is not None:
+                f.write(np.ascontiguousarray(vectors, dtype=self.dtype).tobytes())
+        if self._scaled:
+            with open(self._scale_path + '.tmp', 'wb') as f:
+                if scales is not None:
+                    f.write(np.asarray(scales, dtype=np.float32).tobytes())
+            os.replace(self._scale_path + '.tmp', self._scale_path)
+        with open(tmp_keys, 'wb') as f:
+            f.write(b''.join(keys))
+        os.replace(tmp_vec, self._vec_path)
+        os.replace(tmp_keys, self._keys_path)
+        self._keys = list(keys)
+        self._index = {k: i for i, k in enumerate(self._keys)}
+
+    def _write_meta(self):
+        with open(self._meta_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': STORE_VERSION, 'dim': self.dim, 'dtype': self.dtype.name}, f)
+
+    def clear(self):
+        self._mmap = self._scale_mmap = None
+        for p in (self._meta_path, self._keys_path, self._vec_path, self._scale_path):
+            if os.path.exists(p):
+                os.remove(p)
+        self.dim = None
+        self._keys, self._index, self._touched = [], {}, set()
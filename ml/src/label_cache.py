@@ -0,0 +1,192 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+
+from ml.src.embed_store import EmbeddingStore
+from ml.src.quant import QuantizedMatrix, quantize
+
+# Versioned label-embedding cache holding many (taxonomy, model, prompt style) entries.
+# Layout under <cache_dir>/label_cache/:
+#   index.json               -> {"version", "entries": {key: {kind, model, prompt_style, fingerprint, file_sha1, depth|depths, labels, last_used}}}
+#   <key>/meta.json          -> label records (parents/children, or per-level nodes for deep trees) as plain JSON
+#   <key>/<name>.npy         -> float32/float16/int8 arrays (p_emb/c_emb, or level0..levelN), opened with mmap_mode='r'
+#   <key>/<name>.scale.npy   -> int8 entries only: per-row scales (see ml/src/quant.py)
+#   pool_<model>_<style>/    -> EmbeddingStore keyed by sha1 of each label's exact prompt text
+# Entries are keyed by a fingerprint of the parsed labels, so formatting-only edits to the taxonomy
+# file still hit. Building a new entry re-encodes only prompts missing from the pool (i.e. labels that
+# were added or whose name/description changed). Least recently used entries beyond max_entries are dropped,
+# and each pool is bounded by pool_max_mb (prompts of the current build are kept first).
+# Tree entries record their depth; a hier entry is shared by every file with the same top two levels
+# (deeper ones included), so it records a depth per file_sha1, and only when the caller parsed it.
+
+LABEL_CACHE_VERSION = 1
+_LOCK = threading.Lock()
+
+
+def label_fingerprint(parents: List[Dict[str, Any]], children: List[Dict[str, Any]]) -> str:
+    canon = {
+        'parents': [[p['id'], p['en'], p['desc']] for p in parents],
+        'children': [[c['id'], c['p_index'], c['en'], c['desc']] for c in children],
+    }
+    return hashlib.sha1(json.dumps(canon, ensure_ascii=False, sort_keys=True, separators=(',', ':')).encode('utf-8')).hexdigest()
+
+
+def tree_fingerprint(levels: List[List[Dict[str, Any]]]) -> str:
+    canon = [[[n['id'], n['parent'], n['en'], n['desc']] for n in nodes] for nodes in levels]
+    return hashlib.sha1(json.dumps(canon, ensure_ascii=False, separators=(',', ':')).encode('utf-8')).hexdigest()
+
+
+def prompt_key(text: str) -> bytes:
+    # Exact prompt text (no normalization): the encoded string is what the vector depends on
+    return hashlib.sha1(text.encode('utf-8')).digest()
+
+
+class LabelCache:
+    def __init__(self, root: str, max_entries: int = 16, pool_max_mb: int = 256):
+        self.root = root
+        self.max_entries = max_entries
+        self.pool_max_mb = pool_max_mb
+        os.makedirs(root, exist_ok=True)
+
+    @property
+    def _index_path(self) -> str:
+        return os.path.join(self.root, 'index.json')
+
+    def _read_index(self) -> Dict[str, Any]:
+        try:
+            with open(self._index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            if index.get('version') == LABEL_CACHE_VERSION:
+                return index
+        except Exception:
+            pass
+        return {'version': LABEL_CACHE_VERSION, 'entries': {}}
+
+    def _write_index(self, index: Dict[str, Any]):
+        tmp = f'{self._index_path}.{os.getpid()}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(index, f, indent=1)
+        os.replace(tmp, self._index_path)
+
+    @staticmethod
+    def entry_key(model: str, style: str, fingerprint: str) -> str:
+        return hashlib.sha1(f'{model}\0{style}\0{fingerprint}'.encode('utf-8')).hexdigest()[:16]
+
+    @staticmethod
+    def _variant(kind: str, precision: str) -> str:
+        return kind if precision == 'float32' else f'{kind}@{precision}'
+
+    def find(self, model: str, style: str, file_sha1: str | None = None, fingerprint: str | None = None, kind: str = 'hier', precision: str = 'float32') -> str | None:
+        # file_sha1 is a fast path that skips parsing the taxonomy when the file is byte-identical
+        with _LOCK:
+            entries = self._read_index()['entries']
+        variant = self._variant(kind, precision)
+        if fingerprint is not None:
+            key = self.entry_key(model, style, f'{variant}:{fingerprint}')
+            return key if key in entries else None
+        for key, e in entries.items():
+            if e.get('kind', 'hier') == kind and e.get('precision', 'float32') == precision and e['model'] == model and e['prompt_style'] == style and file_sha1 in e.get('file_sha1', []):
+                return key
+        return None
+
+    def depth(self, file_sha1: str) -> int | None:
+        # Taxonomy depth recorded for a byte-identical file, so callers can pick the label layout unparsed
+        with _LOCK:
+            entries = self._read_index()['entries']
+        for e in entries.values():
+            if e.get('kind') == 'tree' and file_sha1 in e.get('file_sha1', []):
+                return int(e['depth'])
+            if file_sha1 in e.get('depths', {}):
+                return int(e['depths'][file_sha1])
+        return None
+
+    def load(self, key: str):
+        d = os.path.join(self.root, key)
+        try:
+            with open(os.path.join(d, 'meta.json'), 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            arrays = {}
+            for name in meta.get('arrays', ['p_emb', 'c_emb']):
+                arr = np.load(os.path.join(d, f'{name}.npy'), mmap_mode='r', allow_pickle=False)
+                if meta.get('precision', 'float32') != 'float32':
+                    scale_path = os.path.join(d, f'{name}.scale.npy')
+                    arr = QuantizedMatrix(arr, np.load(scale_path, allow_pickle=False) if os.path.exists(scale_path) else None)
+                arrays[name] = arr
+        except Exception:
+            return None
+        return meta, arrays
+
+    def touch(self, key: str, file_sha1: str | None = None, depth: int | None = None):
+        with _LOCK:
+            index = self._read_index()
+            e = index['entries'].get(key)
+            if e is None:
+                return
+            e['last_used'] = time.time()
+            if file_sha1 and file_sha1 not in e['file_sha1']:
+                # Remember a few byte-level variants (e.g. YAML and converted JSON) of the same labels
+                e['file_sha1'] = (e['file_sha1'] + [file_sha1])[-4:]
+            if e.get('kind') != 'tree':
+                depths = e.get('depths', {})
+                if file_sha1 and depth is not None:
+                    depths[file_sha1] = depth
+                e['depths'] = {k: v for k, v in depths.items() if k in e['file_sha1']}
+            self._write_index(index)
+
+    def put(self, model: str, style: str, fingerprint: str, file_sha1: str | None, records: Dict[str, Any], arrays: Dict[str, np.ndarray], kind: str = 'hier', precision: str = 'float32', depth: int | None = None) -> str:
+        # depth: the parsed depth of the file behind file_sha1, for hier entries (tree entries know theirs)
+        key = self.entry_key(model, style, f'{self._variant(kind, precision)}:{fingerprint}')
+        d = os.path.join(self.root, key)
+        tmp = f'{d}.{os.getpid()}.tmp'
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        meta = {'kind': kind, 'precision': precision, 'model': model, 'prompt_style': style, 'fingerprint': fingerprint, 'arrays': list(arrays), **records}
+        with open(os.path.join(tmp, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        for name, arr in arrays.items():
+            q = quantize(arr, precision)
+            if isinstance(q, QuantizedMatrix):
+                np.save(os.path.join(tmp, f'{name}.npy'), np.ascontiguousarray(q.data))
+                if q.scale is not None:
+                    np.save(os.path.join(tmp, f'{name}.scale.npy'), q.scale)
+            else:
+                np.save(os.path.join(tmp, f'{name}.npy'), np.ascontiguousarray(q, dtype=np.float32))
+        with _LOCK:
+            shutil.rmtree(d, ignore_errors=True)
+            os.replace(tmp, d)
+            index = self._read_index()
+            entry = {
+                'kind': kind,
+                'precision': precision,
+                'model': model,
+                'prompt_style': style,
+                'fingerprint': fingerprint,
+                'file_sha1': [file_sha1] if file_sha1 else [],
+                'labels': sum(int(a.shape[0]) for a in arrays.values()),
+                'last_used': time.time(),
+            }
+            if kind == 'tree':
+                entry['depth'] = len(records['levels'])
+            else:
+                entry['depths'] = {file_sha1: depth} if file_sha1 and depth is not None else {}
+            index['entries'][key] = entry
+            self._evict(index, keep=key)
+            self._write_index(index)
+        return key
+
+    def _evict(self, index: Dict[str, Any], keep: str):
+        entries = index['entries']
+        by_age = sorted((k for k in entries if k != keep), key=lambda k: entries[k]['last_used'])
+        for k in by_age[:max(0, len(entries) - self.max_entries)]:
+            del entries[k]
+            # Another process may still have the arrays mapped; a leftover directory is harmless
+            shutil.rmtree(os.path.join(self.root, k), ignore_errors=True)
+
+    def pool(self, safe_model: str, style: str) -> EmbeddingStore:
+        return EmbeddingStore(os.path.join(self.root, f'pool_{safe_model}_{style}'), max_bytes=self.pool_max_mb * 1024 * 1024)
@@ -1,8 +1,13 @@
-import torch
-import torch.nn as nn
-from sentence_transformers import SentenceTransformer
+import atexit
+import os
 from typing import List
 
+import numpy as np
+
+# torch / sentence-transformers are imported lazily: building an Embedder is free, and the
+# model is only loaded on the first encode(). Fully cached runs, --help and taxonomy-only
+# tooling therefore never pay the torch import.
+
 EMBEDDER_MAP = {
     # English-focused
     "minilm": "sentence-transformers/all-MiniLM-L6-v2",          # 384-dim
@@ -15,23 +20,137 @@ EMBEDDER_MAP = {
     "muse": "sentence-transformers/distiluse-base-multilingual-cased-v2",
 }
 
+# "torch" runs SentenceTransformer directly; "onnx" / "onnx-int8" export a local ONNX graph once
+# (under onnx_dir) and run it with onnxruntime on CPU, int8 using dynamic weight quantization.
+BACKENDS = ("torch", "onnx", "onnx-int8")
+
 class Embedder:
-    def __init__(self, name: str = "minilm", device: str | None = None):
+    def __init__(self, name: str = "minilm", device: str | None = None, backend: str = "torch", onnx_dir: str = "ml/out/onnx", workers: int = 1, batch_size: int = 32, threads: int | None = None):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown embedder backend {backend!r}; expected one of {BACKENDS}")
         # If user supplies a raw HuggingFace / local path name, accept it directly.
-        model_name = EMBEDDER_MAP.get(name, name)
-        self.model = SentenceTransformer(model_name, device=device)
+        self.name = name
+        self.model_name = EMBEDDER_MAP.get(name, name)
+        self.device = device
+        self.backend = backend
+        self.onnx_dir = onnx_dir
+        # workers > 1: encode in that many processes (each with its own model copy) over length-sorted buckets
+        self.workers = max(1, int(workers))
+        self.batch_size = batch_size
+        self.threads = threads
+        self._model = None
+        self._pool = None
+        self._tokenizer = None
+
+    @property
+    def model(self):
+        if self._model is None:
+            if self.backend == "torch":
+                from sentence_transformers import SentenceTransformer
+                if self.threads:
+                    import torch
+                    torch.set_num_threads(self.threads)
+                self._model = SentenceTransformer(self.model_name, device=self.device)
+            else:
+                from .onnx_backend import OnnxEncoder
+                self._model = OnnxEncoder(self.model_name, quantize=self.backend == "onnx-int8", cache_dir=self.onnx_dir, threads=self.threads)
+        return self._model
+
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    def load(self):
+        return self.model
 
     def encode(self, texts: List[str]):
-        return self.model.encode(texts, normalize_embeddings=True, convert_to_numpy=True, show_progress_bar=False)
-
-class MLPHead(nn.Module):
-    def __init__(self, in_dim: int, num_labels: int, hidden: int = 256, dropout: float = 0.1):
-        super().__init__()
-        self.net = nn.Sequential(
-            nn.Linear(in_dim, hidden),
-            nn.ReLU(),
-            nn.Dropout(dropout),
-            nn.Linear(hidden, num_labels)
-        )
-    def forward(self, x: torch.Tensor) -> torch.Tensor:
-        return self.net(x)
+        if self.workers > 1 and len(texts) >= 2 * self.batch_size:
+            return self._parallel_encode(texts)
+        return self.model.encode(texts, batch_size=self.batch_size, normalize_embeddings=True, convert_to_numpy=True, show_progress_bar=False)
+
+    def token_lengths(self, texts: List[str]) -> np.ndarray:
+        # Tokenizer only (no model weights); fall back to character length if it cannot be loaded
+        if self._tokenizer is None:
+            try:
+                from transformers import AutoTokenizer
+                src = self.model_name
+                if self.backend != "torch":
+                    # Prefer the tokenizer saved next to the exported ONNX graph
+                    from .onnx_backend import model_dir
+                    local = model_dir(self.model_name, self.onnx_dir)
+                    src = local if os.path.isdir(local) else src
+                self._tokenizer = AutoTokenizer.from_pretrained(src)
+            except Exception:
+                self._tokenizer = False
+        if self._tokenizer is False:
+            return np.fromiter((len(t) for t in texts), dtype=np.int64, count=len(texts))
+        ids = self._tokenizer(list(texts), add_special_tokens=True, truncation=False)["input_ids"]
+        return np.fromiter((len(x) for x in ids), dtype=np.int64, count=len(ids))
+
+    def _parallel_encode(self, texts: List[str]) -> np.ndarray:
+        if self._pool is None:
+            import multiprocessing as mp
+            threads = self.threads or max(1, (os.cpu_count() or 1) // self.workers)
+            ctx = mp.get_context("spawn")  # fork is unsafe once torch / onnxruntime threads exist
+            self._pool = ctx.Pool(self.workers, initializer=_init_worker, initargs=(self.name, self.device, self.backend, self.onnx_dir, self.batch_size, threads))
+            atexit.register(self.close)
+        # Sort by token length and cut into buckets of batch_size so each batch pads to a similar length
+        order = np.argsort(self.token_lengths(texts), kind="stable")
+        buckets = [order[i:i + self.batch_size] for i in range(0, len(order), self.batch_size)]
+        tasks = [(b, [texts[j] for j in idx]) for b, idx in enumerate(buckets)]
+        out = None
+        for b, emb in self._pool.imap_unordered(_worker_encode, tasks):
+            if out is None:
+                out = np.empty((len(texts), emb.shape[1]), dtype=np.float32)
+            out[buckets[b]] = emb
+        return out
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+
+_WORKER_EMBEDDER: "Embedder | None" = None
+_WORKER_ERROR: "Exception | None" = None
+
+def _init_worker(name, device, backend, onnx_dir, batch_size, threads):
+    global _WORKER_EMBEDDER, _WORKER_ERROR
+    try:
+        _WORKER_EMBEDDER = Embedder(name, device=device, backend=backend, onnx_dir=onnx_dir, batch_size=batch_size, threads=threads)
+        _WORKER_EMBEDDER.load()
+    except Exception as e:
+        # A failing initializer makes Pool respawn workers forever; surface the error on first task instead
+        _WORKER_ERROR = e
+
+def _worker_encode(task):
+    if _WORKER_ERROR is not None:
+        raise _WORKER_ERROR
+    bucket, texts = task
+    return bucket, np.asarray(_WORKER_EMBEDDER.encode(texts), dtype=np.float32)
+
+def _define_mlp_head():
+    import torch
+    import torch.nn as nn
+
+    class MLPHead(nn.Module):
+        def __init__(self, in_dim: int, num_labels: int, hidden: int = 256, dropout: float = 0.1):
+            super().__init__()
+            self.net = nn.Sequential(
+                nn.Linear(in_dim, hidden),
+                nn.ReLU(),
+                nn.Dropout(dropout),
+                nn.Linear(hidden, num_labels)
+            )
+        def forward(self, x: torch.Tensor) -> torch.Tensor:
+            return self.net(x)
+
+    return MLPHead
+
+def __getattr__(name: str):
+    # MLPHead subclasses torch.nn.Module, so it is only defined on first access
+    if name == "MLPHead":
+        cls = _define_mlp_head()
+        globals()["MLPHead"] = cls
+        return cls
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,131 @@
+import json
+import os
+import re
+from typing import List
+
+import numpy as np
+
+# ONNX Runtime encoder for SentenceTransformer models made of Transformer + Pooling (+ Normalize).
+# The first use exports the HF transformer to <cache_dir>/<model>/model.onnx (needs torch once),
+# saves the tokenizer next to it and, for int8, writes a dynamically quantized model.int8.onnx.
+# Later runs only need onnxruntime + the saved tokenizer. Pooling and L2 normalization are done
+# in numpy so encode() matches SentenceTransformer.encode(normalize_embeddings=True).
+
+SUPPORTED_POOLING = ('mean', 'cls', 'max')
+
+
+def _safe_dir_name(model_name: str) -> str:
+    return re.sub(r'[\\/\s]+', '__', model_name)
+
+
+def model_dir(model_name: str, cache_dir: str = 'ml/out/onnx') -> str:
+    return os.path.join(cache_dir, _safe_dir_name(model_name))
+
+
+def export_onnx(model_name: str, out_dir: str, opset: int = 14) -> dict:
+    import torch
+    from sentence_transformers import SentenceTransformer, models as st_models
+
+    st = SentenceTransformer(model_name, device='cpu')
+    modules = list(st._modules.values())
+    extra = [type(m).__name__ for m in modules[2:] if not isinstance(m, st_models.Normalize)]
+    if len(modules) < 2 or not isinstance(modules[0], st_models.Transformer) or not isinstance(modules[1], st_models.Pooling) or extra:
+        names = ', '.join(type(m).__name__ for m in modules)
+        raise ValueError(f"ONNX backend supports Transformer + Pooling models only; {model_name} is [{names}]")
+    transformer, pooling = modules[0], modules[1]
+    pooling_mode = pooling.get_pooling_mode_str()
+    if pooling_mode not in SUPPORTED_POOLING:
+        raise ValueError(f"ONNX backend does not support pooling mode {pooling_mode!r} of {model_name}")
+
+    hf_model = transformer.auto_model.eval()
+    tokenizer = transformer.tokenizer
+    dummy = tokenizer(['export probe', 'a somewhat longer export probe sentence'], padding=True, return_tensors='pt')
+    input_names = [n for n in ('input_ids', 'attention_mask', 'token_type_ids') if n in dummy]
+
+    class _TokenEmbeddings(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, *inputs):
+            return self.model(**dict(zip(input_names, inputs))).last_hidden_state
+
+    os.makedirs(out_dir, exist_ok=True)
+    dynamic = {n: {0: 'batch', 1: 'seq'} for n in input_names + ['token_embeddings']}
+    with torch.no_grad():
+        torch.onnx.export(
+            _TokenEmbeddings(hf_model),
+            tuple(dummy[n] for n in input_names),
+            os.path.join(out_dir, 'model.onnx'),
+            input_names=input_names,
+            output_names=['token_embeddings'],
+            dynamic_axes=dynamic,
+            opset_version=opset,
+        )
+    tokenizer.save_pretrained(out_dir)
+    config = {'model': model_name, 'pooling': pooling_mode, 'max_seq_length': int(st.max_seq_length), 'inputs': input_names}
+    with open(os.path.join(out_dir, 'config.json'), 'w', encoding='utf-8') as f:
+        json.dump(config, f, indent=2)
+    return config
+
+
+def quantize_int8(src: str, dst: str):
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    quantize_dynamic(src, dst, weight_type=QuantType.QInt8)
+
+
+class OnnxEncoder:
+    def __init__(self, model_name: str, quantize: bool = False, cache_dir: str = 'ml/out/onnx', batch_size: int = 32, threads: int | None = None):
+        self.model_dir = model_dir(model_name, cache_dir)
+        config_path = os.path.join(self.model_dir, 'config.json')
+        fp32_path = os.path.join(self.model_dir, 'model.onnx')
+        if not (os.path.exists(config_path) and os.path.exists(fp32_path)):
+            export_onnx(model_name, self.model_dir)
+        with open(config_path, 'r', encoding='utf-8') as f:
+            self.config = json.load(f)
+        path = fp32_path
+        if quantize:
+            path = os.path.join(self.model_dir, 'model.int8.onnx')
+            if not os.path.exists(path):
+                quantize_int8(fp32_path, path)
+
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        opts = ort.SessionOptions()
+        if threads:
+            opts.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(path, sess_options=opts, providers=['CPUExecutionProvider'])
+        self.tokenizer = AutoTokenizer.from_pretrained(self.model_dir)
+        self.batch_size = batch_size
+        self.max_seq_length = self.config['max_seq_length']
+        self.input_names = [i.name for i in self.session.get_inputs()]
+
+    def _pool(self, tokens: np.ndarray, mask: np.ndarray) -> np.ndarray:
+        mode = self.config['pooling']
+        if mode == 'cls':
+            return tokens[:, 0]
+        m = mask[..., None].astype(tokens.dtype)
+        if mode == 'max':
+            return np.where(m > 0, tokens, -1e9).max(axis=1)
+        return (tokens * m).sum(axis=1) / np.clip(m.sum(axis=1), 1e-9, None)
+
+    def encode(self, texts: List[str], normalize_embeddings: bool = True, convert_to_numpy: bool = True, show_progress_bar: bool = False, batch_size: int | None = None) -> np.ndarray:
+        batch_size = batch_size or self.batch_size
+        # Longest-first ordering keeps padding per batch small (same trick as SentenceTransformer.encode)
+        order = np.argsort([-len(t) for t in texts], kind='stable')
+        out = None
+        for start in range(0, len(texts), batch_size):
+            idx = order[start:start + batch_size]
+            enc = self.tokenizer([texts[i] for i in idx], padding=True, truncation=True, max_length=self.max_seq_length, return_tensors='np')
+            feeds = {n: enc[n].astype(np.int64) for n in self.input_names if n in enc}
+            tokens = self.session.run(None, feeds)[0]
+            emb = self._pool(tokens, enc['attention_mask']).astype(np.float32)
+            if out is None:
+                out = np.empty((len(texts), emb.shape[1]), dtype=np.float32)
+            out[idx] = emb
+        if out is None:
+            return np.zeros((0, 0), dtype=np.float32)
+        if normalize_embeddings:
+            out /= np.clip(np.linalg.norm(out, axis=1, keepdims=True), 1e-12, None)
+        return out
@@ -0,0 +1,90 @@
+import queue
+import threading
+from typing import Any, Callable, Iterable, Iterator, List
+
+# Threaded stage pipeline. The source iterator and every stage run in their own thread, joined by
+# queues holding at most `depth` items, so a slow stage blocks its producers (backpressure) instead of
+# letting work pile up. One thread per stage keeps items in source order. Overlap comes from stages
+# that release the GIL (file reads, torch/onnxruntime encoding, BLAS scoring, writes); pure-Python
+# stages still interleave with them. Exceptions from any thread are re-raised in the consumer, and
+# closing the consumer early stops all threads.
+
+_DONE = object()
+_POLL_S = 0.1
+
+
+class _Failure:
+    def __init__(self, exc: BaseException):
+        self.exc = exc
+
+
+def pipelined(source: Iterable[Any], stages: List[Callable[[Any], Any]], depth: int = 4) -> Iterator[Any]:
+    # Yields stages[-1](...stages[0](item)) for each source item. depth <= 0 runs everything inline.
+    if depth <= 0:
+        for item in source:
+            for fn in stages:
+                item = fn(item)
+            yield item
+        return
+
+    stop = threading.Event()
+    queues = [queue.Queue(maxsize=depth) for _ in range(len(stages) + 1)]
+
+    def put(q: queue.Queue, item) -> bool:
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=_POLL_S)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def get(q: queue.Queue):
+        while not stop.is_set():
+            try:
+                return q.get(timeout=_POLL_S)
+            except queue.Empty:
+                pass
+        return _DONE
+
+    def feed():
+        try:
+            for item in source:
+                if not put(queues[0], item):
+                    return
+        except BaseException as e:
+            put(queues[0], _Failure(e))
+            return
+        put(queues[0], _DONE)
+
+    def work(fn, q_in: queue.Queue, q_out: queue.Queue):
+        while True:
+            item = get(q_in)
+            if item is _DONE or isinstance(item, _Failure):
+                put(q_out, item)
+                return
+            try:
+                item = fn(item)
+            except BaseException as e:
+                put(q_out, _Failure(e))
+                return
+            if not put(q_out, item):
+                return
+
+    threads = [threading.Thread(target=feed, name='pipeline-source', daemon=True)]
+    for i, fn in enumerate(stages):
+        threads.append(threading.Thread(target=work, args=(fn, queues[i], queues[i + 1]), name=f'pipeline-{getattr(fn, "__name__", i)}', daemon=True))
+    for t in threads:
+        t.start()
+    try:
+        while True:
+            item = queues[-1].get()
+            if item is _DONE:
+                break
+            if isinstance(item, _Failure):
+                raise item.exc
+            yield item
+    finally:
+        stop.set()
+        for t in threads:
+            t.join()
@@ -0,0 +1,132 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Per-stage wall/CPU time, peak RSS and counters. Callers write counters into the dict yielded by
+# stage(). CPU time is process-wide (it includes torch/BLAS threads and encode workers), so it is
+# only attributed to a stage that ran alone: a stage that overlapped a stage on another thread
+# (--pipeline-depth) records cpu_s None. NULL_PROFILER is the default everywhere: its stage() hands back one shared context
+# manager and a scratch dict, so instrumented code costs an attribute lookup when profiling is off.
+
+
+def peak_rss_mb() -> float | None:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return round(peak / (2**20 if os.uname().sysname == 'Darwin' else 2**10), 2)
+
+
+class Profiler:
+    enabled = True
+
+    def __init__(self):
+        self.events: List[Dict[str, Any]] = []
+        self._origin = time.perf_counter()
+        # Open stages per thread; each is a one-item list holding its "overlapped" flag
+        self._open: Dict[int, List[List[bool]]] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str, **counters):
+        rec: Dict[str, Any] = dict(counters)
+        tid = threading.get_ident()
+        overlapped = [False]
+        with self._lock:
+            others = [o for t, opened in self._open.items() if t != tid for o in opened]
+            for o in others:
+                o[0] = True
+            overlapped[0] = bool(others)
+            self._open.setdefault(tid, []).append(overlapped)
+        wall0 = time.perf_counter()
+        cpu0 = time.process_time()
+        try:
+            yield rec
+        finally:
+            wall1 = time.perf_counter()
+            cpu1 = time.process_time()
+            with self._lock:
+                opened = self._open[tid]
+                del opened[next(i for i, o in enumerate(opened) if o is overlapped)]
+                if not opened:
+                    del self._open[tid]
+            self.events.append({
+                'name': name,
+                'start_s': wall0 - self._origin,
+                'wall_s': wall1 - wall0,
+                'cpu_s': None if overlapped[0] else cpu1 - cpu0,
+                'peak_rss_mb': peak_rss_mb(),
+                'tid': tid,
+                'counters': rec,
+            })
+
+    def summary(self) -> Dict[str, Any]:
+        # Aggregate events by stage name (chunked/streamed runs emit one event per chunk)
+        stages: Dict[str, Dict[str, Any]] = {}
+        for ev in self.events:
+            s = stages.setdefault(ev['name'], {'calls': 0, 'wall_s': 0.0, 'cpu_s': 0.0, 'peak_rss_mb': None})
+            s['calls'] += 1
+            s['wall_s'] += ev['wall_s']
+            # A stage's CPU total is only meaningful when none of its events overlapped another thread
+            s['cpu_s'] = None if s['cpu_s'] is None or ev['cpu_s'] is None else s['cpu_s'] + ev['cpu_s']
+            if ev['peak_rss_mb'] is not None:
+                s['peak_rss_mb'] = max(s['peak_rss_mb'] or 0.0, ev['peak_rss_mb'])
+            for k, v in ev['counters'].items():
+                if isinstance(v, bool) or not isinstance(v, (int, float)):
+                    s[k] = v
+                else:
+                    s[k] = s.get(k, 0) + v
+        for s in stages.values():
+            s['wall_s'] = round(s['wall_s'], 6)
+            if s['cpu_s'] is not None:
+                s['cpu_s'] = round(s['cpu_s'], 6)
+        return {'stages': stages, 'total_wall_s': round(time.perf_counter() - self._origin, 6), 'peak_rss_mb': peak_rss_mb()}
+
+    def chrome_trace(self) -> Dict[str, Any]:
+        # Chrome trace event format ("X" complete events, microseconds); open in chrome://tracing or Perfetto
+        pid = os.getpid()
+        events = [{
+            'name': ev['name'],
+            'ph': 'X',
+            'ts': round(ev['start_s'] * 1e6, 3),
+            'dur': round(ev['wall_s'] * 1e6, 3),
+            'pid': pid,
+            'tid': ev['tid'],
+            'args': {'cpu_s': round(ev['cpu_s'], 6) if ev['cpu_s'] is not None else None, 'peak_rss_mb': ev['peak_rss_mb'], **ev['counters']},
+        } for ev in self.events]
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def write_trace(self, path: str):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.chrome_trace(), f)
+
+
+class _NullStage:
+    def __init__(self):
+        self.scratch: Dict[str, Any] = {}
+
+    def __enter__(self):
+        return self.scratch
+
+    def __exit__(self, *exc):
+        return False
+
+
+class NullProfiler:
+    enabled = False
+    _stage = _NullStage()
+
+    def stage(self, name: str, **counters):
+        return self._stage
+
+
+NULL_PROFILER = NullProfiler()
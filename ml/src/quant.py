@@ -0,0 +1,112 @@
+from typing import Tuple
+
+import numpy as np
+
+# Reduced-precision embedding matrices.
+#   float16 -> IEEE half per value
+#   int8    -> symmetric per-row quantization: x ~= codes * scale, scale = max|x_row| / 127
+# Products are computed from the stored low-precision values with float32 accumulation: blocks are
+# widened to float32 and multiplied with BLAS sgemm (numpy has no int8/fp16 GEMM). For int8 every
+# product is an integer <= 127^2 and the sums stay below 2^24 for dims up to ~1000, so the float32
+# result equals an int32-accumulated dot product; per-row scales are applied afterwards.
+
+PRECISIONS = ('float32', 'float16', 'int8')
+INT8_MAX = 127.0
+
+
+class QuantizedMatrix:
+    def __init__(self, data: np.ndarray, scale: np.ndarray | None = None):
+        self.data = data
+        self.scale = scale  # float32 [rows] for int8, None otherwise
+
+    @property
+    def precision(self) -> str:
+        return 'int8' if self.scale is not None else np.dtype(self.data.dtype).name
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        return self.data.shape
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.data.nbytes + (self.scale.nbytes if self.scale is not None else 0))
+
+    def __len__(self) -> int:
+        return self.data.shape[0]
+
+    def __getitem__(self, rows) -> 'QuantizedMatrix':
+        return QuantizedMatrix(self.data[rows], self.scale[rows] if self.scale is not None else None)
+
+    def dequantize(self) -> np.ndarray:
+        out = np.asarray(self.data, dtype=np.float32)
+        if self.scale is not None:
+            out = out * self.scale[:, None]
+        return out
+
+
+def quantize(x, precision: str = 'float32'):
+    # float32 passes through as a plain ndarray so the default path is unchanged
+    if isinstance(x, QuantizedMatrix):
+        if x.precision == precision:
+            return x
+        x = x.dequantize()
+    x = np.asarray(x, dtype=np.float32)
+    if precision == 'float32':
+        return x
+    if precision == 'float16':
+        return QuantizedMatrix(x.astype(np.float16))
+    if precision == 'int8':
+        scale = np.abs(x).max(axis=1) / INT8_MAX if x.size else np.zeros(x.shape[0], dtype=np.float32)
+        scale = np.where(scale > 0, scale, 1.0).astype(np.float32)
+        codes = np.clip(np.rint(x / scale[:, None]), -INT8_MAX, INT8_MAX).astype(np.int8)
+        return QuantizedMatrix(codes, scale)
+    raise ValueError(f"Unknown precision {precision!r}; expected one of {PRECISIONS}")
+
+
+def precision_of(x) -> str:
+    return x.precision if isinstance(x, QuantizedMatrix) else 'float32'
+
+
+def _widen(x) -> np.ndarray:
+    # Stored values as float32 (int8 codes stay unscaled)
+    return np.asarray(x.data if isinstance(x, QuantizedMatrix) else x, dtype=np.float32)
+
+
+def matmul_t(A, B, block: int = 65536) -> np.ndarray:
+    # A @ B.T as float32. If B is quantized and A is not, A is quantized to B's precision first,
+    # so both operands carry the same precision loss.
+    if isinstance(B, QuantizedMatrix) and not isinstance(A, QuantizedMatrix):
+        A = quantize(A, B.precision)
+    if not isinstance(A, QuantizedMatrix) and not isinstance(B, QuantizedMatrix):
+        return np.asarray(A) @ np.asarray(B).T
+    Bt = _widen(B).T
+    out = np.empty((A.shape[0], B.shape[0]), dtype=np.float32)
+    for s in range(0, A.shape[0], block):
+        a = A[s:s + block] if isinstance(A, QuantizedMatrix) else np.asarray(A[s:s + block])
+        res = _widen(a) @ Bt
+        if isinstance(a, QuantizedMatrix) and a.scale is not None:
+            res *= a.scale[:, None]
+        if isinstance(B, QuantizedMatrix) and B.scale is not None:
+            res *= B.scale[None, :]
+        out[s:s + block] = res
+    return out
+
+
+def row_dots(A, rows: np.ndarray, B, cols: np.ndarray, block: int = 16384) -> np.ndarray:
+    # A[rows[i]] . B[cols[i]] for each pair, in blocks so the gathered operands stay small
+    if isinstance(B, QuantizedMatrix) and not isinstance(A, QuantizedMatrix):
+        A = quantize(A, B.precision)
+    a_data = A.data if isinstance(A, QuantizedMatrix) else np.asarray(A)
+    b_data = B.data if isinstance(B, QuantizedMatrix) else np.asarray(B)
+    a_scale = A.scale if isinstance(A, QuantizedMatrix) else None
+    b_scale = B.scale if isinstance(B, QuantizedMatrix) else None
+    out = np.empty(rows.shape[0], dtype=np.float32)
+    for s in range(0, rows.shape[0], block):
+        r, c = rows[s:s + block], cols[s:s + block]
+        res = np.einsum('ij,ij->i', a_data.take(r, axis=0).astype(np.float32, copy=False), b_data.take(c, axis=0).astype(np.float32, copy=False))
+        if a_scale is not None:
+            res *= a_scale[r]
+        if b_scale is not None:
+            res *= b_scale[c]
+        out[s:s + block] = res
+    return out
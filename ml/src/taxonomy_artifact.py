@@ -0,0 +1,113 @@
+import hashlib
+import json
+import os
+import struct
+from typing import Any, Dict, List
+
+import numpy as np
+
+# Compiled taxonomy: one binary file holding flattened label tables, parent index arrays, prompt texts
+# per prompt style and optionally label embeddings, so classifiers skip YAML/JSON parsing entirely.
+# Layout:
+#   8 bytes   magic b'THYXTAX1'
+#   8 bytes   little-endian uint64 header length
+#   header    UTF-8 JSON {"meta": {...}, "arrays": {name: {"dtype", "shape", "offset"}}}
+#   payload   raw arrays, each starting on a 64-byte boundary (offsets are from the start of the file)
+# String tables are stored as two arrays: <name>.utf8 (uint8 bytes) and <name>.offsets (int64 [n + 1]).
+# meta["content_sha1"] hashes the payload (see verify()); meta["fingerprint"] is the parsed-label
+# fingerprint the label cache uses, so an artifact and its source JSON share cache entries.
+
+MAGIC = b'THYXTAX1'
+ALIGN = 64
+ARTIFACT_VERSION = 1
+
+
+def is_artifact(path: str) -> bool:
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+def _pack_strings(values: List[str]) -> tuple[np.ndarray, np.ndarray]:
+    enc = [v.encode('utf-8') for v in values]
+    offsets = np.zeros(len(enc) + 1, dtype='<i8')
+    np.cumsum([len(b) for b in enc], out=offsets[1:])
+    return np.frombuffer(b''.join(enc), dtype=np.uint8), offsets
+
+
+def write_artifact(path: str, meta: Dict[str, Any], arrays: Dict[str, np.ndarray], strings: Dict[str, List[str]]):
+    blobs: Dict[str, np.ndarray] = {}
+    for name, values in strings.items():
+        blobs[f'{name}.utf8'], blobs[f'{name}.offsets'] = _pack_strings(values)
+    for name, arr in arrays.items():
+        arr = np.asarray(arr)
+        blobs[name] = np.ascontiguousarray(arr, dtype=arr.dtype.newbyteorder('<'))
+
+    h = hashlib.sha1()
+    for name in sorted(blobs):
+        h.update(name.encode('utf-8'))
+        h.update(blobs[name].tobytes())
+    meta = {**meta, 'version': ARTIFACT_VERSION, 'content_sha1': h.hexdigest()}
+
+    # Offsets depend on the header length, which depends on the offsets: grow until stable
+    directory: Dict[str, Dict[str, Any]] = {}
+    header_len = 0
+    while True:
+        pos = len(MAGIC) + 8 + header_len
+        for name, arr in blobs.items():
+            pos = -(-pos // ALIGN) * ALIGN
+            directory[name] = {'dtype': arr.dtype.str, 'shape': list(arr.shape), 'offset': pos}
+            pos += arr.nbytes
+        header = json.dumps({'meta': meta, 'arrays': directory}, ensure_ascii=False).encode('utf-8')
+        if len(header) <= header_len:
+            header += b' ' * (header_len - len(header))
+            break
+        header_len = len(header) + 256
+
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<Q', header_len))
+        f.write(header)
+        for name, arr in blobs.items():
+            f.write(b'\0' * (directory[name]['offset'] - f.tell()))
+            f.write(arr.tobytes())
+    os.replace(tmp, path)
+
+
+class TaxonomyArtifact:
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a compiled taxonomy (bad magic)")
+            (header_len,) = struct.unpack('<Q', f.read(8))
+            header = json.loads(f.read(header_len).decode('utf-8'))
+        self.meta: Dict[str, Any] = header['meta']
+        if self.meta.get('version') != ARTIFACT_VERSION:
+            raise ValueError(f"Unsupported compiled taxonomy version {self.meta.get('version')!r} in {path}")
+        self._arrays: Dict[str, Dict[str, Any]] = header['arrays']
+        self._mm = np.memmap(path, dtype=np.uint8, mode='r')
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._arrays or f'{name}.utf8' in self._arrays
+
+    def array(self, name: str) -> np.ndarray:
+        spec = self._arrays[name]
+        dtype = np.dtype(spec['dtype'])
+        n = int(np.prod(spec['shape'])) * dtype.itemsize
+        return self._mm[spec['offset']:spec['offset'] + n].view(dtype).reshape(spec['shape'])
+
+    def strings(self, name: str) -> List[str]:
+        blob = self.array(f'{name}.utf8').tobytes()
+        bounds = self.array(f'{name}.offsets').tolist()
+        return [blob[a:b].decode('utf-8') for a, b in zip(bounds, bounds[1:])]
+
+    def verify(self) -> bool:
+        h = hashlib.sha1()
+        for name in sorted(self._arrays):
+            h.update(name.encode('utf-8'))
+            h.update(self.array(name).tobytes())
+        return h.hexdigest() == self.meta['content_sha1']
@@ -0,0 +1,56 @@
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+# Make 'tools' and 'ml' importable from tests, like the tools/ scripts do for themselves
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+TAXONOMY = str(PROJECT_ROOT / 'ml' / 'taxonomies' / 'taxonomy.json')
+
+
+def counting_embedder():
+    # StubEmbedder that records every text it encodes
+    from tools.stub_embedder import StubEmbedder
+
+    class CountingEmbedder(StubEmbedder):
+        def __init__(self):
+            super().__init__()
+            self.encoded = []
+
+        def encode(self, texts):
+            self.encoded.extend(texts)
+            return super().encode(texts)
+    return CountingEmbedder()
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    # Offline embedder for every make_embedder() call in tools/apply_titles.py
+    from tools import apply_titles
+    emb = counting_embedder()
+    monkeypatch.setattr(apply_titles, 'make_embedder', lambda *args, **kwargs: emb)
+    return emb
+
+
+@pytest.fixture(scope='session')
+def titles():
+    from tools.apply_titles import load_titles
+    _user_id, titles = load_titles(str(PROJECT_ROOT / 'ml' / 'data' / 'titles.json'))
+    return titles[:60]
+
+
+def deep_taxonomy(path):
+    # Small three-level taxonomy in the t0/t1/t2 JSON format
+    t0 = []
+    for p in ('science', 'sports', 'music'):
+        t1 = []
+        for c in ('news', 'history'):
+            t2 = [{'id': f'{p}_{c}_{g}', 'en': f'{p} {c} {g}', 'desc': f'{g} about {p} {c}'} for g in ('tutorials', 'reviews')]
+            t1.append({'id': f'{p}_{c}', 'en': f'{p} {c}', 'desc': f'{c} of {p}', 't2': t2})
+        t0.append({'id': p, 'en': p.title(), 'desc': f'Everything about {p}', 't1': t1})
+    path.write_text(json.dumps({'t0': t0}), encoding='utf-8')
+    return str(path)
@@ -0,0 +1,105 @@
+import numpy as np
+import pytest
+
+from ml.src.analytics import DAY_MS, TopicState
+from tools.apply_titles import tag_pair
+
+# Incremental state must count like one pass: overlapping exports add each event once, and a
+# saved/reloaded state grows its day and pair axes as new exports arrive.
+
+TAGS = {'jazz solo': ('Music', 'Jazz'), 'goal replay': ('Sports', 'Soccer'), 'lofi beats': ('Music', ''), 'chess opening': ('Games', 'Chess')}
+
+
+def export(days, titles, start=0):
+    # One event per (day, title), alternating feed/shorts, timestamps mid-day
+    return [
+        {'ts': (start + d) * DAY_MS + DAY_MS // 2 + i, 'type': ('feed_video', 'shorts_video')[i % 2], 'videoId': f'v{i}', 'title': t}
+        for d in range(days) for i, t in enumerate(titles)
+    ]
+
+
+def tag_for(ev):
+    return TAGS.get(ev['title'])
+
+
+def assert_same_counts(a: TopicState, b: TopicState):
+    assert a.day0 == b.day0
+    assert a.events == b.events
+    for level in ('t0', 't1'):
+        (ca, na), (cb, nb) = a.by_label(level), b.by_label(level)
+        ta = {(d, na[l], a.types[t]): int(ca[d, l, t]) for d, l, t in zip(*np.nonzero(ca))}
+        tb = {(d, nb[l], b.types[t]): int(cb[d, l, t]) for d, l, t in zip(*np.nonzero(cb))}
+        assert ta == tb
+
+
+@pytest.mark.parametrize('tag, pair', [
+    ('Music, Jazz', ('Music', 'Jazz')),
+    ('Music, Jazz, Live sets', ('Music', 'Jazz')),
+    ('Music', ('Music', '')),
+    (['Music', 'Jazz', 'Live sets'], ('Music', 'Jazz')),
+    ({'t0': 'Music', 't1': 'Jazz', 't2': 'Live sets'}, ('Music', 'Jazz')),
+    ('', None),
+    (None, None),
+])
+def test_tag_pair(tag, pair):
+    assert tag_pair(tag) == pair
+
+
+def test_overlapping_exports_count_once():
+    first = export(3, ['jazz solo', 'goal replay'])
+    second = export(3, ['jazz solo', 'goal replay'], start=2)  # day 2 is in both exports
+    state = TopicState()
+    assert state.add_events(first, tag_for)['added'] == 6
+    stats = state.add_events(second, tag_for)
+    assert (stats['added'], stats['duplicates']) == (4, 2)
+    assert state.events == 10
+    # Repeats inside one batch are dropped too
+    assert state.add_events(first[:2] * 3, tag_for)['duplicates'] == 6
+    assert state.events == 10
+
+
+def test_unclassified_events_are_counted_later():
+    events = export(1, ['jazz solo', 'unknown title'])
+    state = TopicState()
+    stats = state.add_events(events, tag_for)
+    assert (stats['added'], stats['unclassified']) == (1, 1)
+    stats = state.add_events(events, lambda ev: tag_for(ev) or ('Other', ''))
+    assert (stats['added'], stats['duplicates']) == (1, 1)
+
+
+def test_days_and_pairs_grow_between_runs(tmp_path):
+    path = str(tmp_path / 'state.npz')
+    state = TopicState()
+    state.add_events(export(2, ['jazz solo', 'goal replay'], start=10), tag_for)
+    state.save(path)
+    assert state.counts.shape == (2, 2, 2)
+
+    state = TopicState.load(path)
+    # Earlier and later days, plus label pairs the first export never saw
+    state.add_events(export(1, ['lofi beats', 'chess opening'], start=8), tag_for)
+    state.add_events(export(1, ['jazz solo'], start=14), tag_for)
+    assert state.day0 == 8
+    assert state.counts.shape == (7, 4, 2)
+    assert state.pairs == [('Music', 'Jazz'), ('Sports', 'Soccer'), ('Music', ''), ('Games', 'Chess')]
+    assert state.counts[:2].sum() == 2 and state.counts[2:4].sum() == 4 and state.counts[6].sum() == 1
+    assert state.counts[4:6].sum() == 0
+
+
+@pytest.mark.parametrize('utc_offset', [0, 330])
+def test_save_load_incremental_matches_full_pass(tmp_path, utc_offset):
+    exports = [
+        export(3, ['jazz solo', 'goal replay']),
+        export(4, ['goal replay', 'lofi beats', 'chess opening'], start=2),
+        export(2, ['jazz solo', 'unknown title', 'chess opening'], start=5),
+    ]
+    full = TopicState(utc_offset)
+    full.add_events([ev for batch in exports for ev in batch], tag_for)
+
+    path = str(tmp_path / 'state.npz')
+    for batch in exports:
+        state = TopicState.load(path, utc_offset)
+        state.add_events(batch, tag_for)
+        state.save(path)
+    incremental = TopicState.load(path, utc_offset)
+    assert_same_counts(incremental, full)
+    assert np.array_equal(incremental.seen, full.seen)
@@ -0,0 +1,41 @@
+import json
+
+from tools.batch_titles import BatchState
+
+
+def make_user(tmp_path, name):
+    src = tmp_path / f'{name}.json'
+    src.write_text('{"titles": ["a"]}', encoding='utf-8')
+    out = tmp_path / f'{name}_tagged.json'
+    out.write_text('{}', encoding='utf-8')
+    return str(src), str(out)
+
+
+def test_journal_resumes_and_compacts(tmp_path):
+    path = str(tmp_path / 'batch_state.json')
+    users = [make_user(tmp_path, f'u{i}') for i in range(3)]
+    state = BatchState(path, 'cfg')
+    for src, out in users[:2]:
+        state.mark_done(src, out, {'titles': 1})
+    # One appended line per user; the snapshot is not rewritten
+    journal = tmp_path / 'batch_state.jsonl'
+    assert len(journal.read_text(encoding='utf-8').splitlines()) == 2
+    assert not (tmp_path / 'batch_state.json').exists()
+    # An interrupted run leaves a torn last line behind
+    with open(journal, 'a', encoding='utf-8') as f:
+        f.write('{"config": "cfg", "inp')
+
+    resumed = BatchState(path, 'cfg')
+    assert [resumed.is_done(*u) for u in users] == [True, True, False]
+    resumed.compact()
+    assert not journal.exists()
+    with open(path, 'r', encoding='utf-8') as f:
+        assert sorted(json.load(f)['done']) == sorted(src for src, _out in users[:2])
+    assert [BatchState(path, 'cfg').is_done(*u) for u in users] == [True, True, False]
+
+
+def test_other_settings_are_ignored(tmp_path):
+    path = str(tmp_path / 'batch_state.json')
+    user = make_user(tmp_path, 'u0')
+    BatchState(path, 'old').mark_done(*user, {'titles': 1})
+    assert not BatchState(path, 'new').is_done(*user)
@@ -0,0 +1,18 @@
+import pytest
+
+from conftest import TAXONOMY
+from tools.apply_titles import predict_titles
+
+
+def test_stats_count_distinct_titles(tmp_path, stub, titles):
+    stats = {}
+    mapping = predict_titles(titles + titles[:10], 'zero-shot-joint', '', TAXONOMY, cache_dir=str(tmp_path), title_cache=False, cascade_embedder='me5', cascade_margin=1.0, cascade_stats=stats)
+    assert stats['titles'] == len(mapping) == len(set(titles))
+    assert stats['escalated'] == len(stats['escalated_titles']) == stats['decided_by']['me5']
+    assert sum(stats['decided_by'].values()) == stats['titles']
+
+
+@pytest.mark.parametrize('extra', [{'embedder': object()}, {'labels': object()}, {'vectors': object()}, {'pipeline_depth': 2}])
+def test_rejects_single_stage_arguments(tmp_path, extra):
+    with pytest.raises(ValueError):
+        predict_titles(['a'], 'zero-shot-joint', '', TAXONOMY, cache_dir=str(tmp_path), cascade_embedder='me5', **extra)
@@ -0,0 +1,24 @@
+import json
+
+import pytest
+
+from conftest import TAXONOMY, deep_taxonomy
+from tools.apply_titles import columnar_document, predict_titles, predict_titles_columnar, run_metadata
+
+# --columnar must round-trip: columnar_document() rebuilds exactly the JSON document a plain run writes.
+
+
+@pytest.mark.parametrize('detail', [False, True])
+@pytest.mark.parametrize('mode, deep', [('zero-shot-joint', False), ('zero-shot', False), ('zero-shot-joint', True)])
+def test_columnar_document_matches_predict_titles(tmp_path, stub, titles, mode, deep, detail):
+    taxonomy = deep_taxonomy(tmp_path / 'deep.json') if deep else TAXONOMY
+    settings = dict(alpha=0.3, topk_parent=None, output_format='pair-array', embedder_key='minilm', detail=detail, topk_children=5, cache_dir=str(tmp_path), title_cache=False)
+
+    mapping = predict_titles(titles, mode, '', taxonomy, **settings)
+    expected = {'user_id': 'u1', 'titles_to_tag_map': mapping, **run_metadata(mode, 0.3, None, 'minilm', 'torch', detail, 5)}
+
+    out = tmp_path / 'result.cols'
+    rows = predict_titles_columnar(titles, 'u1', str(out), mode, taxonomy, chunk_size=16, **settings)
+    assert rows == len(titles)
+    # Compare the documents as they would be written to disk
+    assert json.loads(json.dumps(columnar_document(str(out)))) == json.loads(json.dumps(expected))
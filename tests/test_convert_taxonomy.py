@@ -0,0 +1,27 @@
+import json
+import subprocess
+import sys
+
+from conftest import PROJECT_ROOT
+from ml.src.models import BACKENDS
+
+
+def run(*args):
+    return subprocess.run([sys.executable, 'tools/convert_taxonomy.py', *args], cwd=PROJECT_ROOT, capture_output=True, text=True)
+
+
+def test_backend_choices_match_the_embedder(tmp_path):
+    proc = run('--backend', 'onnx_int8', '--output', str(tmp_path / 'out.json'))
+    assert proc.returncode == 2
+    assert "invalid choice: 'onnx_int8'" in proc.stderr
+    assert all(f"'{b}'" in proc.stderr for b in BACKENDS)
+    assert not (tmp_path / 'out.json').exists()
+
+
+def test_yaml_converts_to_json(tmp_path):
+    src = tmp_path / 't0.yaml'
+    src.write_text('t0:\n  - id: b\n    en: B\n    desc: "x: y"\n  - id: a\n    en: A\n    desc: plain\n    t1:\n      - {id: a1, en: A1, desc: child}\n', encoding='utf-8')
+    proc = run('--input', str(src), '--output', str(tmp_path / 'out.json'), '--backend', 'onnx')
+    assert proc.returncode == 0, proc.stderr
+    doc = json.loads((tmp_path / 'out.json').read_text(encoding='utf-8'))
+    assert [p['id'] for p in doc['t0']] == ['a', 'b']
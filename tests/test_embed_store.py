@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+
+from ml.src.embed_store import EmbeddingStore, KEY_BYTES, text_key
+
+DIM = 8
+
+
+def vectors(n, seed=0):
+    v = np.random.default_rng(seed).standard_normal((n, DIM)).astype(np.float32)
+    return v / np.linalg.norm(v, axis=1, keepdims=True)
+
+
+def keys(names):
+    return [text_key(n) for n in names]
+
+
+@pytest.mark.parametrize('dtype', ['float32', 'int8'])
+def test_hits_and_misses_after_reopen(tmp_path, dtype):
+    store = EmbeddingStore(str(tmp_path), dtype=dtype)
+    V = vectors(3)
+    store.append(keys(['a', 'b', 'c']), V)
+
+    store = EmbeddingStore(str(tmp_path), dtype=dtype)
+    rows = store.lookup(keys(['c', 'x', 'a']))
+    assert rows[1] == -1 and (rows[[0, 2]] >= 0).all()
+    np.testing.assert_allclose(store.get(rows[[0, 2]]), V[[2, 0]], atol=1e-2 if dtype == 'int8' else 0)
+    # Normalized text shares a key
+    assert store.lookup(keys(['  a ']))[0] == rows[2]
+
+
+@pytest.mark.parametrize('dtype', ['float32', 'int8'])
+def test_torn_append_is_repaired(tmp_path, dtype):
+    store = EmbeddingStore(str(tmp_path), dtype=dtype)
+    V = vectors(4)
+    store.append(keys(['a', 'b', 'c', 'd']), V)
+    # Crash mid-append: the vector row of 'e' was written, its key only partly
+    with open(store._vec_path, 'ab') as f:
+        f.write(np.ones(DIM, dtype=dtype).tobytes())
+    with open(store._keys_path, 'ab') as f:
+        f.write(text_key('e')[:KEY_BYTES // 2])
+
+    store = EmbeddingStore(str(tmp_path), dtype=dtype)
+    assert len(store) == 4
+    assert (tmp_path / 'keys.bin').stat().st_size == 4 * KEY_BYTES
+    assert (tmp_path / 'vectors.bin').stat().st_size == 4 * DIM * np.dtype(dtype).itemsize
+    rows = store.lookup(keys(['a', 'b', 'c', 'd', 'e']))
+    assert rows.tolist() == [0, 1, 2, 3, -1]
+    np.testing.assert_allclose(store.get(rows[:4]), V, atol=1e-2 if dtype == 'int8' else 0)
+
+
+@pytest.mark.parametrize('dtype', ['float32', 'int8'])
+def test_eviction_keeps_rows_used_in_this_run(tmp_path, dtype):
+    entry = EmbeddingStore(str(tmp_path / 'probe'), dtype=dtype)
+    entry.append(keys(['probe']), vectors(1))
+    max_bytes = 40 * entry.nbytes  # room for 40 rows
+
+    old = [f'old{i}' for i in range(40)]
+    EmbeddingStore(str(tmp_path / 's'), max_bytes=max_bytes, dtype=dtype).append(keys(old), vectors(40))
+
+    # A new run uses five old rows, then appends more than the budget holds
+    store = EmbeddingStore(str(tmp_path / 's'), max_bytes=max_bytes, dtype=dtype)
+    used = old[:5]
+    assert (store.lookup(keys(used)) >= 0).all()
+    rewrites = 0
+    rewrite = store._rewrite
+
+    def counting_rewrite(*args):
+        nonlocal rewrites
+        rewrites += 1
+        rewrite(*args)
+    store._rewrite = counting_rewrite
+    new = [f'new{i}' for i in range(30)]
+    for i in range(0, 30, 2):
+        store.append(keys(new[i:i + 2]), vectors(2, seed=i))
+        assert store.nbytes <= max_bytes
+
+    # Evicting to the low-water mark leaves room for the next appends instead of rewriting on each one
+    assert rewrites <= 4  # of 15 appends; trimming to exactly max_bytes rewrote on every one
+    store = EmbeddingStore(str(tmp_path / 's'), max_bytes=max_bytes, dtype=dtype)
+    assert store.nbytes <= max_bytes
+    assert (store.lookup(keys(used)) >= 0).all()
+    assert (store.lookup(keys(new[-10:])) >= 0).all()
+
+
+def test_eviction_keeps_a_large_working_set(tmp_path):
+    entry = EmbeddingStore(str(tmp_path / 'probe'))
+    entry.append(keys(['probe']), vectors(1))
+    max_bytes = 50 * entry.nbytes
+    store = EmbeddingStore(str(tmp_path / 's'), max_bytes=max_bytes)
+    store.append(keys([f'old{i}' for i in range(40)]), vectors(40))
+
+    # This run uses 45 rows, more than the low-water mark but within max_bytes: all of them stay
+    store = EmbeddingStore(str(tmp_path / 's'), max_bytes=max_bytes)
+    used = [f'old{i}' for i in range(5)] + [f'new{i}' for i in range(40)]
+    store.lookup(keys(used[:5]))
+    store.append(keys(used[5:]), vectors(40, seed=1))
+    assert store.nbytes <= max_bytes
+    assert (EmbeddingStore(str(tmp_path / 's')).lookup(keys(used)) >= 0).all()
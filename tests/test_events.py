@@ -0,0 +1,37 @@
+import json
+
+import pytest
+
+from conftest import TAXONOMY
+from ml.src.embed_store import normalize_text
+from tools.apply_titles import predict_events, predict_titles, run_metadata
+
+
+@pytest.mark.parametrize('pipeline_depth', [0, 2])
+def test_tags_fan_back_to_their_events(tmp_path, stub, titles, pipeline_depth):
+    events = []
+    for i, title in enumerate(titles[:20]):
+        events.append({'ts': i, 'type': 'feed', 'title': title, 'videoId': f'v{i}'})
+        if i % 3 == 0:
+            # Repeats, including whitespace variants that normalize to the same title
+            events.append({'ts': i + 100, 'type': 'shorts', 'title': f'  {title} '})
+            events.append({'ts': i + 200, 'type': 'feed', 'title': ''})
+        if i % 5 == 0:
+            events.append({'ts': i + 300, 'type': 'feed', 'title': None})
+            events.append({'ts': i + 400, 'type': 'feed'})
+    src = tmp_path / 'events.json'
+    src.write_text(json.dumps(events), encoding='utf-8')
+    out = tmp_path / 'events_tagged.jsonl'
+
+    stats = predict_events(str(src), str(out), 'zero-shot-joint', TAXONOMY, detail=True, topk_children=3, cache_dir=str(tmp_path), title_cache=False, chunk_size=4, pipeline_depth=pipeline_depth)
+    lines = [json.loads(line) for line in out.read_text(encoding='utf-8').splitlines()]
+    meta, written = lines[0]['meta'], lines[1:]
+
+    distinct = list(dict.fromkeys(normalize_text(e['title']) for e in events if e.get('title')))
+    assert stats == {'events': len(events), 'distinct_titles': len(distinct), 'untitled_events': sum(1 for e in events if not e.get('title'))}
+    assert meta == {'source': 'events', **run_metadata('zero-shot-joint', 0.3, None, 'minilm', 'torch', True, 3), **stats}
+    expected = predict_titles(distinct, 'zero-shot-joint', '', TAXONOMY, detail=True, topk_children=3, cache_dir=str(tmp_path), title_cache=False)
+    assert len(written) == len(events)
+    for ev, got in zip(events, written):
+        assert {k: v for k, v in got.items() if k != 'tags'} == ev
+        assert got['tags'] == (expected[normalize_text(ev['title'])] if ev.get('title') else None)
@@ -0,0 +1,79 @@
+import json
+
+import numpy as np
+
+from conftest import TAXONOMY
+from ml.src.label_cache import LabelCache
+from ml.src.profiling import NULL_PROFILER
+from tools.apply_titles import _pool_encode, get_cached_label_embeddings
+
+
+def taxonomy_doc():
+    with open(TAXONOMY, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def write(path, doc, **dump):
+    path.write_text(json.dumps(doc, ensure_ascii=False, **dump), encoding='utf-8')
+    return str(path)
+
+
+def label_count(doc):
+    return sum(1 + len(p.get('t1') or []) for p in doc['t0'])
+
+
+def test_edits_reencode_only_changed_labels(tmp_path, stub):
+    doc = taxonomy_doc()
+    cache = str(tmp_path / 'cache')
+    _p, _c, p_emb, c_emb = get_cached_label_embeddings(write(tmp_path / 'a.json', doc), 'minilm', stub, cache_dir=cache)
+    assert len(stub.encoded) == label_count(doc) == p_emb.shape[0] + c_emb.shape[0]
+
+    # Same labels, different bytes: no encoding at all
+    stub.encoded.clear()
+    reformatted = get_cached_label_embeddings(write(tmp_path / 'b.json', doc, indent=4), 'minilm', stub, cache_dir=cache)
+    assert stub.encoded == []
+    np.testing.assert_array_equal(reformatted[3], c_emb)
+
+    # One changed description: one new prompt
+    doc['t0'][2]['t1'][1]['desc'] = 'Something else entirely'
+    _p, children, _pe, edited = get_cached_label_embeddings(write(tmp_path / 'c.json', doc), 'minilm', stub, cache_dir=cache)
+    assert len(stub.encoded) == 1 and 'Something else entirely' in stub.encoded[0]
+    changed = [i for i, c in enumerate(children) if c['desc'] == 'Something else entirely']
+    same = np.ones(edited.shape[0], dtype=bool)
+    same[changed] = False
+    np.testing.assert_array_equal(np.asarray(edited)[same], np.asarray(c_emb)[same])
+
+
+def test_entries_are_capped_lru(tmp_path):
+    cache = LabelCache(str(tmp_path), max_entries=16)
+    arrays = {'p_emb': np.ones((2, 4), dtype=np.float32), 'c_emb': np.ones((3, 4), dtype=np.float32)}
+    keys = [cache.put('m', 'plain', f'fp{i}', f'sha{i}', {'parents': [], 'children': []}, arrays) for i in range(16)]
+    # Using the oldest entry makes the second oldest the one to go
+    cache.touch(keys[0])
+    keys.append(cache.put('m', 'plain', 'fp16', 'sha16', {'parents': [], 'children': []}, arrays))
+    with open(tmp_path / 'index.json', 'r', encoding='utf-8') as f:
+        entries = json.load(f)['entries']
+    assert len(entries) == 16
+    assert keys[1] not in entries and not (tmp_path / keys[1]).exists()
+    assert keys[0] in entries and keys[16] in entries
+    assert cache.find('m', 'plain', file_sha1='sha0') == keys[0]
+    assert cache.load(keys[1]) is None
+
+
+def test_pool_keeps_prompts_of_the_current_build(tmp_path, stub):
+    cache = LabelCache(str(tmp_path))
+    old = [f'old label {i}' for i in range(40)]
+    current = [f'current label {i}' for i in range(40)]
+    _pool_encode(cache, 'minilm', 'plain', old, stub, NULL_PROFILER, {})
+    # Room for about 50 prompts: building the current labels must push out old prompts, not its own
+    cache.pool_max_mb = 50 * (stub.dim * 4 + 20) / 2**20
+    _pool_encode(cache, 'minilm', 'plain', old[:5] + current, stub, NULL_PROFILER, {})
+
+    stub.encoded.clear()
+    st = {}
+    _pool_encode(cache, 'minilm', 'plain', old[:5] + current, stub, NULL_PROFILER, st)
+    assert st['labels_encoded'] == 0 and stub.encoded == []
+    assert cache.pool('minilm', 'plain').nbytes <= cache.pool_max_mb * 2**20
+    st = {}
+    _pool_encode(cache, 'minilm', 'plain', old[5:], stub, NULL_PROFILER, st)
+    assert st['labels_encoded'] > 0
@@ -0,0 +1,74 @@
+import random
+import threading
+import time
+
+import pytest
+
+from ml.src.pipeline import pipelined
+
+
+def pipeline_threads():
+    return [t for t in threading.enumerate() if t.name.startswith('pipeline-')]
+
+
+def sleepy(seed):
+    # A stage whose per-item delay varies, so later items can finish a stage before earlier ones would
+    rng = random.Random(seed)
+
+    def stage(item):
+        time.sleep(rng.uniform(0, 0.005))
+        return item
+    return stage
+
+
+def test_keeps_source_order_with_uneven_delays():
+    stages = [sleepy(1), lambda x: x * 2, sleepy(2), lambda x: x + 1]
+    assert list(pipelined(range(200), stages, depth=3)) == [x * 2 + 1 for x in range(200)]
+    assert pipeline_threads() == []
+
+
+def test_stage_exception_reraised_in_consumer():
+    def boom(x):
+        if x == 7:
+            raise KeyError(x)
+        return x
+
+    got = []
+    with pytest.raises(KeyError):
+        for item in pipelined(range(50), [sleepy(3), boom], depth=2):
+            got.append(item)
+    assert got == list(range(7))
+    assert pipeline_threads() == []
+
+
+def test_source_exception_reraised_in_consumer():
+    def source():
+        yield 1
+        raise ValueError('bad export')
+
+    with pytest.raises(ValueError, match='bad export'):
+        list(pipelined(source(), [lambda x: x], depth=2))
+    assert pipeline_threads() == []
+
+
+def test_close_joins_all_threads():
+    gen = pipelined(iter(range(10_000)), [sleepy(4), lambda x: x], depth=2)
+    assert next(gen) == 0
+    assert len(pipeline_threads()) == 3
+    gen.close()
+    assert pipeline_threads() == []
+
+
+def test_depth_zero_runs_inline():
+    seen = []
+
+    def record(x):
+        seen.append(threading.current_thread().name)
+        return x - 1
+
+    stages = [lambda x: x * 3, record]
+    inline = list(pipelined(range(20), stages, depth=0))
+    assert inline == [record(x * 3) for x in range(20)]
+    assert set(seen) == {threading.current_thread().name}
+    assert pipeline_threads() == []
+    assert list(pipelined(range(20), stages, depth=4)) == inline
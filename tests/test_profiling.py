@@ -0,0 +1,67 @@
+import threading
+import time
+
+from ml.src.pipeline import pipelined
+from ml.src.profiling import Profiler
+
+
+def busy(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def test_sequential_and_nested_stages_record_cpu_time():
+    prof = Profiler()
+    with prof.stage('encode'):
+        with prof.stage('model_load'):
+            busy(0.02)
+        busy(0.02)
+    with prof.stage('score'):
+        busy(0.02)
+    stages = prof.summary()['stages']
+    assert stages['model_load']['cpu_s'] > 0.01
+    assert stages['encode']['cpu_s'] >= stages['model_load']['cpu_s']
+    assert stages['score']['cpu_s'] > 0.01
+
+
+def test_concurrent_stages_record_no_cpu_time():
+    prof = Profiler()
+    both_open = threading.Barrier(2)
+
+    def worker():
+        with prof.stage('encode'):
+            both_open.wait()
+            busy(0.01)
+        both_open.wait()
+
+    t = threading.Thread(target=worker)
+    t.start()
+    with prof.stage('score'):
+        both_open.wait()
+    both_open.wait()
+    t.join()
+    with prof.stage('serialize'):
+        busy(0.01)
+    stages = prof.summary()['stages']
+    # 'encode' was still open when 'score' closed, and 'score' opened while 'encode' was open
+    assert stages['encode']['cpu_s'] is None and stages['score']['cpu_s'] is None
+    assert stages['encode']['wall_s'] > 0
+    # A later stage with nothing running beside it gets its CPU time again
+    assert stages['serialize']['cpu_s'] > 0
+
+
+def test_pipelined_stages_keep_wall_time():
+    prof = Profiler()
+
+    def stage(name):
+        def run(item):
+            with prof.stage(name):
+                busy(0.001)
+            return item
+        return run
+
+    assert list(pipelined(range(20), [stage('encode'), stage('score')], depth=2)) == list(range(20))
+    stages = prof.summary()['stages']
+    assert stages['encode']['calls'] == stages['score']['calls'] == 20
+    assert stages['encode']['wall_s'] > 0
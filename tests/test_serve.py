@@ -0,0 +1,19 @@
+import pytest
+
+from conftest import TAXONOMY
+from tools import serve_titles
+from tools.apply_titles import predict_titles, run_metadata
+from tools.serve_titles import ClassifierService
+
+
+@pytest.mark.parametrize('precision', ['float32', 'int8'])
+@pytest.mark.parametrize('request_opts', [{}, {'detail': True, 'topk_children': 3, 'beam': 4, 'alpha': 0.5}])
+def test_classify_returns_the_apply_titles_document(tmp_path, monkeypatch, stub, titles, precision, request_opts):
+    monkeypatch.setattr(serve_titles, 'make_embedder', lambda *args, **kwargs: stub)
+    service = ClassifierService(TAXONOMY, cache_dir=str(tmp_path), precision=precision)
+    doc = service.classify({'titles': titles, 'user_id': 'u1', **request_opts}, 'minilm')
+
+    opts = {**serve_titles.REQUEST_DEFAULTS, **request_opts}
+    mapping = predict_titles(titles, opts['mode'], '', TAXONOMY, alpha=opts['alpha'], topk_parent=opts['topk_parent'], embedder_key='minilm', detail=opts['detail'], topk_children=opts['topk_children'], beam=opts['beam'], precision=precision, cache_dir=str(tmp_path))
+    meta = run_metadata(opts['mode'], opts['alpha'], opts['topk_parent'], 'minilm', 'torch', opts['detail'], opts['topk_children'], opts['beam'], precision)
+    assert doc == {'user_id': 'u1', 'titles_to_tag_map': mapping, **meta}
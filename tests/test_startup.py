@@ -0,0 +1,41 @@
+import json
+import subprocess
+import sys
+import time
+
+import pytest
+
+from conftest import PROJECT_ROOT
+
+# Startup-time regression check: importing the ml package or the tools, and running --help, must not
+# pull in the heavy ML stacks (they load on first encode) and must stay within a wall-time budget.
+
+HEAVY_MODULES = ('torch', 'sentence_transformers', 'transformers')
+MAX_SECONDS = 2.0  # per probe, including interpreter start
+
+
+def run(args):
+    t0 = time.perf_counter()
+    proc = subprocess.run([sys.executable, *args], cwd=PROJECT_ROOT, capture_output=True, text=True)
+    return time.perf_counter() - t0, proc
+
+
+@pytest.mark.parametrize('modules', [
+    'ml.src.models, ml.src.labels',
+    'tools.apply_titles',
+    'tools.serve_titles',
+    'tools.batch_titles',
+])
+def test_import_does_not_load_ml_stacks(modules):
+    probe = f"import json, sys\nimport {modules}\nprint(json.dumps(sorted(m for m in {HEAVY_MODULES!r} if m in sys.modules)))\n"
+    elapsed, proc = run(['-c', probe])
+    assert proc.returncode == 0, proc.stderr
+    assert json.loads(proc.stdout.strip().splitlines()[-1]) == []
+    assert elapsed <= MAX_SECONDS
+
+
+@pytest.mark.parametrize('tool', ['apply_titles.py', 'convert_taxonomy.py', 'serve_titles.py', 'batch_titles.py'])
+def test_help_within_budget(tool):
+    elapsed, proc = run([f'tools/{tool}', '--help'])
+    assert proc.returncode == 0, proc.stderr
+    assert elapsed <= MAX_SECONDS
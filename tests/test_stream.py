@@ -0,0 +1,73 @@
+import json
+
+import pytest
+
+from tools.apply_titles import stream_events, stream_titles
+
+TRICKY = [
+    'plain title',
+    'He said "hi" \\ then {left} and [right], "titles": [',
+    'emoji 🎵 and tabs\tinside',
+    {'title': 'object with } brace', 'videoId': 'x'},
+    'last',
+]
+EXPECTED = [t['title'] if isinstance(t, dict) else t for t in TRICKY]
+
+
+def write(tmp_path, doc, name='in.json'):
+    path = tmp_path / name
+    path.write_text(json.dumps(doc, ensure_ascii=False), encoding='utf-8')
+    return str(path)
+
+
+@pytest.mark.parametrize('read_chars', [1, 7, 64, 1 << 16])
+def test_records_split_across_reads(tmp_path, read_chars):
+    path = write(tmp_path, {'user_id': 'u"1', 'titles': TRICKY})
+    user_id, titles = stream_titles(path, read_chars=read_chars)
+    assert (user_id, list(titles)) == ('u"1', EXPECTED)
+
+
+def test_missing_user_id(tmp_path):
+    path = write(tmp_path, {'titles_to_tag_map': ['a', 'b']})
+    user_id, titles = stream_titles(path, read_chars=5)
+    assert (user_id, list(titles)) == ('', ['a', 'b'])
+    user_id, titles = stream_titles(write(tmp_path, ['a', {'title': 'b'}], 'bare.json'), read_chars=5)
+    assert (user_id, list(titles)) == ('', ['a', 'b'])
+
+
+def test_numeric_user_id(tmp_path):
+    user_id, titles = stream_titles(write(tmp_path, {'user_id': 12345, 'titles': ['a']}))
+    assert (user_id, list(titles)) == ('12345', ['a'])
+
+
+@pytest.mark.parametrize('tail', ['', ', "unfinished ti', ', {"title": "half"'])
+def test_truncated_final_record(tmp_path, tail):
+    path = tmp_path / 'in.json'
+    path.write_text('{"user_id": "u", "titles": ["a", "b"' + tail, encoding='utf-8')
+    _user_id, titles = stream_titles(str(path), read_chars=4)
+    assert next(titles) == 'a'
+    with pytest.raises(ValueError):
+        list(titles)
+
+
+@pytest.mark.parametrize('read_chars', [3, 1 << 16])
+def test_stream_events_keeps_every_field(tmp_path, read_chars):
+    events = [
+        {'ts': 1, 'type': 'feed', 'title': 'a "b" {c}', 'videoId': 'v1'},
+        {'ts': 2, 'type': 'shorts', 'title': '', 'page': '[x]'},
+        {'ts': 3, 'type': 'feed', 'title': None},
+    ]
+    path = write(tmp_path, events, 'events.json')
+    assert list(stream_events(path, read_chars=read_chars)) == events
+    jsonl = tmp_path / 'events.jsonl'
+    jsonl.write_text('\n'.join(json.dumps(e) for e in events) + '\n\n', encoding='utf-8')
+    assert list(stream_events(str(jsonl))) == events
+
+
+def test_stream_events_truncated(tmp_path):
+    path = tmp_path / 'events.json'
+    path.write_text('[{"ts": 1, "title": "a"}, {"ts": 2, "tit', encoding='utf-8')
+    events = stream_events(str(path), read_chars=8)
+    assert next(events)['ts'] == 1
+    with pytest.raises(ValueError):
+        list(events)
@@ -0,0 +1,37 @@
+import pytest
+
+from conftest import TAXONOMY, deep_taxonomy
+from ml.src.taxonomy_artifact import TaxonomyArtifact
+from tools.apply_titles import compile_taxonomy, predict_titles, taxonomy_fingerprint
+
+# A compiled taxonomy (.thyx) must classify exactly like its source JSON and share its fingerprint;
+# verify() must catch a damaged payload.
+
+
+@pytest.mark.parametrize('deep', [False, True])
+@pytest.mark.parametrize('embedders', [(), ('minilm',)])
+def test_artifact_matches_source(tmp_path, stub, titles, deep, embedders):
+    source = deep_taxonomy(tmp_path / 'deep.json') if deep else TAXONOMY
+    artifact = str(tmp_path / 'taxonomy.thyx')
+    compile_taxonomy(source, artifact, embedders, cache_dir=str(tmp_path / 'compile_cache'))
+
+    assert taxonomy_fingerprint(artifact) == taxonomy_fingerprint(source)
+    assert TaxonomyArtifact(artifact).verify()
+    # Separate caches, so the artifact run cannot reuse label vectors from the JSON run
+    settings = dict(detail=True, topk_children=5, title_cache=False)
+    want = predict_titles(titles, 'zero-shot-joint', '', source, cache_dir=str(tmp_path / 'json_cache'), **settings)
+    got = predict_titles(titles, 'zero-shot-joint', '', artifact, cache_dir=str(tmp_path / 'thyx_cache'), **settings)
+    assert got == want
+
+
+def test_verify_detects_corrupted_payload(tmp_path, stub):
+    path = tmp_path / 'taxonomy.thyx'
+    compile_taxonomy(TAXONOMY, str(path), ('minilm',), cache_dir=str(tmp_path))
+    art = TaxonomyArtifact(str(path))
+    offset = art._arrays['level1.en.utf8']['offset']
+    del art
+
+    data = bytearray(path.read_bytes())
+    data[offset] ^= 0x01
+    path.write_bytes(bytes(data))
+    assert not TaxonomyArtifact(str(path)).verify()
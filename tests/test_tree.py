@@ -0,0 +1,110 @@
+import json
+
+import numpy as np
+import pytest
+
+from conftest import PROJECT_ROOT, TAXONOMY, deep_taxonomy
+from tools import apply_titles
+from tools.apply_titles import encode_titles, get_cached_label_embeddings, load_label_set, load_taxonomy_levels, predict_titles, taxonomy_depth, tree_columns
+
+# Deep taxonomies: beam search against exhaustive scoring, two-level output unchanged by the tree code,
+# and the depth the label cache reports.
+
+
+def uneven_taxonomy(path):
+    # Four levels with uneven branching; some paths end at level 1 or 2
+    rng = np.random.default_rng(0)
+    words = ['news', 'history', 'tutorials', 'reviews', 'music', 'games', 'science', 'travel', 'food', 'live']
+
+    def nodes(level, prefix):
+        out = []
+        for i in range(int(rng.integers(1, 4)) if level else 5):
+            name = f'{prefix} {words[int(rng.integers(len(words)))]} {i}'.strip()
+            node = {'id': name.replace(' ', '_'), 'en': name, 'desc': f'{name} {words[int(rng.integers(len(words)))]}'}
+            if level < 3 and rng.random() < 0.75:
+                node[f't{level + 1}'] = nodes(level + 1, name)
+            out.append(node)
+        return out
+    path.write_text(json.dumps({'t0': nodes(0, '')}), encoding='utf-8')
+    return str(path)
+
+
+def exhaustive(V, levels, embs, alpha):
+    # Score every node down every path; the best path ends at the best-scoring node without children
+    scores = [V @ np.asarray(embs[0]).T]
+    leaf = []
+    for lvl in range(1, len(levels)):
+        parent = np.array([n['parent'] for n in levels[lvl]])
+        scores.append((1 - alpha) * (V @ np.asarray(embs[lvl]).T) + alpha * scores[-1][:, parent])
+    offset = np.cumsum([0] + [len(nodes) for nodes in levels[:-1]])
+    for lvl, nodes in enumerate(levels):
+        has_children = set(n['parent'] for n in levels[lvl + 1]) if lvl + 1 < len(levels) else set()
+        leaf += [(offset[lvl] + i, lvl, i) for i in range(len(nodes)) if i not in has_children]
+    all_scores = np.stack([scores[lvl][:, i] for _g, lvl, i in leaf], axis=1)
+    gids = np.array([g for g, _l, _i in leaf])
+    order = np.argsort(-all_scores, axis=1, kind='stable')
+    return gids[order], np.take_along_axis(all_scores, order, axis=1)
+
+
+@pytest.mark.parametrize('alpha', [0.0, 0.3, 0.7])
+def test_wide_beam_matches_exhaustive(tmp_path, stub, titles, alpha):
+    path = uneven_taxonomy(tmp_path / 'uneven.json')
+    levels, embs = load_label_set(path, 'minilm', stub, cache_dir=str(tmp_path))
+    assert len(levels) == 4
+    V = encode_titles(titles, 'minilm', stub, str(tmp_path), title_cache=False)
+    cols = tree_columns(V, levels, embs, alpha=alpha, beam=10_000, detail=True, topk_children=5)
+    best, scores = exhaustive(V, levels, embs, alpha)
+    np.testing.assert_array_equal(cols['node'], best[:, 0])
+    np.testing.assert_allclose(cols['combined'], scores[:, :5], rtol=1e-5, atol=1e-6)
+
+
+def test_two_level_output_unchanged(tmp_path, stub):
+    # Produced with StubEmbedder by the scorer as it was before deep-taxonomy support (titles are
+    # pre-normalized, so the later normalize-before-encode change does not affect them)
+    with open(PROJECT_ROOT / 'tests' / 'data' / 'two_level_stub.json', 'r', encoding='utf-8') as f:
+        golden = json.load(f)
+    for run in golden['runs']:
+        s = run['settings']
+        got = predict_titles(golden['titles'], s['mode'], '', TAXONOMY, topk_parent=s['topk_parent'], output_format=s['output_format'], detail=s['detail'], topk_children=3, cache_dir=str(tmp_path), title_cache=False)
+        assert json.loads(json.dumps(got)) == run['titles_to_tag_map'], s
+
+
+@pytest.mark.parametrize('output_format', ['pair-array', 'pair-string', 'object'])
+def test_three_level_paths(tmp_path, stub, titles, output_format):
+    path = deep_taxonomy(tmp_path / 'deep.json')
+    mapping = predict_titles(titles, 'zero-shot-joint', '', path, output_format=output_format, cache_dir=str(tmp_path), title_cache=False)
+    for tag in mapping.values():
+        if output_format == 'pair-array':
+            assert len(tag) == 3
+        elif output_format == 'pair-string':
+            assert len(tag.split(', ')) == 3
+        else:
+            assert set(tag) == {'t0', 't1', 't2'}
+
+
+def test_depth_ignores_two_level_entries_of_deep_files(tmp_path, stub, titles):
+    path = deep_taxonomy(tmp_path / 'deep.json')
+    cache = str(tmp_path / 'cache')
+    # Two-level callers (sweep_titles.py, zero_shot_joint_titles) build a hier entry for the file first
+    get_cached_label_embeddings(path, 'minilm', stub, cache_dir=cache)
+    assert taxonomy_depth(path, cache) == 3
+    mapping = predict_titles(titles, 'zero-shot-joint', '', path, cache_dir=cache, title_cache=False)
+    assert all(len(tag) == 3 for tag in mapping.values())
+
+
+def test_depth_comes_from_the_cache_when_known(tmp_path, monkeypatch, stub):
+    two = tmp_path / 'two.json'
+    two.write_text(open(TAXONOMY, 'r', encoding='utf-8').read(), encoding='utf-8')
+    deep = deep_taxonomy(tmp_path / 'deep.json')
+    cache = str(tmp_path / 'cache')
+    load_label_set(str(two), 'minilm', stub, cache_dir=cache)
+    load_label_set(deep, 'minilm', stub, cache_dir=cache)
+
+    # A fresh process: nothing memoized, and parsing would fail
+    monkeypatch.setattr(apply_titles, '_TAXONOMY_DEPTHS', {})
+
+    def no_parse(path):
+        raise AssertionError(f'parsed {path}')
+    monkeypatch.setattr(apply_titles, 'load_taxonomy_levels', no_parse)
+    assert taxonomy_depth(str(two), cache) == 2
+    assert taxonomy_depth(deep, cache) == 3
@@ -2,8 +2,9 @@ import argparse
 import json
 import os
 import sys
+from array import array
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable, Iterator
 
 # Ensure project root is on sys.path so 'ml' package is importable when running from tools/
 PROJECT_ROOT = Path(__file__).resolve().parents[1]
@@ -11,7 +12,14 @@ if str(PROJECT_ROOT) not in sys.path:
     sys.path.insert(0, str(PROJECT_ROOT))
 
 # Import from project modules
-from ml.src.models import Embedder
+from ml.src.models import BACKENDS, Embedder
+from ml.src.columnar import ColumnarResult, ColumnarWriter
+from ml.src.embed_store import EmbeddingStore, normalize_text, text_key
+from ml.src.pipeline import pipelined
+from ml.src.label_cache import LabelCache, label_fingerprint, prompt_key, tree_fingerprint
+from ml.src.profiling import NULL_PROFILER, Profiler
+from ml.src.taxonomy_artifact import TaxonomyArtifact, is_artifact, write_artifact
+from ml.src.quant import PRECISIONS, matmul_t, precision_of, quantize, row_dots
 import yaml
 import re
 import json as jsonlib
@@ -32,6 +40,95 @@ def _safe_model_key(name: str) -> str:
     return safe
 
 
+def prompt_style(model_key: str) -> str:
+    # heuristic: any e5 / multilingual-e5 variant uses asymmetric query:/passage: prompts
+    return 'e5' if 'e5' in model_key.lower() else 'default'
+
+
+# Label prompt prefix per prompt style (titles use 'query: ' for e5, see title_prompts)
+LABEL_PROMPT_PREFIX = {'default': '', 'e5': 'passage: '}
+
+
+def make_embedder(model_key: str, backend: str = 'torch', cache_dir: str = 'ml/out', workers: int = 1) -> Embedder:
+    # Construction is cheap; the model itself loads on first encode
+    return Embedder(model_key, backend=backend, onnx_dir=os.path.join(cache_dir, 'onnx'), workers=workers)
+
+
+def cache_model_key(model_key: str, embedder=None) -> str:
+    # Non-torch backends produce slightly different vectors, so they get their own cache entries
+    backend = getattr(embedder, 'backend', 'torch')
+    return model_key if backend == 'torch' else f'{model_key}@{backend}'
+
+
+def title_prompts(titles: List[str], model_key: str) -> List[str]:
+    if prompt_style(model_key) == 'e5':
+        return [f"query: {t}" for t in titles]
+    return list(titles)
+
+
+_TITLE_STORES: Dict[str, EmbeddingStore] = {}
+
+
+def open_title_store(model_key: str, cache_dir: str = 'ml/out', max_mb: int = 1024, precision: str = 'float32') -> EmbeddingStore:
+    # One store per (model, prompt style, storage precision); lives next to the label_cache/ directory
+    path = os.path.join(cache_dir, f'title_cache_{_safe_model_key(model_key)}_{prompt_style(model_key)}')
+    if precision != 'float32':
+        path += f'_{precision}'
+    store = _TITLE_STORES.get(path)
+    if store is None:
+        store = EmbeddingStore(path, max_bytes=max_mb * 1024 * 1024, dtype=precision)
+        _TITLE_STORES[path] = store
+    return store
+
+
+def _ensure_model(embedder, profiler=NULL_PROFILER):
+    # Model load happens lazily on first encode; give it its own stage when profiling
+    if profiler.enabled and not getattr(embedder, 'loaded', True):
+        with profiler.stage('model_load', model=getattr(embedder, 'model_name', '')):
+            embedder.load()
+
+
+def encode_titles(titles: List[str], model_key: str, embedder, cache_dir: str = 'ml/out', title_cache: bool = True, title_cache_mb: int = 1024, profiler=NULL_PROFILER, precision: str = 'float32') -> np.ndarray:
+    with profiler.stage('encode', items=len(titles)) as st:
+        # The model sees the normalized title, so every variant sharing a cache key gets the same vector
+        # with or without the cache, regardless of which variant came first
+        if not title_cache:
+            _ensure_model(embedder, profiler)
+            st['cache_misses'] = len(titles)
+            return np.asarray(embedder.encode(title_prompts([normalize_text(t) for t in titles], model_key)))
+        store = open_title_store(cache_model_key(model_key, embedder), cache_dir, title_cache_mb, precision)
+        norm = [normalize_text(t) for t in titles]
+        keys = [text_key(t) for t in norm]
+        rows = store.lookup(keys)
+        hit = rows >= 0
+        n_hit = int(hit.sum())
+        st['cache_hits'] = n_hit
+        st['cache_misses'] = len(titles) - n_hit
+        if n_hit == len(titles):
+            return store.get(rows)
+        # Encode each distinct missing title once; variants sharing a normalized key share the encoding
+        miss_pos: Dict[bytes, int] = {}
+        miss_keys: List[bytes] = []
+        miss_texts: List[str] = []
+        inverse = np.empty(int((~hit).sum()), dtype=np.int64)
+        for j, i in enumerate(np.where(~hit)[0].tolist()):
+            k = keys[i]
+            if k not in miss_pos:
+                miss_pos[k] = len(miss_keys)
+                miss_keys.append(k)
+                miss_texts.append(norm[i])
+            inverse[j] = miss_pos[k]
+        _ensure_model(embedder, profiler)
+        new_vecs = np.asarray(embedder.encode(title_prompts(miss_texts, model_key)), dtype=np.float32)
+        st['encoded'] = len(miss_texts)
+        V = np.empty((len(titles), new_vecs.shape[1]), dtype=np.float32)
+        if n_hit:
+            V[hit] = store.get(rows[hit])
+        V[~hit] = new_vecs[inverse]
+        store.append(miss_keys, new_vecs)
+        return V
+
+
 def load_titles(in_path: str) -> tuple[str, List[str]]:
     with open(in_path, 'r', encoding='utf-8') as f:
         data = json.load(f)
@@ -56,13 +153,123 @@ def load_titles(in_path: str) -> tuple[str, List[str]]:
     return user_id, titles
 
 
+_TITLE_ARRAY_RE = re.compile(r'"(titles|titles_to_tag_map|items|data)"\s*:\s*\[')
+_USER_ID_RE = re.compile(r'"user_id"\s*:\s*("(?:[^"\\]|\\.)*"|-?\d+)')
+
+
+def _title_value(val) -> str | None:
+    if isinstance(val, str):
+        return val
+    if isinstance(val, dict) and isinstance(val.get('title'), str):
+        return val['title']
+    return None
+
+
+def _iter_title_lines(in_path: str) -> Iterator[str]:
+    # .jsonl/.ndjson: one JSON string or {"title": ...} object per line; .txt: one raw title per line
+    is_json = not in_path.lower().endswith('.txt')
+    with open(in_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            title = _title_value(json.loads(line)) if is_json else line
+            if title:
+                yield title
+
+
+def _iter_json_values(f, buf: str, pos: int, read_chars: int) -> Iterator[Any]:
+    decoder = json.JSONDecoder()
+    with f:
+        while True:
+            while pos < len(buf) and buf[pos] in ' \t\r\n,':
+                pos += 1
+            if pos >= len(buf):
+                more = f.read(read_chars)
+                if not more:
+                    raise ValueError("Unterminated titles array in input")
+                buf, pos = more, 0
+                continue
+            if buf[pos] == ']':
+                return
+            try:
+                val, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                # Element straddles the read boundary; extend the buffer and retry
+                more = f.read(read_chars)
+                if not more:
+                    raise
+                buf, pos = buf[pos:] + more, 0
+                continue
+            pos = end
+            yield val
+            if pos > read_chars:
+                buf, pos = buf[pos:], 0
+
+
+def _iter_json_array(f, buf: str, pos: int, read_chars: int) -> Iterator[str]:
+    for val in _iter_json_values(f, buf, pos, read_chars):
+        title = _title_value(val)
+        if title:
+            yield title
+
+
+def stream_titles(in_path: str, read_chars: int = 1 << 16) -> tuple[str, Iterator[str]]:
+    # Incremental counterpart of load_titles: only the current element is held in memory.
+    # user_id is picked up when it precedes the titles array (as in the extension export).
+    if in_path.lower().endswith(('.jsonl', '.ndjson', '.txt')):
+        return '', _iter_title_lines(in_path)
+    f = open(in_path, 'r', encoding='utf-8')
+    buf = ''
+    while True:
+        more = f.read(read_chars)
+        buf += more
+        head = buf.lstrip()
+        if head.startswith('['):
+            return '', _iter_json_array(f, buf, buf.index('[') + 1, read_chars)
+        m = _TITLE_ARRAY_RE.search(buf)
+        if m:
+            um = _USER_ID_RE.search(buf, 0, m.start())
+            user_id = jsonlib.loads(um.group(1)) if um else ''
+            return str(user_id), _iter_json_array(f, buf, m.end(), read_chars)
+        if not more:
+            f.close()
+            raise ValueError("No titles found. Expected 'titles' or a list under 'titles_to_tag_map'.")
+
+
+def stream_events(in_path: str, read_chars: int = 1 << 16) -> Iterator[Dict[str, Any]]:
+    # Raw extension export (local-events.json): a top-level array of {ts, type, title, videoId, href, page, platform}.
+    # .jsonl/.ndjson inputs hold one event object per line.
+    if in_path.lower().endswith(('.jsonl', '.ndjson')):
+        with open(in_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+        return
+    f = open(in_path, 'r', encoding='utf-8')
+    buf = ''
+    while not buf.strip():
+        more = f.read(read_chars)
+        if not more:
+            break
+        buf += more
+    head = buf.lstrip()
+    if not head.startswith('['):
+        f.close()
+        raise ValueError("Expected a JSON array of events (the dashboard's local-events.json export)")
+    for val in _iter_json_values(f, buf, buf.index('[') + 1, read_chars):
+        if isinstance(val, dict):
+            yield val
+
+
 def build_id_to_name(taxonomy_path: str) -> Dict[Any, str]:
     # Build a mapping for parent (t0) ids to display names using hierarchical loader
     parents, _children = load_taxonomy_hier(taxonomy_path)
     return {p['id']: p.get('en') or str(p['id']) for p in parents}
 
 
-def load_taxonomy_hier(path: str):
+def _read_taxonomy_t0(path: str) -> List[Dict[str, Any]]:
     # If JSON, load directly
     if path.lower().endswith('.json'):
         with open(path, 'r', encoding='utf-8') as f:
@@ -107,6 +314,15 @@ def load_taxonomy_hier(path: str):
             t0_list = data
         else:
             raise ValueError(f"Unsupported taxonomy format in {path}; expected mapping with 't0' or a list")
+    return t0_list
+
+
+def load_taxonomy_hier(path: str):
+    # Two-level view (t0 -> t1); deeper levels are ignored here, see load_taxonomy_levels
+    compiled = load_compiled_taxonomy(path)
+    if compiled is not None:
+        return _hier_from_levels(compiled[1])
+    t0_list = _read_taxonomy_t0(path)
     parents = []
     children = []
     for p_idx, p in enumerate(t0_list):
@@ -124,36 +340,126 @@ def load_taxonomy_hier(path: str):
     return parents, children
 
 
+def load_taxonomy_levels(path: str) -> List[List[Dict[str, Any]]]:
+    # Arbitrary depth: children of a level-n node are listed under 't{n+1}'. Returns one node list per
+    # level; each node knows its parent index in the previous level, and siblings are contiguous.
+    compiled = load_compiled_taxonomy(path)
+    if compiled is not None:
+        return compiled[1]
+    levels: List[List[Dict[str, Any]]] = []
+
+    def walk(nodes, level: int, parent: int, parent_id, path_en: List[str]):
+        for node in nodes or []:
+            if len(levels) <= level:
+                levels.append([])
+            idx = len(levels[level])
+            en = node.get('en', str(node['id']))
+            desc = node.get('desc', '')
+            node_id = f"{parent_id}/{node['id']}" if parent_id is not None else node['id']
+            node_path = path_en + [en]
+            levels[level].append({'id': node_id, 'en': en, 'desc': desc, 'path': node_path, 'text': f"{' > '.join(node_path)}: {desc}", 'parent': parent})
+            walk(node.get(f't{level + 1}'), level + 1, idx, node_id, node_path)
+
+    walk(_read_taxonomy_t0(path), 0, -1, None, [])
+    return levels
+
+
+_TAXONOMY_DEPTHS: Dict[tuple, int] = {}
+_FILE_SHA1S: Dict[tuple, str] = {}
+
+
+def _hier_from_levels(levels) -> tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    # Same records as load_taxonomy_hier builds from the parsed file
+    parents = [{'id': n['id'], 'en': n['en'], 'desc': n['desc'], 'text': n['text'], 'p_index': i} for i, n in enumerate(levels[0])] if levels else []
+    children = []
+    for n in levels[1] if len(levels) > 1 else []:
+        p = parents[n['parent']]
+        children.append({'id': n['id'], 'p_id': p['id'], 'p_en': p['en'], 'en': n['en'], 'desc': n['desc'], 'text': n['text'], 'p_index': n['parent']})
+    return parents, children
+
+
+_COMPILED: Dict[tuple, Any] = {}
+
+
+def load_compiled_taxonomy(path: str):
+    # (TaxonomyArtifact, levels) for a file written by compile_taxonomy, else None. Levels are rebuilt
+    # from the artifact's string tables and parent arrays once per file version; nothing is parsed.
+    st = os.stat(path)
+    key = (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+    if key not in _COMPILED:
+        compiled = None
+        if is_artifact(path):
+            art = TaxonomyArtifact(path)
+            levels: List[List[Dict[str, Any]]] = []
+            for lvl in range(art.meta['depth']):
+                ids, ens, descs, texts = (art.strings(f'level{lvl}.{f}') for f in ('id', 'en', 'desc', 'text'))
+                parent = art.array(f'level{lvl}.parent').tolist()
+                levels.append([
+                    {'id': i, 'en': en, 'desc': d, 'path': (levels[lvl - 1][p]['path'] if lvl else []) + [en], 'text': t, 'parent': p}
+                    for i, en, d, t, p in zip(ids, ens, descs, texts, parent)
+                ])
+            compiled = (art, levels)
+        _COMPILED[key] = compiled
+    return _COMPILED[key]
+
+
+def _compiled_embeddings(taxonomy_path: str, cache_key: str, precision: str):
+    # Per-level label embeddings stored in a compiled taxonomy for this model, else None
+    compiled = load_compiled_taxonomy(taxonomy_path)
+    if compiled is None or cache_key not in compiled[0].meta.get('embeddings', {}):
+        return None
+    art, levels = compiled
+    return [quantize(art.array(f'emb.{cache_key}.level{lvl}'), precision) for lvl in range(len(levels))]
+
+
+def _compiled_prompts(taxonomy_path: str, style: str) -> List[List[str]] | None:
+    compiled = load_compiled_taxonomy(taxonomy_path)
+    if compiled is None:
+        return None
+    return [compiled[0].strings(f'prompts.{style}.level{lvl}') for lvl in range(len(compiled[1]))]
+
+
+def taxonomy_depth(path: str, cache_dir: str | None = None) -> int:
+    compiled = load_compiled_taxonomy(path)
+    if compiled is not None:
+        return len(compiled[1])
+    st = os.stat(path)
+    key = (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+    if key not in _TAXONOMY_DEPTHS:
+        # A label-cache entry for the byte-identical file records the depth; parse only without one
+        depth = LabelCache(os.path.join(cache_dir, 'label_cache')).depth(_file_sha1(path)) if cache_dir else None
+        _TAXONOMY_DEPTHS[key] = depth if depth is not None else len(load_taxonomy_levels(path))
+    return _TAXONOMY_DEPTHS[key]
+
+
 def taxonomy_fingerprint(path: str) -> str:
-    h = hashlib.sha1()
-    with open(path, 'rb') as f:
-        h.update(f.read())
-    return h.hexdigest()
-
-
-def get_cached_label_embeddings(taxonomy_path: str, model_key: str, embedder, cache_dir: str = 'ml/out'):
-    os.makedirs(cache_dir, exist_ok=True)
-    fp = taxonomy_fingerprint(taxonomy_path)
-    safe_key = _safe_model_key(model_key)
-    cache_path = os.path.join(cache_dir, f'label_cache_{safe_key}.npz')
-    # Determine prompt style (affects the actual encoded strings)
-    is_e5_style = 'e5' in model_key.lower()  # heuristic: any e5 / multilingual-e5 variant
-    prompt_style = 'e5' if is_e5_style else 'default'
-    if os.path.exists(cache_path):
-        try:
-            data = np.load(cache_path, allow_pickle=True)
-            meta = dict(data['meta'].item())
-            if meta.get('taxonomy_fp') == fp and meta.get('model') == model_key and meta.get('prompt_style') == prompt_style:
-                parents = data['parents'].tolist()
-                children = data['children'].tolist()
-                p_emb = data['p_emb']
-                c_emb = data['c_emb']
-                return parents, children, p_emb, c_emb
-        except Exception:
-            pass
-    # Recompute
-    parents, children = load_taxonomy_hier(taxonomy_path)
-    if is_e5_style:
+    # Fingerprint of the parsed labels, so formatting-only edits keep the same value
+    compiled = load_compiled_taxonomy(path)
+    if compiled is not None:
+        return compiled[0].meta['fingerprint']
+    if taxonomy_depth(path) > 2:
+        return tree_fingerprint(load_taxonomy_levels(path))
+    parents, children = load_taxonomy_hier(path)
+    return label_fingerprint(parents, children)
+
+
+def _file_sha1(path: str) -> str:
+    compiled = load_compiled_taxonomy(path)
+    if compiled is not None:
+        # Avoid hashing stored embeddings; the payload hash identifies the artifact just as well
+        return compiled[0].meta['content_sha1']
+    st = os.stat(path)
+    key = (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+    if key not in _FILE_SHA1S:
+        h = hashlib.sha1()
+        with open(path, 'rb') as f:
+            h.update(f.read())
+        _FILE_SHA1S[key] = h.hexdigest()
+    return _FILE_SHA1S[key]
+
+
+def label_prompts(parents, children, model_key: str) -> tuple[List[str], List[str]]:
+    if prompt_style(model_key) == 'e5':
         # E5 expects asymmetric prefixes: query:/passage:
         # Parent prompt: passage: <ParentName>: <desc>
         # Child prompt: passage: <ParentName> > <ChildName>: <desc>
@@ -162,147 +468,758 @@ def get_cached_label_embeddings(taxonomy_path: str, model_key: str, embedder, ca
     else:
         p_texts = [p['text'] for p in parents]
         c_texts = [c['text'] for c in children]
-    p_emb = embedder.encode(p_texts)
-    c_emb = embedder.encode(c_texts) if c_texts else np.zeros((0, p_emb.shape[1]), dtype=p_emb.dtype)
-    meta = {'taxonomy_fp': fp, 'model': model_key, 'cache_file': os.path.basename(cache_path), 'prompt_style': prompt_style}
-    np.savez_compressed(cache_path, meta=meta, parents=np.array(parents, dtype=object), children=np.array(children, dtype=object), p_emb=p_emb, c_emb=c_emb)
-    return parents, children, p_emb, c_emb
-
-
-def zero_shot_joint_titles(titles: List[str], taxonomy_path: str, model_key: str = 'minilm', alpha: float = 0.3, topk_parent: int | None = None, detail: bool = False, topk_children: int = 10):
-    emb = Embedder(model_key)
-    parents, children, p_emb, c_emb = get_cached_label_embeddings(taxonomy_path, model_key, emb)
-    is_e5_style = 'e5' in model_key.lower()
-    if is_e5_style:
-        title_inputs = [f"query: {t}" for t in titles]
+    return p_texts, c_texts
+
+
+def get_cached_label_embeddings(taxonomy_path: str, model_key: str, embedder, cache_dir: str = 'ml/out', profiler=NULL_PROFILER, precision: str = 'float32', depth: int | None = None):
+    # depth: the taxonomy's parsed depth when the caller knows it; recorded so taxonomy_depth can skip parsing
+    with profiler.stage('label_cache') as st:
+        labels = _cached_label_embeddings(taxonomy_path, model_key, embedder, cache_dir, profiler, st, precision, depth)
+        st['labels'] = len(labels[0]) + len(labels[1])
+        return labels
+
+
+def _cached_label_embeddings(taxonomy_path: str, model_key: str, embedder, cache_dir: str, profiler, st, precision: str = 'float32', depth: int | None = None):
+    cache_key = cache_model_key(model_key, embedder)
+    style = prompt_style(model_key)
+    embs = _compiled_embeddings(taxonomy_path, cache_key, precision)
+    if embs is not None:
+        st['cache_hit'] = st['compiled'] = True
+        parents, children = load_taxonomy_hier(taxonomy_path)
+        c_emb = embs[1] if len(embs) > 1 else quantize(np.zeros((0, embs[0].shape[1]), dtype=np.float32), precision)
+        return parents, children, embs[0], c_emb
+    cache = LabelCache(os.path.join(cache_dir, 'label_cache'))
+    file_sha1 = _file_sha1(taxonomy_path)
+    parents = children = None
+    key = cache.find(cache_key, style, file_sha1=file_sha1, precision=precision)
+    if key is None:
+        parents, children = load_taxonomy_hier(taxonomy_path)
+        key = cache.find(cache_key, style, fingerprint=label_fingerprint(parents, children), precision=precision)
+    loaded = cache.load(key) if key is not None else None
+    if loaded is not None:
+        cache.touch(key, file_sha1, depth)
+        st['cache_hit'] = True
+        meta, arrays = loaded
+        return meta['parents'], meta['children'], arrays['p_emb'], arrays['c_emb']
+    # Build a new entry; only prompts not already in the per-model label pool are encoded
+    st['cache_hit'] = False
+    if parents is None:
+        parents, children = load_taxonomy_hier(taxonomy_path)
+    texts = _compiled_prompts(taxonomy_path, style)
+    p_texts, c_texts = (texts[0], texts[1] if len(texts) > 1 else []) if texts else label_prompts(parents, children, model_key)
+    E = _pool_encode(cache, cache_key, style, p_texts + c_texts, embedder, profiler, st)
+    p_emb, c_emb = E[:len(p_texts)], E[len(p_texts):]
+    key = cache.put(cache_key, style, label_fingerprint(parents, children), file_sha1, {'parents': parents, 'children': children}, {'p_emb': p_emb, 'c_emb': c_emb}, precision=precision, depth=depth)
+    meta, arrays = cache.load(key) or ({'parents': parents, 'children': children}, {'p_emb': quantize(p_emb, precision), 'c_emb': quantize(c_emb, precision)})
+    return meta['parents'], meta['children'], arrays['p_emb'], arrays['c_emb']
+
+
+def _pool_encode(cache: LabelCache, cache_key: str, style: str, texts: List[str], embedder, profiler, st) -> np.ndarray:
+    pool = cache.pool(_safe_model_key(cache_key), style)
+    keys = [prompt_key(t) for t in texts]
+    rows = pool.lookup(keys)
+    miss = np.where(rows < 0)[0]
+    miss_keys = list(dict.fromkeys(keys[i] for i in miss.tolist()))
+    st['labels_encoded'] = len(miss_keys)
+    if not miss_keys:
+        return pool.get(rows)
+    first: Dict[bytes, int] = {}
+    for i in miss.tolist():
+        first.setdefault(keys[i], i)
+    _ensure_model(embedder, profiler)
+    new = np.asarray(embedder.encode([texts[first[k]] for k in miss_keys]), dtype=np.float32)
+    # Read hits before appending: append may evict and renumber pool rows
+    E = np.empty((len(texts), new.shape[1]), dtype=np.float32)
+    hit = rows >= 0
+    if hit.any():
+        E[hit] = pool.get(rows[hit])
+    pos = {k: j for j, k in enumerate(miss_keys)}
+    E[miss] = new[[pos[keys[i]] for i in miss.tolist()]]
+    pool.append(miss_keys, new)
+    return E
+
+
+def tree_prompts(levels, model_key: str) -> List[List[str]]:
+    # Same prompt shapes as label_prompts for levels 0/1 ("P: desc", "P > C: desc"), extended down the path
+    prefix = LABEL_PROMPT_PREFIX[prompt_style(model_key)]
+    return [[prefix + n['text'] for n in nodes] for nodes in levels]
+
+
+def compile_taxonomy(taxonomy_path: str, out_path: str, embedders: Iterable[str] = (), backend: str = 'torch', cache_dir: str = 'ml/out', workers: int = 1) -> Dict[str, Any]:
+    # Writes a compiled taxonomy (ml/src/taxonomy_artifact.py): per-level id/en/desc/text tables, parent
+    # index arrays, label prompts for every prompt style and, for each embedder key, float32 label
+    # embeddings (taken from / added to the label cache). Pass the artifact as --taxonomy to skip parsing.
+    src = load_taxonomy_levels(taxonomy_path)
+    # Ids are stored as text; fingerprint what the artifact will load so cache entries line up
+    levels = [[{**n, 'id': str(n['id']), 'desc': '' if n['desc'] is None else str(n['desc'])} for n in nodes] for nodes in src]
+    strings: Dict[str, List[str]] = {}
+    arrays: Dict[str, np.ndarray] = {}
+    for lvl, nodes in enumerate(levels):
+        for field in ('id', 'en', 'desc', 'text'):
+            strings[f'level{lvl}.{field}'] = [str(n[field]) for n in nodes]
+        arrays[f'level{lvl}.parent'] = np.array([n['parent'] for n in nodes], dtype=np.int32)
+        for style, prefix in LABEL_PROMPT_PREFIX.items():
+            strings[f'prompts.{style}.level{lvl}'] = [prefix + n['text'] for n in nodes]
+    embeddings: Dict[str, Dict[str, Any]] = {}
+    for model_key in embedders:
+        emb = make_embedder(model_key, backend, cache_dir, workers)
+        _levels, embs = get_cached_tree_embeddings(taxonomy_path, model_key, emb, cache_dir=cache_dir)
+        cache_key = cache_model_key(model_key, emb)
+        for lvl, e in enumerate(embs):
+            arrays[f'emb.{cache_key}.level{lvl}'] = np.asarray(e, dtype=np.float32)
+        embeddings[cache_key] = {'model': model_key, 'prompt_style': prompt_style(model_key), 'dim': int(embs[0].shape[1])}
+    fingerprint = tree_fingerprint(levels) if len(levels) > 2 else label_fingerprint(*_hier_from_levels(levels))
+    meta = {
+        'source': os.path.basename(taxonomy_path),
+        'source_sha1': _file_sha1(taxonomy_path),
+        'fingerprint': fingerprint,
+        'depth': len(levels),
+        'labels': [len(nodes) for nodes in levels],
+        'prompt_styles': list(LABEL_PROMPT_PREFIX),
+        'embeddings': embeddings,
+    }
+    os.makedirs(os.path.dirname(out_path) or '.', exist_ok=True)
+    write_artifact(out_path, meta, arrays, strings)
+    return meta
+
+
+def get_cached_tree_embeddings(taxonomy_path: str, model_key: str, embedder, cache_dir: str = 'ml/out', profiler=NULL_PROFILER, precision: str = 'float32'):
+    # Deep-taxonomy counterpart of get_cached_label_embeddings: (levels, [emb per level])
+    with profiler.stage('label_cache') as st:
+        cache_key = cache_model_key(model_key, embedder)
+        style = prompt_style(model_key)
+        embs = _compiled_embeddings(taxonomy_path, cache_key, precision)
+        if embs is not None:
+            st['cache_hit'] = st['compiled'] = True
+            levels = load_taxonomy_levels(taxonomy_path)
+            st['labels'] = sum(len(lvl) for lvl in levels)
+            return levels, embs
+        cache = LabelCache(os.path.join(cache_dir, 'label_cache'))
+        file_sha1 = _file_sha1(taxonomy_path)
+        levels = None
+        key = cache.find(cache_key, style, file_sha1=file_sha1, kind='tree', precision=precision)
+        if key is None:
+            levels = load_taxonomy_levels(taxonomy_path)
+            key = cache.find(cache_key, style, fingerprint=tree_fingerprint(levels), kind='tree', precision=precision)
+        loaded = cache.load(key) if key is not None else None
+        st['cache_hit'] = loaded is not None
+        if loaded is not None:
+            cache.touch(key, file_sha1)
+            meta, arrays = loaded
+            levels = meta['levels']
+            embs = [arrays[f'level{i}'] for i in range(len(levels))]
+        else:
+            if levels is None:
+                levels = load_taxonomy_levels(taxonomy_path)
+            texts = _compiled_prompts(taxonomy_path, style) or tree_prompts(levels, model_key)
+            E = _pool_encode(cache, cache_key, style, [t for lvl in texts for t in lvl], embedder, profiler, st)
+            bounds = np.cumsum([0] + [len(lvl) for lvl in texts])
+            embs = [E[bounds[i]:bounds[i + 1]] for i in range(len(levels))]
+            cache.put(cache_key, style, tree_fingerprint(levels), file_sha1, {'levels': levels}, {f'level{i}': e for i, e in enumerate(embs)}, kind='tree', precision=precision)
+            embs = [quantize(e, precision) for e in embs]
+        st['labels'] = sum(len(lvl) for lvl in levels)
+        return levels, embs
+
+
+def joint_score_matrices(V: np.ndarray, p_emb, c_emb, child_pidx: np.ndarray, alpha: float = 0.3, topk_parent: int | None = None):
+    # Returns p_scores [N, P], c_scores [N, C] and combined [N, C]; children outside the
+    # top-k parents of a title are filled with -inf so a plain argmax/argpartition respects the mask.
+    # Quantized label matrices (--precision) score against V quantized the same way, float32 accumulation
+    V = quantize(V, precision_of(p_emb))
+    p_scores = matmul_t(V, p_emb)  # [N, P]
+    c_scores = matmul_t(V, c_emb)  # [N, C]
+    return p_scores, c_scores, combine_joint_scores(p_scores, c_scores, child_pidx, alpha, topk_parent)
+
+
+def combine_joint_scores(p_scores: np.ndarray, c_scores: np.ndarray, child_pidx: np.ndarray, alpha: float = 0.3, topk_parent: int | None = None) -> np.ndarray:
+    # Only this step depends on alpha/topk_parent, so sweeps reuse p_scores/c_scores across configs
+    combined = (1.0 - alpha) * c_scores + alpha * p_scores[:, child_pidx]
+    n_parents = p_scores.shape[1]
+    if topk_parent is not None and topk_parent > 0 and topk_parent < n_parents:
+        topP = np.argpartition(-p_scores, kth=topk_parent-1, axis=1)[:, :topk_parent]
+        allowed = np.zeros((p_scores.shape[0], n_parents), dtype=bool)
+        np.put_along_axis(allowed, topP, True, axis=1)
+        # Gather parent membership per child -> [N, C] and mask in place
+        np.putmask(combined, ~allowed[:, child_pidx], -np.inf)
+    return combined
+
+
+def joint_argmax(p_scores: np.ndarray, combined: np.ndarray):
+    # Best child per row; rows whose top-k parents have no children at all fall back to the best parent
+    best = np.argmax(combined, axis=1)
+    valid = np.isfinite(np.take_along_axis(combined, best[:, None], axis=1)[:, 0])
+    return best, valid, np.argmax(p_scores, axis=1)
+
+
+def top_k_columns(scores: np.ndarray, k: int):
+    # Batched top-k per row, sorted by descending score: (indices [N, k], scores [N, k])
+    k = min(k, scores.shape[1])
+    if k <= 0:
+        return np.zeros((scores.shape[0], 0), dtype=np.int64), np.zeros((scores.shape[0], 0), dtype=scores.dtype)
+    if k < scores.shape[1]:
+        idx = np.argpartition(-scores, kth=k-1, axis=1)[:, :k]
+        # Restore column order before the stable sort so ties resolve like a full argsort
+        idx.sort(axis=1)
     else:
-        title_inputs = titles
+        idx = np.broadcast_to(np.arange(scores.shape[1]), scores.shape).copy()
+    top = np.take_along_axis(scores, idx, axis=1)
+    order = np.argsort(-top, axis=1, kind='stable')
+    return np.take_along_axis(idx, order, axis=1), np.take_along_axis(top, order, axis=1)
+
+
+def top2_margin(scores: np.ndarray) -> np.ndarray:
+    # Best minus second-best score per row; inf when a row has fewer than two finite scores
+    if scores.shape[1] < 2:
+        return np.full(scores.shape[0], np.inf, dtype=np.float32)
+    top2 = -np.partition(-scores, 1, axis=1)[:, :2]
+    with np.errstate(invalid='ignore'):
+        return np.where(np.isfinite(top2[:, 1]), top2[:, 0] - top2[:, 1], np.inf).astype(np.float32)
+
+
+def joint_columns(V: np.ndarray, children, p_emb, c_emb, alpha: float = 0.3, topk_parent: int | None = None, detail: bool = False, topk_children: int = 10, margin: bool = False) -> Dict[str, np.ndarray]:
+    # Column form of score_joint: t0 = parent index, t1 = child index (-1 = parent-only fallback).
+    # With detail: top_children [N, k] child indices (-1 past the valid ones) and the matching
+    # combined / parent_score / child_score matrices. With margin: top-1 minus top-2 combined score
+    # (parent scores for parent-only rows), the confidence signal used by cascades.
     if len(children) == 0:
         # If no t1, fall back to parent-only zero-shot using cached parent embeddings
-        p_mat = p_emb  # already normalized
-        V = emb.encode(titles)
-        sims = V @ p_mat.T
-        out = []
-        for row in sims:
-            j = int(np.argmax(row))
-            entry = {'t0': parents[j]['en'], 't1': None}
-            if detail:
-                entry['top_children'] = []
-            out.append(entry)
-        return out
+        p_scores = matmul_t(V, p_emb)
+        best_p = np.argmax(p_scores, axis=1)
+        cols = {'t0': best_p.astype(np.int32), 't1': np.full(best_p.shape[0], -1, dtype=np.int32)}
+        if detail:
+            cols['top_children'] = np.zeros((best_p.shape[0], 0), dtype=np.int32)
+            for name in ('combined', 'parent_score', 'child_score'):
+                cols[name] = np.zeros((best_p.shape[0], 0), dtype=np.float32)
+        if margin:
+            cols['margin'] = top2_margin(p_scores)
+        return cols
 
     # Build parent index per child array
     child_pidx = np.array([c['p_index'] for c in children], dtype=np.int64)
+    p_scores, c_scores, combined = joint_score_matrices(V, p_emb, c_emb, child_pidx, alpha, topk_parent)
 
-    V = np.asarray(emb.encode(title_inputs))  # [N, D]
-    P = np.asarray(p_emb)               # [P, D]
-    C = np.asarray(c_emb)               # [C, D]
+    best, valid, best_parent = joint_argmax(p_scores, combined)
+    cols = {
+        't0': np.where(valid, child_pidx[best], best_parent).astype(np.int32),
+        't1': np.where(valid, best, -1).astype(np.int32),
+    }
+    if detail:
+        top_idx, top_comb = top_k_columns(combined, topk_children)
+        cols['top_children'] = np.where(np.isfinite(top_comb), top_idx, -1).astype(np.int32)
+        cols['combined'] = top_comb
+        cols['parent_score'] = np.take_along_axis(p_scores, child_pidx[top_idx], axis=1)
+        cols['child_score'] = np.take_along_axis(c_scores, top_idx, axis=1)
+    if margin:
+        cols['margin'] = np.where(valid, top2_margin(combined), top2_margin(p_scores))
+    return cols
 
-    # Compute similarities
-    p_scores = V @ P.T                  # [N, P]
-    # Optionally mask children by top-k parents
-    mask = None
-    if topk_parent is not None and topk_parent > 0 and topk_parent < len(parents):
-        topP = np.argpartition(-p_scores, kth=topk_parent-1, axis=1)[:, :topk_parent]
-        # Build a boolean mask [N, C] whether child's parent is in topP
-        mask = np.zeros((V.shape[0], len(children)), dtype=bool)
-        for n in range(V.shape[0]):
-            allowed = set(topP[n].tolist())
-            mask[n] = np.isin(child_pidx, list(allowed))
-
-    c_scores = V @ C.T                  # [N, C]
-    # Joint score
-    combined = (1.0 - alpha) * c_scores + alpha * p_scores[:, child_pidx]
 
+def joint_entries(cols: Dict[str, np.ndarray], parents, children, detail: bool = False) -> List[Dict[str, Any]]:
     results = []
-    for i in range(V.shape[0]):
-        if mask is not None:
-            valid_idx = np.where(mask[i])[0]
-            if valid_idx.size == 0:
-                # fallback to best parent
-                j = int(np.argmax(p_scores[i]))
-                entry = {'t0': parents[j]['en'], 't1': None}
-                if detail:
-                    entry['top_children'] = []
-                results.append(entry)
-                continue
-            local_scores = combined[i, valid_idx]
-            best_local = valid_idx[int(np.argmax(local_scores))]
-        else:
-            best_local = int(np.argmax(combined[i]))
-        best_child = children[best_local]
+    if detail:
+        rows = zip(cols['top_children'].tolist(), cols['combined'].tolist(), cols['parent_score'].tolist(), cols['child_score'].tolist())
+    for p, c in zip(cols['t0'].tolist(), cols['t1'].tolist()):
+        if detail:
+            top_idx, top_comb, top_par, top_child = next(rows)
+        if c < 0:
+            entry = {'t0': parents[p]['en'], 't1': None}
+            if detail:
+                entry['top_children'] = []
+            results.append(entry)
+            continue
+        best_child = children[c]
         entry = {'t0': best_child['p_en'], 't1': best_child['en']}
         if detail:
-            # collect top-k children (by combined) restricted to mask or all
-            if mask is not None:
-                candidate_idx = valid_idx
-                candidate_scores = combined[i, candidate_idx]
-            else:
-                candidate_idx = np.arange(len(children))
-                candidate_scores = combined[i]
-            order = np.argsort(-candidate_scores)[:topk_children]
             detail_list = []
-            for pos in order:
-                real_idx = candidate_idx[pos]
-                ch = children[real_idx]
+            for ci, comb, ps, cs in zip(top_idx, top_comb, top_par, top_child):
+                if ci < 0:
+                    break
+                ch = children[ci]
                 detail_list.append({
                     't0': ch['p_en'],
                     't1': ch['en'],
-                    'combined': float(candidate_scores[pos]),
-                    'parent_score': float(p_scores[i, ch['p_index']]),
-                    'child_score': float((V[i] @ c_emb[real_idx]))
+                    'combined': comb,
+                    'parent_score': ps,
+                    'child_score': cs,
                 })
             entry['top_children'] = detail_list
         results.append(entry)
     return results
 
 
-def predict_titles(titles: List[str], mode: str, model_path: str, taxonomy_path: str, topk: int = 1, alpha: float = 0.3, topk_parent: int | None = None, output_format: str = 'pair-array', embedder_key: str = 'minilm', detail: bool = False, topk_children: int = 10):
+def score_joint(V: np.ndarray, parents, children, p_emb, c_emb, alpha: float = 0.3, topk_parent: int | None = None, detail: bool = False, topk_children: int = 10) -> List[Dict[str, Any]]:
+    cols = joint_columns(V, children, p_emb, c_emb, alpha=alpha, topk_parent=topk_parent, detail=detail, topk_children=topk_children)
+    return joint_entries(cols, parents, children, detail)
+
+
+def tree_paths(levels) -> List[List[str]]:
+    # Global node ids used by tree columns: level 0 first, then level 1, ...
+    return [n['path'] for nodes in levels for n in nodes]
+
+
+def tree_columns(V: np.ndarray, levels, embs, alpha: float = 0.3, beam: int = 8, detail: bool = False, topk_children: int = 10, margin: bool = False) -> Dict[str, np.ndarray]:
+    # Beam search down an arbitrary-depth taxonomy. Level 0 is scored fully; after that only children of
+    # the `beam` best nodes per title are scored, so work per title is ~ beam * branching * depth instead
+    # of the number of leaves. Node score blends recursively like the two-level joint score:
+    #   score(node) = (1 - alpha) * sim(title, node) + alpha * score(parent)
+    # A surviving node without children stays in the beam with its score (paths may end early).
+    # Columns: node = global node id (see tree_paths), t0 = its level-0 ancestor; with detail,
+    # top_paths [N, min(topk_children, beam)] node ids (-1 padded) and their combined scores.
+    V = quantize(V, precision_of(embs[0]))
+    n = V.shape[0]
+    k = max(1, min(beam, len(levels[0])))
+    idx, sc = top_k_columns(matmul_t(V, embs[0]), k)
+    cand_t = np.repeat(np.arange(n), idx.shape[1])
+    cand_lvl = np.zeros(cand_t.shape[0], dtype=np.int64)
+    cand_node = idx.ravel()
+    cand_score = sc.ravel().astype(np.float32)
+    roots = [np.arange(len(levels[0]), dtype=np.int64)]
+    for lvl in range(1, len(levels)):
+        parent_of = np.array([c['parent'] for c in levels[lvl]], dtype=np.int64)
+        roots.append(roots[-1][parent_of])
+        n_prev = len(levels[lvl - 1])
+        starts = np.searchsorted(parent_of, np.arange(n_prev), side='left')
+        counts_per_node = np.searchsorted(parent_of, np.arange(n_prev), side='right') - starts
+        open_ = cand_lvl == lvl - 1
+        counts = np.zeros(cand_t.shape[0], dtype=np.int64)
+        counts[open_] = counts_per_node[cand_node[open_]]
+        src = np.repeat(np.arange(cand_t.shape[0]), counts)
+        offs = np.arange(src.shape[0]) - np.repeat(np.cumsum(counts) - counts, counts)
+        child = starts[cand_node[src]] + offs
+        sims = row_dots(V, cand_t[src], embs[lvl], child)
+        keep = counts == 0
+        cand_t = np.concatenate([cand_t[keep], cand_t[src]])
+        cand_lvl = np.concatenate([cand_lvl[keep], np.full(src.shape[0], lvl, dtype=np.int64)])
+        cand_node = np.concatenate([cand_node[keep], child])
+        cand_score = np.concatenate([cand_score[keep], (1.0 - alpha) * sims + alpha * cand_score[src]]).astype(np.float32)
+        # Keep the best `beam` candidates per title (stable on ties, like top_k_columns)
+        order = np.lexsort((-cand_score, cand_t))
+        grp = cand_t[order]
+        first = np.searchsorted(grp, grp, side='left')
+        sel = order[(np.arange(order.shape[0]) - first) < beam]
+        cand_t, cand_lvl, cand_node, cand_score = cand_t[sel], cand_lvl[sel], cand_node[sel], cand_score[sel]
+
+    # Candidates are sorted by title, best first
+    order = np.lexsort((-cand_score, cand_t))
+    cand_t, cand_lvl, cand_node, cand_score = cand_t[order], cand_lvl[order], cand_node[order], cand_score[order]
+    level_offset = np.cumsum([0] + [len(nodes) for nodes in levels[:-1]])
+    gid = level_offset[cand_lvl] + cand_node
+    rank = np.arange(cand_t.shape[0]) - np.searchsorted(cand_t, cand_t, side='left')
+    best = rank == 0
+    root = np.empty(cand_t.shape[0], dtype=np.int64)
+    for lvl, r in enumerate(roots):
+        at = cand_lvl == lvl
+        root[at] = r[cand_node[at]]
+    cols = {'t0': root[best].astype(np.int32), 'node': gid[best].astype(np.int32)}
+    if detail:
+        width = max(0, min(topk_children, beam))
+        top = np.full((n, width), -1, dtype=np.int32)
+        comb = np.full((n, width), np.nan, dtype=np.float32)
+        m = rank < width
+        top[cand_t[m], rank[m]] = gid[m]
+        comb[cand_t[m], rank[m]] = cand_score[m]
+        cols['top_paths'] = top
+        cols['combined'] = comb
+    if margin:
+        # Best vs runner-up path left in the beam
+        second = np.full(n, -np.inf, dtype=np.float32)
+        second[cand_t[rank == 1]] = cand_score[rank == 1]
+        cols['margin'] = np.where(np.isfinite(second), cand_score[best] - second, np.inf).astype(np.float32)
+    return cols
+
+
+def tree_entries(cols: Dict[str, np.ndarray], paths: List[List[str]], detail: bool = False) -> List[Dict[str, Any]]:
+    results = []
+    if detail:
+        rows = zip(cols['top_paths'].tolist(), cols['combined'].tolist())
+    for node in cols['node'].tolist():
+        path = paths[node]
+        entry = {'t0': path[0], 't1': path[1] if len(path) > 1 else None, 'path': path}
+        if detail:
+            top, comb = next(rows)
+            entry['top_paths'] = [{'path': paths[g], 'combined': s} for g, s in zip(top, comb) if g >= 0]
+        results.append(entry)
+    return results
+
+
+def score_tree(V: np.ndarray, levels, embs, alpha: float = 0.3, beam: int = 8, detail: bool = False, topk_children: int = 10) -> List[Dict[str, Any]]:
+    cols = tree_columns(V, levels, embs, alpha=alpha, beam=beam, detail=detail, topk_children=topk_children)
+    return tree_entries(cols, tree_paths(levels), detail)
+
+
+def flat_columns(V: np.ndarray, p_emb, detail: bool = False, topk_children: int = 10, margin: bool = False) -> Dict[str, np.ndarray]:
+    sims = matmul_t(V, p_emb)
+    if not detail:
+        cols = {'t0': np.argmax(sims, axis=1).astype(np.int32)}
+    else:
+        # Provide top-k parent list if detail requested
+        top_idx, top_sims = top_k_columns(sims, topk_children)
+        cols = {'t0': top_idx[:, 0].astype(np.int32), 'top_parents': top_idx.astype(np.int32), 'score': top_sims}
+    if margin:
+        cols['margin'] = top2_margin(sims)
+    return cols
+
+
+def flat_entries(cols: Dict[str, np.ndarray], parents, detail: bool = False) -> List[Any]:
+    if not detail:
+        return [parents[j]['en'] for j in cols['t0'].tolist()]
+    out: List[Any] = []
+    for order, scores in zip(cols['top_parents'].tolist(), cols['score'].tolist()):
+        out.append({
+            't0': parents[order[0]]['en'],
+            't1': None,
+            'top_parents': [
+                {'t0': parents[k]['en'], 'score': s} for k, s in zip(order, scores)
+            ]
+        })
+    return out
+
+
+def score_flat(V: np.ndarray, parents, p_emb, detail: bool = False, topk_children: int = 10) -> List[Any]:
+    return flat_entries(flat_columns(V, p_emb, detail=detail, topk_children=topk_children), parents, detail)
+
+
+def format_pair(pair: Dict[str, Any], output_format: str = 'pair-array', detail: bool = False):
+    if 'path' in pair:
+        return _format_path(pair, output_format, detail)
+    t0 = pair['t0']
+    t1 = pair['t1']
+    if detail:
+        # Always output object with detail list for consistency
+        return {'t0': t0, 't1': t1, 'top_children': pair.get('top_children', [])}
+    if output_format == 'pair-array':
+        return [t0, t1] if t1 else [t0]
+    if output_format == 'pair-string':
+        return f"{t0}, {t1}" if t1 else f"{t0}"
+    return {'t0': t0, 't1': t1}  # object
+
+
+def _format_path(entry: Dict[str, Any], output_format: str, detail: bool):
+    # Deep taxonomies: same shapes as format_pair, extended with t2, t3, ... along the chosen path
+    path = entry['path']
+    if detail:
+        return {**{f't{i}': name for i, name in enumerate(path)}, 'top_paths': entry.get('top_paths', [])}
+    if output_format == 'pair-array':
+        return list(path)
+    if output_format == 'pair-string':
+        return ', '.join(path)
+    return {f't{i}': name for i, name in enumerate(path)}
+
+
+def tag_pair(tag) -> tuple[str, str] | None:
+    # Inverse of format_pair for every output shape (pair-array/-string, object, detail, deep path)
+    # -> (t0, t1 or ''); None when the tag has no t0
+    if tag is None:
+        return None
+    if isinstance(tag, dict):
+        return (tag['t0'], tag.get('t1') or '') if tag.get('t0') else None
+    if isinstance(tag, str):
+        tag = [p.strip() for p in tag.split(',')]
+    if not tag or not tag[0]:
+        return None
+    return tag[0], (tag[1] or '') if len(tag) > 1 else ''
+
+
+def zero_shot_joint_titles(titles: List[str], taxonomy_path: str, model_key: str = 'minilm', alpha: float = 0.3, topk_parent: int | None = None, detail: bool = False, topk_children: int = 10, cache_dir: str = 'ml/out', title_cache: bool = True, title_cache_mb: int = 1024, backend: str = 'torch', workers: int = 1, embedder=None):
+    emb = embedder if embedder is not None else make_embedder(model_key, backend, cache_dir, workers)
+    parents, children, p_emb, c_emb = get_cached_label_embeddings(taxonomy_path, model_key, emb, cache_dir=cache_dir)
+    V = encode_titles(titles, model_key, emb, cache_dir, title_cache, title_cache_mb)  # [N, D]
+    return score_joint(V, parents, children, p_emb, c_emb, alpha=alpha, topk_parent=topk_parent, detail=detail, topk_children=topk_children)
+
+
+DEFAULT_BEAM = 8
+# Cascade: titles whose top-1 vs top-2 score gap is below this go to the heavy embedder
+DEFAULT_CASCADE_MARGIN = 0.02
+
+
+def load_label_set(taxonomy_path: str, model_key: str, embedder, cache_dir: str = 'ml/out', profiler=NULL_PROFILER, precision: str = 'float32'):
+    # (parents, children, p_emb, c_emb) for t0/t1 taxonomies; (levels, embs) for deeper trees
+    depth = taxonomy_depth(taxonomy_path, cache_dir)
+    if depth > 2:
+        return get_cached_tree_embeddings(taxonomy_path, model_key, embedder, cache_dir=cache_dir, profiler=profiler, precision=precision)
+    return get_cached_label_embeddings(taxonomy_path, model_key, embedder, cache_dir=cache_dir, profiler=profiler, precision=precision, depth=depth)
+
+
+def column_kind(labels, mode: str) -> str:
     if mode in ('zero-shot', 'zero-shot-flat'):
+        return 'flat'
+    return 'tree' if len(labels) == 2 else 'joint'
+
+
+def score_columns(V: np.ndarray, labels, mode: str, alpha: float = 0.3, topk_parent: int | None = None, beam: int | None = None, detail: bool = False, topk_children: int = 10, margin: bool = False) -> tuple[str, Dict[str, np.ndarray]]:
+    kind = column_kind(labels, mode)
+    if len(labels) == 2:
+        levels, embs = labels
+        if kind == 'flat':
+            return kind, flat_columns(V, embs[0], detail=detail, topk_children=topk_children, margin=margin)
+        return kind, tree_columns(V, levels, embs, alpha=alpha, beam=beam or topk_parent or DEFAULT_BEAM, detail=detail, topk_children=topk_children, margin=margin)
+    parents, children, p_emb, c_emb = labels
+    if kind == 'flat':
         # Flat zero-shot over parents only using cached embeddings
-        emb = Embedder(embedder_key)
-        parents, _children, p_emb, _c_emb = get_cached_label_embeddings(taxonomy_path, embedder_key, emb)
-        is_e5_style = 'e5' in embedder_key.lower()
-        if is_e5_style:
-            title_inputs = [f"query: {t}" for t in titles]
-        else:
-            title_inputs = titles
-        V = emb.encode(title_inputs)
-        sims = V @ p_emb.T
-        mapping: Dict[str, Any] = {}
-        for i, title in enumerate(titles):
-            j = int(np.argmax(sims[i]))
-            if detail:
-                # Provide top-k parent list if detail requested
-                order = np.argsort(-sims[i])[:topk_children]
-                mapping[title] = {
-                    't0': parents[order[0]]['en'],
-                    't1': None,
-                    'top_parents': [
-                        {'t0': parents[k]['en'], 'score': float(sims[i, k])} for k in order
-                    ]
-                }
-            else:
-                mapping[title] = parents[j]['en']
+        return kind, flat_columns(V, p_emb, detail=detail, topk_children=topk_children, margin=margin)
+    # zero-shot-joint hierarchical
+    return kind, joint_columns(V, children, p_emb, c_emb, alpha=alpha, topk_parent=topk_parent, detail=detail, topk_children=topk_children, margin=margin)
+
+
+def columns_to_tags(kind: str, cols: Dict[str, np.ndarray], labels, output_format: str = 'pair-array', detail: bool = False) -> List[Any]:
+    if kind == 'flat':
+        parents = labels[0][0] if len(labels) == 2 else labels[0]
+        return flat_entries(cols, parents, detail)
+    if kind == 'tree':
+        entries = tree_entries(cols, tree_paths(labels[0]), detail)
+    else:
+        entries = joint_entries(cols, labels[0], labels[1], detail)
+    return [format_pair(e, output_format, detail) for e in entries]
+
+
+def score_tags(V: np.ndarray, labels, mode: str, alpha: float = 0.3, topk_parent: int | None = None, beam: int | None = None, output_format: str = 'pair-array', detail: bool = False, topk_children: int = 10) -> List[Any]:
+    kind, cols = score_columns(V, labels, mode, alpha, topk_parent, beam, detail, topk_children)
+    return columns_to_tags(kind, cols, labels, output_format, detail)
+
+
+def column_label_table(kind: str, labels) -> Dict[str, Any]:
+    # Label names stored once in a columnar result's meta.json; columns index into these lists
+    if len(labels) == 2:
+        levels = labels[0]
+        return {'parents': [n['en'] for n in levels[0]]} if kind == 'flat' else {'paths': tree_paths(levels)}
+    parents, children = labels[0], labels[1]
+    table: Dict[str, Any] = {'parents': [p['en'] for p in parents]}
+    if kind == 'joint':
+        table['children'] = [[c['p_index'], c['en']] for c in children]
+    return table
+
+
+def labels_from_table(kind: str, table: Dict[str, Any]):
+    # Minimal label set for columns_to_tags (names only, no embeddings)
+    if kind == 'tree':
+        return [[{'path': p} for p in table['paths']]], None
+    parents = [{'en': name} for name in table['parents']]
+    children = [{'p_index': p, 'p_en': table['parents'][p], 'en': name} for p, name in table.get('children', [])]
+    return parents, children, None, None
+
+
+def predict_titles(titles: List[str], mode: str, model_path: str, taxonomy_path: str, topk: int = 1, alpha: float = 0.3, topk_parent: int | None = None, output_format: str = 'pair-array', embedder_key: str = 'minilm', detail: bool = False, topk_children: int = 10, cache_dir: str = 'ml/out', title_cache: bool = True, title_cache_mb: int = 1024, backend: str = 'torch', workers: int = 1, embedder=None, labels=None, vectors: np.ndarray | None = None, profiler=NULL_PROFILER, beam: int | None = None, precision: str = 'float32', pipeline_depth: int = 0, chunk_size: int = 2048, cascade_embedder: str | None = None, cascade_margin: float = DEFAULT_CASCADE_MARGIN, cascade_stats: Dict[str, Any] | None = None):
+    # Long-lived callers (e.g. tools/serve_titles.py) pass a resident embedder, the label set
+    # from load_label_set and/or precomputed title vectors.
+    if cascade_embedder:
+        # The cascade builds both embedders and label sets itself and encodes in one pass per stage
+        if embedder is not None or labels is not None or vectors is not None or pipeline_depth > 0:
+            raise ValueError('cascade_embedder does not combine with embedder/labels/vectors or pipeline_depth')
+        mapping, stats = predict_titles_cascade(titles, mode, taxonomy_path, embedder_key, cascade_embedder, cascade_margin, alpha, topk_parent, output_format, detail, topk_children, cache_dir, title_cache, title_cache_mb, backend, workers, profiler, beam, precision)
+        if cascade_stats is not None:
+            cascade_stats.update(stats)
         return mapping
-    else:  # zero-shot-joint hierarchical
-        pairs = zero_shot_joint_titles(titles, taxonomy_path, model_key=embedder_key, alpha=alpha, topk_parent=topk_parent, detail=detail, topk_children=topk_children)
+    emb = embedder if embedder is not None else make_embedder(embedder_key, backend, cache_dir, workers)
+    if labels is None:
+        labels = load_label_set(taxonomy_path, embedder_key, emb, cache_dir=cache_dir, profiler=profiler, precision=precision)
+    if pipeline_depth > 0 and vectors is None:
         mapping: Dict[str, Any] = {}
-        for title, pair in zip(titles, pairs):
-            t0 = pair['t0']
-            t1 = pair['t1']
-            if detail:
-                # Always output object with detail list for consistency
-                obj = {'t0': t0, 't1': t1, 'top_children': pair.get('top_children', [])}
-                mapping[title] = obj
-            else:
-                if output_format == 'pair-array':
-                    mapping[title] = [t0, t1] if t1 else [t0]
-                elif output_format == 'pair-string':
-                    mapping[title] = f"{t0}, {t1}" if t1 else f"{t0}"
-                else:  # object
-                    mapping[title] = {'t0': t0, 't1': t1}
+        score = lambda V: score_tags(V, labels, mode, alpha, topk_parent, beam, output_format, detail, topk_children)
+        for chunk, tags in tag_chunks(_chunked(titles, chunk_size), score, embedder_key, emb, cache_dir, title_cache, title_cache_mb, profiler, precision, pipeline_depth):
+            mapping.update(zip(chunk, tags))
         return mapping
+    V = vectors if vectors is not None else encode_titles(titles, embedder_key, emb, cache_dir, title_cache, title_cache_mb, profiler=profiler, precision=precision)
+    with profiler.stage('score', items=len(titles)):
+        return dict(zip(titles, score_tags(V, labels, mode, alpha, topk_parent, beam, output_format, detail, topk_children)))
+
+
+def _stage_seconds(profiler, start: int) -> float:
+    # Encode + score wall time recorded since events[start], without lazy model loading
+    events = profiler.events[start:]
+    work = sum(e['wall_s'] for e in events if e['name'] in ('encode', 'score'))
+    return work - sum(e['wall_s'] for e in events if e['name'] == 'model_load')
+
+
+def predict_titles_cascade(titles: List[str], mode: str, taxonomy_path: str, embedder_key: str, cascade_embedder: str, cascade_margin: float = DEFAULT_CASCADE_MARGIN, alpha: float = 0.3, topk_parent: int | None = None, output_format: str = 'pair-array', detail: bool = False, topk_children: int = 10, cache_dir: str = 'ml/out', title_cache: bool = True, title_cache_mb: int = 1024, backend: str = 'torch', workers: int = 1, profiler=NULL_PROFILER, beam: int | None = None, precision: str = 'float32') -> tuple[Dict[str, Any], Dict[str, Any]]:
+    # Two-stage cascade: every title is scored with the fast embedder, then titles whose top-1 vs top-2
+    # margin is below cascade_margin are re-scored with the heavy one. Both stages share the taxonomy, so
+    # their columns line up and escalated rows simply replace the fast rows before formatting.
+    titles = list(dict.fromkeys(titles))  # stats count distinct titles, like the returned mapping
+    prof = profiler if profiler.enabled else Profiler()
+    rows = np.arange(len(titles))
+    stages: List[Dict[str, Any]] = []
+    kind, cols, labels, margins = None, None, None, np.zeros(0, dtype=np.float32)
+    for stage, key in enumerate((embedder_key, cascade_embedder)):
+        if stage and not rows.shape[0]:
+            stages.append({'embedder': key, 'titles': 0, 'seconds': 0.0})
+            break
+        emb = make_embedder(key, backend, cache_dir, workers)
+        stage_labels = load_label_set(taxonomy_path, key, emb, cache_dir=cache_dir, profiler=prof, precision=precision)
+        start = len(prof.events)
+        V = encode_titles([titles[i] for i in rows], key, emb, cache_dir, title_cache, title_cache_mb, profiler=prof, precision=precision)
+        with prof.stage('score', items=rows.shape[0], stage=key):
+            kind, stage_cols = score_columns(V, stage_labels, mode, alpha, topk_parent, beam, detail, topk_children, margin=True)
+        stages.append({'embedder': key, 'titles': int(rows.shape[0]), 'seconds': round(_stage_seconds(prof, start), 4)})
+        if stage == 0:
+            cols, labels, margins = stage_cols, stage_labels, stage_cols['margin']
+            rows = rows[margins < cascade_margin]
+        else:
+            for name, arr in stage_cols.items():
+                cols[name][rows] = arr
+    with prof.stage('format', items=len(titles)):
+        tags = columns_to_tags(kind, cols, labels, output_format, detail)
+
+    n, escalated = len(titles), int(rows.shape[0])
+    fast_s, heavy_s = stages[0]['seconds'], stages[1]['seconds']
+    # Heavy-only cost extrapolated from the measured per-title cost of the escalated titles
+    heavy_only_s = heavy_s / escalated * n if escalated else None
+    finite = margins[np.isfinite(margins)]
+    stats = {
+        'embedders': [embedder_key, cascade_embedder],
+        'margin': cascade_margin,
+        'titles': n,
+        'escalated': escalated,
+        'escalated_fraction': round(escalated / n, 4) if n else 0.0,
+        'decided_by': {embedder_key: n - escalated, cascade_embedder: escalated},
+        'stages': stages,
+        'fast_margin_quantiles': {f'p{q}': round(float(np.percentile(finite, q)), 4) for q in (10, 25, 50, 75, 90)} if finite.shape[0] else None,
+        'estimated_heavy_only_seconds': round(heavy_only_s, 4) if heavy_only_s is not None else None,
+        'estimated_seconds_saved': round(heavy_only_s - fast_s - heavy_s, 4) if heavy_only_s is not None else None,
+        'escalated_titles': [titles[i] for i in rows.tolist()],
+    }
+    return dict(zip(titles, tags)), stats
+
+
+def run_metadata(mode: str, alpha: float, topk_parent: int | None, embedder_key: str, backend: str, detail: bool, topk_children: int, beam: int | None = None, precision: str = 'float32') -> Dict[str, Any]:
+    # Settings recorded next to every result (JSON document, stream header, columnar meta.json)
+    meta = {
+        'mode': mode,
+        'alpha': alpha,
+        'topk_parent': topk_parent,
+        'embedder': embedder_key,
+        'backend': backend,
+        'detail': detail,
+        'topk_children': topk_children if detail else None,
+    }
+    if beam is not None:
+        meta['beam'] = beam
+    if precision != 'float32':
+        meta['precision'] = precision
+    return meta
+
+
+def _chunked(items: Iterable[str], size: int) -> Iterator[List[str]]:
+    chunk: List[str] = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def tag_chunks(chunks: Iterable[List[str]], score, embedder_key: str, emb, cache_dir: str = 'ml/out', title_cache: bool = True, title_cache_mb: int = 1024, profiler=NULL_PROFILER, precision: str = 'float32', pipeline_depth: int = 0) -> Iterator[tuple[List[str], Any]]:
+    # (chunk, score(V)) per chunk, in input order. With pipeline_depth > 0 reading, encoding and scoring
+    # each run in their own thread (ml/src/pipeline.py) and overlap with the caller, which writes.
+    def encode(chunk):
+        return chunk, encode_titles(chunk, embedder_key, emb, cache_dir, title_cache, title_cache_mb, profiler=profiler, precision=precision)
+
+    def run_score(item):
+        chunk, V = item
+        with profiler.stage('score', items=len(chunk)):
+            return chunk, score(V)
+
+    return pipelined(chunks, [encode, run_score], pipeline_depth)
+
+
+def predict_titles_stream(in_path: str, out_path: str, mode: str, taxonomy_path: str, alpha: float = 0.3, topk_parent: int | None = None, output_format: str = 'pair-array', embedder_key: str = 'minilm', detail: bool = False, topk_children: int = 10, cache_dir: str = 'ml/out', title_cache: bool = True, title_cache_mb: int = 1024, chunk_size: int = 2048, backend: str = 'torch', workers: int = 1, profiler=NULL_PROFILER, beam: int | None = None, precision: str = 'float32', pipeline_depth: int = 0) -> int:
+    # Bounded-memory variant of predict_titles: titles are read, encoded and scored chunk by chunk,
+    # and one JSONL record {"title", "tags"} is written per input title (after a single {"meta"} header line).
+    user_id, titles = stream_titles(in_path)
+    emb = make_embedder(embedder_key, backend, cache_dir, workers)
+    labels = load_label_set(taxonomy_path, embedder_key, emb, cache_dir=cache_dir, profiler=profiler, precision=precision)
+    meta = {'user_id': user_id, **run_metadata(mode, alpha, topk_parent, embedder_key, backend, detail, topk_children, beam, precision)}
+    count = 0
+    os.makedirs(os.path.dirname(out_path) or '.', exist_ok=True)
+    with open(out_path, 'w', encoding='utf-8') as f:
+        f.write(json.dumps({'meta': meta}, ensure_ascii=False) + '\n')
+        score = lambda V: score_tags(V, labels, mode, alpha, topk_parent, beam, output_format, detail, topk_children)
+        for chunk, tags in tag_chunks(_chunked(titles, chunk_size), score, embedder_key, emb, cache_dir, title_cache, title_cache_mb, profiler, precision, pipeline_depth):
+            with profiler.stage('serialize', items=len(chunk)):
+                f.write(''.join(json.dumps({'title': t, 'tags': tag}, ensure_ascii=False) + '\n' for t, tag in zip(chunk, tags)))
+            count += len(chunk)
+        if profiler.enabled:
+            # Streams carry their header first, so the profile goes into a trailing record
+            f.write(json.dumps({'profile': profiler.summary()}) + '\n')
+    return count
+
+
+def predict_titles_columnar(titles: Iterable[str], user_id: str, out_path: str, mode: str, taxonomy_path: str, alpha: float = 0.3, topk_parent: int | None = None, output_format: str = 'pair-array', embedder_key: str = 'minilm', detail: bool = False, topk_children: int = 10, cache_dir: str = 'ml/out', title_cache: bool = True, title_cache_mb: int = 1024, chunk_size: int = 2048, backend: str = 'torch', workers: int = 1, profiler=NULL_PROFILER, beam: int | None = None, precision: str = 'float32', pipeline_depth: int = 0) -> int:
+    # Writes one row per input title into a columnar result directory (ml/src/columnar.py) instead of
+    # building per-title dicts; columnar_document() turns it back into the JSON document on demand.
+    emb = make_embedder(embedder_key, backend, cache_dir, workers)
+    labels = load_label_set(taxonomy_path, embedder_key, emb, cache_dir=cache_dir, profiler=profiler, precision=precision)
+    run = {'user_id': user_id, **run_metadata(mode, alpha, topk_parent, embedder_key, backend, detail, topk_children, beam, precision)}
+    kind = column_kind(labels, mode)
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    with ColumnarWriter(out_path, kind, column_label_table(kind, labels), run, output_format) as writer:
+        score = lambda V: score_columns(V, labels, mode, alpha, topk_parent, beam, detail, topk_children)[1]
+        for chunk, cols in tag_chunks(_chunked(titles, chunk_size), score, embedder_key, emb, cache_dir, title_cache, title_cache_mb, profiler, precision, pipeline_depth):
+            with profiler.stage('serialize', items=len(chunk)):
+                writer.append(chunk, cols)
+        if profiler.enabled:
+            run['profile'] = profiler.summary()
+        return writer.meta['rows']
+
+
+def columnar_document(path: str, output_format: str | None = None, chunk_size: int = 65536) -> Dict[str, Any]:
+    # Rebuild the JSON document main() would have written for the same run
+    res = ColumnarResult(path)
+    labels = labels_from_table(res.kind, res.labels)
+    output_format = output_format or res.meta['output_format']
+    detail = bool(res.run.get('detail'))
+    mapping: Dict[str, Any] = {}
+    for titles, cols in res.chunks(chunk_size):
+        mapping.update(zip(titles, columns_to_tags(res.kind, cols, labels, output_format, detail)))
+    run = dict(res.run)
+    return {'user_id': run.pop('user_id', ''), 'titles_to_tag_map': mapping, **run}
+
+
+def predict_events(in_path: str, out_path: str, mode: str, taxonomy_path: str, alpha: float = 0.3, topk_parent: int | None = None, output_format: str = 'pair-array', embedder_key: str = 'minilm', detail: bool = False, topk_children: int = 10, cache_dir: str = 'ml/out', title_cache: bool = True, title_cache_mb: int = 1024, chunk_size: int = 2048, backend: str = 'torch', workers: int = 1, profiler=NULL_PROFILER, beam: int | None = None, precision: str = 'float32', pipeline_depth: int = 0) -> Dict[str, int]:
+    # Classify a raw event export. Pass 1 streams the events and keeps only the distinct normalized
+    # titles plus one int per event; each distinct title is encoded and scored exactly once; pass 2
+    # re-streams the events and writes each one back (all original fields) with its "tags" as JSONL.
+    index: Dict[str, int] = {}
+    with profiler.stage('load_events') as st:
+        event_rows = array('l')
+        for ev in stream_events(in_path):
+            title = ev.get('title')
+            key = normalize_text(title) if isinstance(title, str) else ''
+            if not key:
+                event_rows.append(-1)
+                continue
+            event_rows.append(index.setdefault(key, len(index)))
+        st['items'] = len(event_rows)
+        st['distinct_titles'] = len(index)
+    distinct = list(index)
+    del index
+
+    emb = make_embedder(embedder_key, backend, cache_dir, workers)
+    labels = load_label_set(taxonomy_path, embedder_key, emb, cache_dir=cache_dir, profiler=profiler, precision=precision)
+    tags: List[Any] = []
+    score = lambda V: score_tags(V, labels, mode, alpha, topk_parent, beam, output_format, detail, topk_children)
+    chunks = (distinct[start:start + chunk_size] for start in range(0, len(distinct), chunk_size))
+    for _chunk, chunk_tags in tag_chunks(chunks, score, embedder_key, emb, cache_dir, title_cache, title_cache_mb, profiler, precision, pipeline_depth):
+        tags.extend(chunk_tags)
+
+    stats = {'events': len(event_rows), 'distinct_titles': len(distinct), 'untitled_events': sum(1 for r in event_rows if r < 0)}
+    meta = {'source': 'events', **run_metadata(mode, alpha, topk_parent, embedder_key, backend, detail, topk_children, beam, precision), **stats}
+    os.makedirs(os.path.dirname(out_path) or '.', exist_ok=True)
+    with profiler.stage('serialize', items=len(event_rows)):
+        with open(out_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({'meta': meta}, ensure_ascii=False) + '\n')
+            lines: List[str] = []
+            for ev, row in zip(stream_events(in_path), event_rows):
+                ev['tags'] = tags[row] if row >= 0 else None
+                lines.append(json.dumps(ev, ensure_ascii=False) + '\n')
+                if len(lines) >= chunk_size:
+                    f.write(''.join(lines))
+                    lines = []
+            f.write(''.join(lines))
+            if profiler.enabled:
+                f.write(json.dumps({'profile': profiler.summary()}) + '\n')
+    return stats
 
 
 def main():
@@ -315,15 +1232,130 @@ def main():
     ap.add_argument('--topk', type=int, default=1, help='How many labels to consider; output uses top-1')
     ap.add_argument('--alpha', type=float, default=0.3, help='Parent contribution for joint scoring (0-1)')
     ap.add_argument('--topk-parent', type=int, default=None, help='Restrict children to top-K parents (optional)')
+    ap.add_argument('--beam', type=int, default=None, help='Beam width per level for taxonomies deeper than t0/t1 (default: --topk-parent, else 8)')
     ap.add_argument('--output-format', choices=['pair-array', 'pair-string', 'object'], default='pair-array', help='How to represent per-title tags')
     ap.add_argument('--embedder', default='minilm', help='Embedder key or HuggingFace model name (supports multilingual).')
+    ap.add_argument('--backend', choices=list(BACKENDS), default='torch', help='Embedder runtime: PyTorch, or a cached local ONNX graph (optionally int8-quantized) for CPU hosts')
+    ap.add_argument('--precision', choices=list(PRECISIONS), default='float32', help='Store and score title/label embeddings as float32, float16 or int8 (per-vector scale); products accumulate in float32')
+    ap.add_argument('--workers', type=int, default=1, help='Encode in this many worker processes (one model copy each) over length-bucketed batches')
     ap.add_argument('--detail', action='store_true', help='If set, include detailed top-k scoring info directly (unifies scripts).')
     ap.add_argument('--topk-children', type=int, default=10, help='Top-K children (or parents in flat mode) to include when --detail.')
+    ap.add_argument('--cache-dir', default='ml/out', help='Directory for label and title embedding caches')
+    ap.add_argument('--no-title-cache', action='store_true', help='Encode every title instead of reusing the persistent title embedding store')
+    ap.add_argument('--title-cache-max-mb', type=int, default=1024, help='Size bound for the title embedding store; older unused rows are evicted beyond it')
+    ap.add_argument('--stream', action='store_true', help='Read, encode and score titles in fixed-size chunks and write JSONL (one record per title); memory stays constant')
+    ap.add_argument('--chunk-size', type=int, default=2048, help='Titles per chunk in --stream/--events/--columnar mode, or with --pipeline-depth')
+    ap.add_argument('--pipeline-depth', type=int, default=0, help='Run reading, encoding, scoring and writing as overlapping threads joined by queues of this many chunks (0 = one stage after another)')
+    ap.add_argument('--events', action='store_true', help='Input is a raw event export (local-events.json); classify each distinct title once and write every event with its tags as JSONL')
+    ap.add_argument('--columnar', action='store_true', help='Write --output as a directory of column arrays (label indices, top-k index/score matrices) instead of JSON; rebuild JSON with tools/columnar_to_json.py')
+    ap.add_argument('--cascade-embedder', default=None, help='Heavier embedder for a second pass over low-confidence titles; --embedder then acts as the fast first stage')
+    ap.add_argument('--cascade-margin', type=float, default=DEFAULT_CASCADE_MARGIN, help='Escalate titles whose top-1 minus top-2 score from the fast stage is below this')
+    ap.add_argument('--profile', action='store_true', help='Record per-stage wall/CPU time, peak RSS, item counts and cache hits into the output metadata')
+    ap.add_argument('--profile-trace', default=None, help='Also write the stage timeline as a Chrome trace JSON here (implies --profile)')
     args = ap.parse_args()
+    if args.columnar and args.events:
+        ap.error('--columnar does not apply to --events (events keep their own fields per line)')
 
+    if args.cascade_embedder and (args.events or args.columnar or args.stream):
+        ap.error('--cascade-embedder writes the JSON document; it does not combine with --stream/--events/--columnar')
+    if args.cascade_embedder and args.pipeline_depth > 0:
+        ap.error('--cascade-embedder encodes each stage in one pass; it does not combine with --pipeline-depth')
     # Supervised mode removed in zero-shot-only cleanup.
+    profiler = Profiler() if (args.profile or args.profile_trace) else NULL_PROFILER
+
+    if args.events:
+        predict_events(
+            args.input,
+            args.output,
+            args.mode,
+            args.taxonomy,
+            alpha=args.alpha,
+            topk_parent=args.topk_parent,
+            output_format=args.output_format,
+            embedder_key=args.embedder,
+            detail=args.detail,
+            topk_children=args.topk_children,
+            cache_dir=args.cache_dir,
+            title_cache=not args.no_title_cache,
+            title_cache_mb=args.title_cache_max_mb,
+            chunk_size=args.chunk_size,
+            backend=args.backend,
+            workers=args.workers,
+            profiler=profiler,
+            beam=args.beam,
+            precision=args.precision,
+            pipeline_depth=args.pipeline_depth,
+        )
+        if args.profile_trace:
+            profiler.write_trace(args.profile_trace)
+        print(args.output)
+        return
+
+    if args.columnar:
+        with profiler.stage('load_titles') as st:
+            user_id, titles = stream_titles(args.input) if args.stream else load_titles(args.input)
+            if isinstance(titles, list):
+                st['items'] = len(titles)
+        predict_titles_columnar(
+            titles,
+            user_id,
+            args.output,
+            args.mode,
+            args.taxonomy,
+            alpha=args.alpha,
+            topk_parent=args.topk_parent,
+            output_format=args.output_format,
+            embedder_key=args.embedder,
+            detail=args.detail,
+            topk_children=args.topk_children,
+            cache_dir=args.cache_dir,
+            title_cache=not args.no_title_cache,
+            title_cache_mb=args.title_cache_max_mb,
+            chunk_size=args.chunk_size,
+            backend=args.backend,
+            workers=args.workers,
+            profiler=profiler,
+            beam=args.beam,
+            precision=args.precision,
+            pipeline_depth=args.pipeline_depth,
+        )
+        if args.profile_trace:
+            profiler.write_trace(args.profile_trace)
+        print(args.output)
+        return
+
+    if args.stream:
+        predict_titles_stream(
+            args.input,
+            args.output,
+            args.mode,
+            args.taxonomy,
+            alpha=args.alpha,
+            topk_parent=args.topk_parent,
+            output_format=args.output_format,
+            embedder_key=args.embedder,
+            detail=args.detail,
+            topk_children=args.topk_children,
+            cache_dir=args.cache_dir,
+            title_cache=not args.no_title_cache,
+            title_cache_mb=args.title_cache_max_mb,
+            chunk_size=args.chunk_size,
+            backend=args.backend,
+            workers=args.workers,
+            profiler=profiler,
+            beam=args.beam,
+            precision=args.precision,
+            pipeline_depth=args.pipeline_depth,
+        )
+        if args.profile_trace:
+            profiler.write_trace(args.profile_trace)
+        print(args.output)
+        return
 
-    user_id, titles = load_titles(args.input)
+    with profiler.stage('load_titles') as st:
+        user_id, titles = load_titles(args.input)
+        st['items'] = len(titles)
+    cascade: Dict[str, Any] = {}
     mapping = predict_titles(
         titles,
         args.mode,
@@ -336,20 +1368,36 @@ def main():
         embedder_key=args.embedder,
         detail=args.detail,
         topk_children=args.topk_children,
+        cache_dir=args.cache_dir,
+        title_cache=not args.no_title_cache,
+        title_cache_mb=args.title_cache_max_mb,
+        backend=args.backend,
+        workers=args.workers,
+        profiler=profiler,
+        beam=args.beam,
+        precision=args.precision,
+        pipeline_depth=args.pipeline_depth,
+        chunk_size=args.chunk_size,
+        cascade_embedder=args.cascade_embedder,
+        cascade_margin=args.cascade_margin,
+        cascade_stats=cascade,
     )
     out = {
         'user_id': user_id,
         'titles_to_tag_map': mapping,
-        'mode': args.mode,
-        'alpha': args.alpha,
-        'topk_parent': args.topk_parent,
-        'embedder': args.embedder,
-        'detail': args.detail,
-        'topk_children': args.topk_children if args.detail else None,
+        **run_metadata(args.mode, args.alpha, args.topk_parent, args.embedder, args.backend, args.detail, args.topk_children, args.beam, args.precision),
     }
+    if cascade:
+        out['cascade'] = cascade
+    if profiler.enabled:
+        # Serialization of this document cannot be inside its own metadata; it shows up in the trace
+        out['profile'] = profiler.summary()
     os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
-    with open(args.output, 'w', encoding='utf-8') as f:
-        json.dump(out, f, ensure_ascii=False, indent=2)
+    with profiler.stage('serialize', items=len(mapping)):
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(out, f, ensure_ascii=False, indent=2)
+    if args.profile_trace:
+        profiler.write_trace(args.profile_trace)
     print(args.output)
 
 
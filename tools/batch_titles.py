@@ -0,0 +1,274 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+# Ensure project root is on sys.path so 'tools'/'ml' are importable when running from tools/
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from ml.src.embed_store import normalize_text
+from ml.src.models import BACKENDS
+from ml.src.quant import PRECISIONS
+from tools.apply_titles import load_label_set, load_titles, make_embedder, run_metadata, score_tags, tag_chunks, taxonomy_fingerprint
+
+# Classify many users' title exports in one process. The embedder and label set are loaded once;
+# titles are deduplicated across the pending users (normalized like the title store) before encoding,
+# scored in large batches, and every user gets the JSON document tools/apply_titles.py would write.
+# Users are processed in groups of about --max-titles titles so memory stays bounded. Finished users
+# are recorded in <output-dir>/batch_state.json (with input size/mtime and a hash of the settings;
+# appended to batch_state.jsonl while a run is going), so an interrupted run resumes with the users
+# that were not written yet.
+
+STATE_VERSION = 1
+
+
+def read_manifest(path: str) -> List[Tuple[str, str | None]]:
+    # JSON: [{"input": ..., "output": ...}, ...] (or a list of paths); text: one "input[<TAB>output]" per line.
+    # Relative paths are resolved against the manifest's directory.
+    base = os.path.dirname(os.path.abspath(path))
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    if path.lower().endswith('.json'):
+        entries = [e if isinstance(e, dict) else {'input': e} for e in json.loads(text)]
+    else:
+        entries = []
+        for line in text.splitlines():
+            line = line.strip()
+            if line and not line.startswith('#'):
+                parts = line.split('\t')
+                entries.append({'input': parts[0], 'output': parts[1] if len(parts) > 1 else None})
+    return [(os.path.join(base, e['input']), os.path.join(base, e['output']) if e.get('output') else None) for e in entries]
+
+
+def discover_jobs(args) -> List[Tuple[str, str]]:
+    if args.manifest:
+        found = read_manifest(args.manifest)
+    else:
+        found = [(p, None) for p in sorted(glob.glob(os.path.join(args.input_dir, args.pattern)))]
+    jobs = []
+    for in_path, out_path in found:
+        out_path = out_path or os.path.join(args.output_dir, f'{Path(in_path).stem}_tagged.json')
+        jobs.append((os.path.abspath(in_path), os.path.abspath(out_path)))
+    return jobs
+
+
+def _input_signature(path: str) -> List[int]:
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+
+class BatchState:
+    # batch_state.json is a snapshot; each finished user is appended as one line to batch_state.jsonl
+    # next to it (O(1) per user, a crash loses at most the line being written). compact() folds the
+    # journal into the snapshot at the end of a run.
+    def __init__(self, path: str, config: str):
+        self.path = path
+        self.journal = os.path.splitext(path)[0] + '.jsonl'
+        self.config = config
+        self.done: Dict[str, Dict[str, Any]] = {}
+        changed = False
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            if state.get('version') == STATE_VERSION and state.get('config') == config:
+                self.done = state['done']
+            elif state.get('done'):
+                changed = True
+        except (OSError, ValueError):
+            pass
+        try:
+            with open(self.journal, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except ValueError:
+                        continue  # torn last line of an interrupted run
+                    if rec.pop('config', None) == config:
+                        self.done[rec.pop('input')] = rec
+                    else:
+                        changed = True
+        except OSError:
+            pass
+        if changed:
+            print('batch settings changed since the last run; reclassifying all users', file=sys.stderr)
+
+    def is_done(self, in_path: str, out_path: str) -> bool:
+        rec = self.done.get(in_path)
+        return rec is not None and rec['output'] == out_path and rec['input_sig'] == _input_signature(in_path) and os.path.exists(out_path)
+
+    def mark_done(self, in_path: str, out_path: str, stats: Dict[str, Any]):
+        rec = {'output': out_path, 'input_sig': _input_signature(in_path), **stats}
+        self.done[in_path] = rec
+        os.makedirs(os.path.dirname(self.journal) or '.', exist_ok=True)
+        with open(self.journal, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({'config': self.config, 'input': in_path, **rec}, ensure_ascii=False) + '\n')
+
+    def reset(self):
+        self.done = {}
+        self.compact()
+
+    def compact(self):
+        _write_json_atomic(self.path, {'version': STATE_VERSION, 'config': self.config, 'done': self.done}, indent=1)
+        try:
+            os.remove(self.journal)
+        except FileNotFoundError:
+            pass
+
+
+def _write_json_atomic(path: str, doc: Dict[str, Any], indent: int | None = 2):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(doc, f, ensure_ascii=False, indent=indent)
+    os.replace(tmp, path)
+
+
+def _groups(jobs: List[Tuple[str, str]], max_titles: int):
+    # Group users by input size as a cheap proxy for title count (files are only parsed per group)
+    group: List[Tuple[str, str]] = []
+    size = 0
+    budget = max_titles * 100  # ~100 bytes per exported title
+    for job in jobs:
+        group.append(job)
+        size += os.path.getsize(job[0])
+        if size >= budget:
+            yield group
+            group, size = [], 0
+    if group:
+        yield group
+
+
+def classify_group(group: List[Tuple[str, str]], emb, labels, meta: Dict[str, Any], state: BatchState, args) -> List[Dict[str, Any]]:
+    users: List[Dict[str, Any]] = []
+    index: Dict[str, int] = {}
+    texts: List[str] = []
+    for in_path, out_path in group:
+        t0 = time.perf_counter()
+        try:
+            user_id, titles = load_titles(in_path)
+        except (OSError, ValueError) as e:
+            users.append({'input': in_path, 'error': str(e)})
+            continue
+        rows = np.empty(len(titles), dtype=np.int64)
+        for i, t in enumerate(titles):
+            key = normalize_text(t)
+            j = index.get(key)
+            if j is None:
+                j = index[key] = len(texts)
+                texts.append(t)
+            rows[i] = j
+        users.append({'input': in_path, 'output': out_path, 'user_id': user_id, 'titles': titles, 'rows': rows, 'load_s': time.perf_counter() - t0})
+
+    # Encode + score every distinct title of the group once
+    t0 = time.perf_counter()
+    tags: List[Any] = []
+    score = lambda V: score_tags(V, labels, args.mode, args.alpha, args.topk_parent, args.beam, args.output_format, args.detail, args.topk_children)
+    chunks = (texts[s:s + args.batch_size] for s in range(0, len(texts), args.batch_size))
+    for _chunk, chunk_tags in tag_chunks(chunks, score, args.embedder, emb, args.cache_dir, not args.no_title_cache, args.title_cache_max_mb, precision=args.precision, pipeline_depth=args.pipeline_depth):
+        tags.extend(chunk_tags)
+    compute_s = time.perf_counter() - t0
+
+    # Attribute the shared compute to users: each distinct title's cost is split among the users that have it
+    ok = [u for u in users if 'error' not in u]
+    user_rows = [np.unique(u['rows']) for u in ok]
+    owners = np.bincount(np.concatenate(user_rows), minlength=len(texts)) if user_rows else np.zeros(0, dtype=np.int64)
+    reports = [{'input': u['input'], 'error': u['error']} for u in users if 'error' in u]
+    for u, rows in zip(ok, user_rows):
+        t0 = time.perf_counter()
+        mapping = {t: tags[r] for t, r in zip(u['titles'], u['rows'].tolist())}
+        _write_json_atomic(u['output'], {'user_id': u['user_id'], 'titles_to_tag_map': mapping, **meta})
+        write_s = time.perf_counter() - t0
+        share = float(np.sum(1.0 / owners[rows])) / len(texts) if len(texts) else 0.0
+        seconds = u['load_s'] + compute_s * share + write_s
+        stats = {
+            'user_id': u['user_id'],
+            'titles': len(u['titles']),
+            'distinct_titles': int(rows.shape[0]),
+            'shared_titles': int(np.sum(owners[rows] > 1)),
+            'seconds': round(seconds, 4),
+            'titles_per_sec': round(len(u['titles']) / seconds, 1) if seconds > 0 else None,
+        }
+        state.mark_done(u['input'], u['output'], stats)
+        reports.append({'input': u['input'], 'output': u['output'], **stats})
+        print(f"{u['user_id'] or Path(u['input']).stem}: {stats['titles']} titles ({stats['shared_titles']} shared) in {seconds:.2f}s, {stats['titles_per_sec']} titles/s", file=sys.stderr)
+    return reports
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Classify many users' title exports in one process: one model/label load, cross-user title dedup, one result file per user, resumable.")
+    src = ap.add_mutually_exclusive_group(required=True)
+    src.add_argument('--input-dir', help='Directory of export files (see --pattern)')
+    src.add_argument('--manifest', help='JSON list of {"input", "output"} or text file with one "input[<TAB>output]" per line')
+    ap.add_argument('--pattern', default='*.json', help='Glob for --input-dir')
+    ap.add_argument('--output-dir', default='ml/out/batch', help='Where <name>_tagged.json, batch_state.json and batch_report.json go')
+    ap.add_argument('--taxonomy', default='ml/taxonomies/taxonomy.json', help='Path to taxonomy file (JSON, YAML or compiled)')
+    ap.add_argument('--mode', choices=['zero-shot', 'zero-shot-joint'], default='zero-shot-joint', help='Prediction mode')
+    ap.add_argument('--alpha', type=float, default=0.3, help='Parent contribution for joint scoring (0-1)')
+    ap.add_argument('--topk-parent', type=int, default=None, help='Restrict children to top-K parents (optional)')
+    ap.add_argument('--beam', type=int, default=None, help='Beam width per level for taxonomies deeper than t0/t1')
+    ap.add_argument('--output-format', choices=['pair-array', 'pair-string', 'object'], default='pair-array', help='How to represent per-title tags')
+    ap.add_argument('--embedder', default='minilm', help='Embedder key or HuggingFace model name')
+    ap.add_argument('--backend', choices=list(BACKENDS), default='torch')
+    ap.add_argument('--precision', choices=list(PRECISIONS), default='float32')
+    ap.add_argument('--workers', type=int, default=1)
+    ap.add_argument('--detail', action='store_true')
+    ap.add_argument('--topk-children', type=int, default=10)
+    ap.add_argument('--cache-dir', default='ml/out', help='Directory for label and title embedding caches')
+    ap.add_argument('--no-title-cache', action='store_true')
+    ap.add_argument('--title-cache-max-mb', type=int, default=1024)
+    ap.add_argument('--batch-size', type=int, default=16384, help='Distinct titles per encode/score batch')
+    ap.add_argument('--max-titles', type=int, default=1000000, help='Approximate titles held in memory per group of users')
+    ap.add_argument('--pipeline-depth', type=int, default=2, help='Overlap encoding and scoring of batches (0 = sequential)')
+    ap.add_argument('--restart', action='store_true', help='Ignore batch_state.json and reclassify every user')
+    args = ap.parse_args()
+
+    jobs = discover_jobs(args)
+    meta = run_metadata(args.mode, args.alpha, args.topk_parent, args.embedder, args.backend, args.detail, args.topk_children, args.beam, args.precision)
+    config = hashlib.sha1(json.dumps({**meta, 'output_format': args.output_format, 'taxonomy': taxonomy_fingerprint(args.taxonomy)}, sort_keys=True).encode('utf-8')).hexdigest()
+    state = BatchState(os.path.join(args.output_dir, 'batch_state.json'), config)
+    if args.restart:
+        state.reset()
+    pending = [j for j in jobs if not state.is_done(*j)]
+    print(f'{len(jobs)} users, {len(jobs) - len(pending)} already done', file=sys.stderr)
+
+    t0 = time.perf_counter()
+    reports: List[Dict[str, Any]] = []
+    if pending:
+        emb = make_embedder(args.embedder, args.backend, args.cache_dir, args.workers)
+        labels = load_label_set(args.taxonomy, args.embedder, emb, cache_dir=args.cache_dir, precision=args.precision)
+        try:
+            for group in _groups(pending, args.max_titles):
+                reports.extend(classify_group(group, emb, labels, meta, state, args))
+        finally:
+            state.compact()
+    seconds = time.perf_counter() - t0
+
+    done = [r for r in reports if 'error' not in r]
+    titles = sum(r['titles'] for r in done)
+    report = {
+        'users': len(jobs),
+        'skipped': len(jobs) - len(pending),
+        'classified': len(done),
+        'failed': len(reports) - len(done),
+        'titles': titles,
+        'seconds': round(seconds, 4),
+        'titles_per_sec': round(titles / seconds, 1) if seconds > 0 and titles else None,
+        'per_user': reports,
+    }
+    _write_json_atomic(os.path.join(args.output_dir, 'batch_report.json'), report)
+    print(os.path.join(args.output_dir, 'batch_report.json'))
+    if report['failed']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+# Ensure project root is on sys.path so 'tools'/'ml' are importable when running from tools/
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from tools.apply_titles import _TITLE_STORES, encode_titles, format_pair, get_cached_label_embeddings, load_taxonomy_hier, score_joint
+from tools.stub_embedder import StubEmbedder
+
+# Stage-by-stage benchmark of the tools/apply_titles.py pipeline on synthetic data.
+# Uses StubEmbedder so it runs offline; encode timings therefore measure the pipeline around the
+# model (hashing, title store, dedup), not the transformer itself. Each stage is timed without
+# tracing, then (unless --no-memory) re-run under tracemalloc to record its peak allocation.
+
+VOCAB_SIZE = 20000
+
+
+def synthetic_titles(n: int, seed: int = 0) -> List[str]:
+    rng = np.random.default_rng(seed)
+    vocab = [f'w{i}' for i in range(VOCAB_SIZE)]
+    lengths = rng.integers(3, 16, size=n)
+    words = rng.integers(0, VOCAB_SIZE, size=int(lengths.sum()))
+    out, pos = [], 0
+    for i, k in enumerate(lengths.tolist()):
+        out.append(' '.join(vocab[j] for j in words[pos:pos + k].tolist()) + f' #{i}')
+        pos += k
+    return out
+
+
+def synthetic_taxonomy(path: str, n_parents: int, children_per_parent: int):
+    t0 = []
+    for p in range(n_parents):
+        t0.append({
+            'id': f'p{p:04d}',
+            'en': f'Parent {p}',
+            'desc': f'w{p} w{p + 1} w{p + 2} topic family {p}',
+            't1': [{'id': f'c{c:03d}', 'en': f'Child {p}.{c}', 'desc': f'w{p} w{1000 + c} w{2000 + p * children_per_parent + c}'} for c in range(children_per_parent)],
+        })
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'t0': t0}, f)
+
+
+def measure(fn: Callable[[], Any], items: int, memory: bool) -> tuple[Dict[str, Any], Any]:
+    gc.collect()
+    t0 = time.perf_counter()
+    c0 = time.process_time()
+    result = fn()
+    wall = time.perf_counter() - t0
+    rec = {
+        'seconds': round(wall, 6),
+        'cpu_seconds': round(time.process_time() - c0, 6),
+        'items': items,
+        'items_per_sec': round(items / wall, 1) if wall > 0 else None,
+    }
+    if memory:
+        del result
+        gc.collect()
+        tracemalloc.start()
+        result = fn()
+        _cur, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        rec['peak_mb'] = round(peak / 2**20, 3)
+    return rec, result
+
+
+def score_in_chunks(V, labels, chunk: int, **kw) -> List[Dict[str, Any]]:
+    parents, children, p_emb, c_emb = labels
+    out: List[Dict[str, Any]] = []
+    for s in range(0, V.shape[0], chunk):
+        out.extend(score_joint(V[s:s + chunk], parents, children, p_emb, c_emb, **kw))
+    return out
+
+
+def run(args) -> List[Dict[str, Any]]:
+    records: List[Dict[str, Any]] = []
+    emb = StubEmbedder(dim=args.dim)
+    work = tempfile.mkdtemp(prefix='thyself_bench_')
+    try:
+        for width in args.widths:
+            taxo = os.path.join(work, f'taxonomy_{width}.json')
+            synthetic_taxonomy(taxo, width, args.children_per_parent)
+            n_labels = width * (1 + args.children_per_parent)
+            base = {'width': width, 'children': width * args.children_per_parent}
+
+            rec, _ = measure(lambda: load_taxonomy_hier(taxo), n_labels, args.memory)
+            records.append({'stage': 'taxonomy_load', **base, **rec})
+
+            label_dir = os.path.join(work, f'labels_{width}')
+
+            def label_miss():
+                shutil.rmtree(label_dir, ignore_errors=True)
+                return get_cached_label_embeddings(taxo, 'stub', emb, cache_dir=label_dir)
+
+            rec, _ = measure(label_miss, n_labels, args.memory)
+            records.append({'stage': 'label_cache_miss', **base, **rec})
+            rec, labels = measure(lambda: get_cached_label_embeddings(taxo, 'stub', emb, cache_dir=label_dir), n_labels, args.memory)
+            records.append({'stage': 'label_cache_hit', **base, **rec})
+
+            for size in args.sizes:
+                titles = synthetic_titles(size)
+                sized = {**base, 'titles': size}
+                title_dir = os.path.join(work, f'titles_{width}_{size}')
+                mb = max(1024, size * (args.dim * 4 + 20) // 2**20 + 1)
+
+                if width == args.widths[0]:
+                    # Encoding does not depend on the taxonomy; measure it once per size
+                    rec, _ = measure(lambda: emb.encode(titles), size, args.memory)
+                    records.append({'stage': 'encode_raw', **sized, **rec})
+
+                    def title_miss():
+                        shutil.rmtree(title_dir, ignore_errors=True)
+                        _TITLE_STORES.clear()
+                        return encode_titles(titles, 'stub', emb, title_dir, True, mb)
+
+                    rec, _ = measure(title_miss, size, args.memory)
+                    records.append({'stage': 'encode_title_cache_miss', **sized, **rec})
+                    rec, _ = measure(lambda: encode_titles(titles, 'stub', emb, title_dir, True, mb), size, args.memory)
+                    records.append({'stage': 'encode_title_cache_hit', **sized, **rec})
+                V = emb.encode(titles)
+
+                for topk_parent in (None, args.topk_parent):
+                    for detail in (False, True):
+                        kw = dict(alpha=args.alpha, topk_parent=topk_parent, detail=detail, topk_children=args.topk_children)
+                        rec, pairs = measure(lambda: score_in_chunks(V, labels, args.score_chunk, **kw), size, args.memory)
+                        records.append({'stage': 'score_joint', **sized, 'topk_parent': topk_parent, 'detail': detail, **rec})
+                        if topk_parent is None or (detail and size > args.detail_json_max):
+                            continue
+                        out_path = os.path.join(work, 'out.json')
+
+                        def write_json():
+                            mapping = {t: format_pair(p, 'pair-array', detail) for t, p in zip(titles, pairs)}
+                            with open(out_path, 'w', encoding='utf-8') as f:
+                                json.dump({'user_id': 'bench', 'titles_to_tag_map': mapping}, f, ensure_ascii=False, indent=2)
+                            return os.path.getsize(out_path)
+
+                        rec, nbytes = measure(write_json, size, args.memory)
+                        records.append({'stage': 'json_output', **sized, 'topk_parent': topk_parent, 'detail': detail, 'bytes': nbytes, **rec})
+                        del pairs
+                del V, titles
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+    return records
+
+
+def _int_list(s: str) -> List[int]:
+    return [int(x) for x in s.split(',') if x.strip()]
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Benchmark each stage of tools/apply_titles.py on synthetic titles/taxonomies with a deterministic stub embedder.')
+    ap.add_argument('--sizes', type=_int_list, default=[1000, 100000, 1000000], help='Comma-separated title counts')
+    ap.add_argument('--widths', type=_int_list, default=[8, 32, 128], help='Comma-separated parent counts for synthetic taxonomies')
+    ap.add_argument('--children-per-parent', type=int, default=6)
+    ap.add_argument('--dim', type=int, default=384)
+    ap.add_argument('--alpha', type=float, default=0.3)
+    ap.add_argument('--topk-parent', type=int, default=8)
+    ap.add_argument('--topk-children', type=int, default=10)
+    ap.add_argument('--score-chunk', type=int, default=65536, help='Titles per score_joint call (bounds the [N, C] matrices)')
+    ap.add_argument('--detail-json-max', type=int, default=100000, help='Skip --detail JSON output for larger sizes')
+    ap.add_argument('--no-memory', dest='memory', action='store_false', help='Skip the tracemalloc re-run per stage')
+    ap.add_argument('--output', '-o', default=None, help='Write the JSON report here instead of stdout')
+    args = ap.parse_args()
+
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'embedder': f'stub/{args.dim}',
+            'args': {k: v for k, v in vars(args).items() if k != 'output'},
+        },
+        'stages': run(args),
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+        print(args.output)
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Ensure project root is on sys.path so 'tools'/'ml' are importable when running from tools/
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from tools.apply_titles import score_joint, score_tree
+
+
+def legacy_score_joint(V, parents, children, p_emb, c_emb, alpha=0.3, topk_parent=None, detail=False, topk_children=10):
+    # Per-title loop implementation that score_joint replaced; kept as the reference for equality + speed checks
+    child_pidx = np.array([c['p_index'] for c in children], dtype=np.int64)
+    p_scores = V @ p_emb.T
+    mask = None
+    if topk_parent is not None and topk_parent > 0 and topk_parent < len(parents):
+        topP = np.argpartition(-p_scores, kth=topk_parent-1, axis=1)[:, :topk_parent]
+        mask = np.zeros((V.shape[0], len(children)), dtype=bool)
+        for n in range(V.shape[0]):
+            mask[n] = np.isin(child_pidx, list(set(topP[n].tolist())))
+    c_scores = V @ c_emb.T
+    combined = (1.0 - alpha) * c_scores + alpha * p_scores[:, child_pidx]
+    results = []
+    for i in range(V.shape[0]):
+        if mask is not None:
+            valid_idx = np.where(mask[i])[0]
+            if valid_idx.size == 0:
+                entry = {'t0': parents[int(np.argmax(p_scores[i]))]['en'], 't1': None}
+                if detail:
+                    entry['top_children'] = []
+                results.append(entry)
+                continue
+            best_local = valid_idx[int(np.argmax(combined[i, valid_idx]))]
+        else:
+            best_local = int(np.argmax(combined[i]))
+        entry = {'t0': children[best_local]['p_en'], 't1': children[best_local]['en']}
+        if detail:
+            if mask is not None:
+                candidate_idx = valid_idx
+                candidate_scores = combined[i, candidate_idx]
+            else:
+                candidate_idx = np.arange(len(children))
+                candidate_scores = combined[i]
+            order = np.argsort(-candidate_scores)[:topk_children]
+            entry['top_children'] = [
+                {
+                    't0': children[candidate_idx[pos]]['p_en'],
+                    't1': children[candidate_idx[pos]]['en'],
+                    'combined': float(candidate_scores[pos]),
+                    'parent_score': float(p_scores[i, children[candidate_idx[pos]]['p_index']]),
+                    'child_score': float(V[i] @ c_emb[candidate_idx[pos]]),
+                }
+                for pos in order
+            ]
+        results.append(entry)
+    return results
+
+
+def synthetic_problem(n_titles: int, n_parents: int, children_per_parent: int, dim: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+
+    def unit(rows):
+        x = rng.standard_normal((rows, dim)).astype(np.float32)
+        return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+    parents = [{'id': f'p{i}', 'en': f'P{i}', 'p_index': i} for i in range(n_parents)]
+    children = [{'id': f'p{i}/c{j}', 'p_en': f'P{i}', 'en': f'P{i}C{j}', 'p_index': i} for i in range(n_parents) for j in range(children_per_parent)]
+    return unit(n_titles), parents, children, unit(n_parents), unit(len(children))
+
+
+def synthetic_tree(n_titles: int, depth: int, branching: int, dim: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+
+    def unit(rows):
+        x = rng.standard_normal((rows, dim)).astype(np.float32)
+        return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+    levels = [[{'id': f'n{i}', 'en': f'L0.{i}', 'path': [f'L0.{i}'], 'parent': -1} for i in range(branching)]]
+    for lvl in range(1, depth):
+        nodes = []
+        for pi, p in enumerate(levels[-1]):
+            for c in range(branching):
+                name = f'L{lvl}.{len(nodes)}'
+                nodes.append({'id': f"{p['id']}/{c}", 'en': name, 'path': p['path'] + [name], 'parent': pi})
+        levels.append(nodes)
+    return unit(n_titles), levels, [unit(len(nodes)) for nodes in levels]
+
+
+def tree_report(args):
+    # Beam search vs exhaustive search (beam wide enough to keep every node) on a synthetic deep tree
+    V, levels, embs = synthetic_tree(args.titles, args.tree_depth, args.branching, args.dim)
+    row = {'titles': args.titles, 'depth': args.tree_depth, 'leaves': len(levels[-1]), 'beam': args.beam}
+    outs = {}
+    for name, beam in (('exhaustive', max(len(nodes) for nodes in levels)), ('beam', args.beam)):
+        best = float('inf')
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            outs[name] = score_tree(V, levels, embs, alpha=args.alpha, beam=beam)
+            best = min(best, time.perf_counter() - t0)
+        row[f'{name}_titles_per_sec'] = round(args.titles / best, 1)
+    row['speedup'] = round(row['beam_titles_per_sec'] / row['exhaustive_titles_per_sec'], 2)
+    # Random embeddings carry no hierarchy, so agreement here is a lower bound
+    row['agreement'] = round(float(np.mean([a['path'] == b['path'] for a, b in zip(outs['beam'], outs['exhaustive'])])), 4)
+    return row
+
+
+def same_labels(a, b) -> bool:
+    def key(e):
+        return (e['t0'], e['t1'], [(c['t0'], c['t1']) for c in e.get('top_children', [])])
+    return all(key(x) == key(y) for x, y in zip(a, b)) and len(a) == len(b)
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Benchmark joint scoring: legacy per-title loop vs batched score_joint (or beam search vs exhaustive search with --tree-depth).')
+    ap.add_argument('--titles', type=int, default=20000)
+    ap.add_argument('--parents', type=int, default=20)
+    ap.add_argument('--children-per-parent', type=int, default=8)
+    ap.add_argument('--dim', type=int, default=384)
+    ap.add_argument('--alpha', type=float, default=0.3)
+    ap.add_argument('--topk-parent', type=int, default=8)
+    ap.add_argument('--topk-children', type=int, default=10)
+    ap.add_argument('--repeat', type=int, default=3)
+    ap.add_argument('--tree-depth', type=int, default=0, help='If > 2, benchmark beam search on a synthetic tree of this depth instead')
+    ap.add_argument('--branching', type=int, default=10, help='Children per node for --tree-depth')
+    ap.add_argument('--beam', type=int, default=8, help='Beam width for --tree-depth')
+    args = ap.parse_args()
+
+    if args.tree_depth > 2:
+        print(json.dumps(tree_report(args), indent=2))
+        return
+
+    V, parents, children, p_emb, c_emb = synthetic_problem(args.titles, args.parents, args.children_per_parent, args.dim)
+    report = []
+    for topk_parent in (None, args.topk_parent):
+        for detail in (False, True):
+            kw = dict(alpha=args.alpha, topk_parent=topk_parent, detail=detail, topk_children=args.topk_children)
+            row = {'titles': args.titles, 'parents': args.parents, 'children': len(children), 'topk_parent': topk_parent, 'detail': detail}
+            outs = {}
+            for name, fn in (('legacy', legacy_score_joint), ('batched', score_joint)):
+                best = float('inf')
+                for _ in range(args.repeat):
+                    t0 = time.perf_counter()
+                    outs[name] = fn(V, parents, children, p_emb, c_emb, **kw)
+                    best = min(best, time.perf_counter() - t0)
+                row[f'{name}_titles_per_sec'] = round(args.titles / best, 1)
+            row['speedup'] = round(row['batched_titles_per_sec'] / row['legacy_titles_per_sec'], 2)
+            row['identical_labels'] = same_labels(outs['legacy'], outs['batched'])
+            report.append(row)
+    print(json.dumps(report, indent=2))
+    if not all(r['identical_labels'] for r in report):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,31 @@
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+
+# Ensure project root is on sys.path so 'tools'/'ml' are importable when running from tools/
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from tools.apply_titles import columnar_document
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Rebuild the titles_to_tag_map JSON document from an apply_titles.py --columnar result directory.')
+    ap.add_argument('--input', '-i', required=True, help='Columnar result directory (apply_titles.py --columnar --output)')
+    ap.add_argument('--output', '-o', required=True, help='Where to write the JSON document')
+    ap.add_argument('--output-format', choices=['pair-array', 'pair-string', 'object'], default=None, help='Per-title tag shape (default: the one the run was made with)')
+    ap.add_argument('--chunk-size', type=int, default=65536, help='Rows decoded per step')
+    args = ap.parse_args()
+
+    doc = columnar_document(args.input, args.output_format, args.chunk_size)
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(doc, f, ensure_ascii=False, indent=2)
+    print(args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -92,9 +92,14 @@ def normalize(data):
 
 def sort_taxonomy(obj: dict):
     obj['t0'] = sorted(obj['t0'], key=lambda x: x.get('id',''))
-    for p in obj['t0']:
-        if isinstance(p.get('t1'), list):
-            p['t1'] = sorted(p['t1'], key=lambda x: x.get('id',''))
+    # Children of a level-n node live under 't{n+1}' (t1, t2, ... for deep taxonomies)
+    def sort_children(nodes, level):
+        for node in nodes:
+            key = f't{level + 1}'
+            if isinstance(node.get(key), list):
+                node[key] = sorted(node[key], key=lambda x: x.get('id',''))
+                sort_children(node[key], level + 1)
+    sort_children(obj['t0'], 0)
     return obj
 
 def main():
@@ -103,6 +108,11 @@ def main():
     ap.add_argument('--output', '-o', default='ml/taxonomies/taxonomy.json', help='Destination JSON path')
     ap.add_argument('--no-sort', action='store_true', help='Disable sorting by id')
     ap.add_argument('--minify', action='store_true', help='Output compact JSON (no pretty indent)')
+    ap.add_argument('--compile', default=None, help='Also write a compiled binary taxonomy here (load it via apply_titles.py --taxonomy without parsing)')
+    ap.add_argument('--embed', default='', help='Comma-separated embedder keys whose label embeddings are stored in the compiled taxonomy')
+    # Same values as ml/src/models.BACKENDS, listed here so the plain conversion does not import numpy
+    ap.add_argument('--backend', choices=['torch', 'onnx', 'onnx-int8'], default='torch', help='Embedder runtime for --embed')
+    ap.add_argument('--cache-dir', default='ml/out', help='Label cache reused/filled by --embed')
     args = ap.parse_args()
 
     in_path = Path(args.input)
@@ -119,6 +129,13 @@ def main():
     else:
         out_path.write_text(json.dumps(norm, ensure_ascii=False, indent=2), encoding='utf-8')
     print(out_path)
+    if args.compile:
+        # Deferred: the plain conversion does not need numpy or the classifier
+        sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+        from tools.apply_titles import compile_taxonomy
+        embedders = [k.strip() for k in args.embed.split(',') if k.strip()]
+        compile_taxonomy(str(out_path), args.compile, embedders, backend=args.backend, cache_dir=args.cache_dir)
+        print(args.compile)
 
 if __name__ == '__main__':
     main()
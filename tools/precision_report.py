@@ -0,0 +1,113 @@
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+
+# Ensure project root is on sys.path so 'tools'/'ml' are importable when running from tools/
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from ml.src.models import BACKENDS
+from ml.src.quant import PRECISIONS, matmul_t, quantize
+from tools.apply_titles import DEFAULT_BEAM, encode_titles, load_label_set, load_titles, make_embedder, score_tags
+from tools.stub_embedder import StubEmbedder
+
+# Accuracy/size check for --precision. Titles and labels are encoded once per embedder at float32;
+# each reduced precision is then produced in memory with the same quantize() the caches use, so the
+# report isolates the effect of the storage format from cache state.
+
+# --stub: embedding width per model key, so offline runs quantize vectors of the real size
+STUB_DIMS = {'minilm': 384, 'mpnet': 768, 'e5': 768, 'me5': 768, 'me5large': 1024, 'multiminilm': 384, 'muse': 512}
+
+
+def _quantize_labels(labels, precision: str):
+    if len(labels) == 2:
+        levels, embs = labels
+        return levels, [quantize(e, precision) for e in embs]
+    parents, children, p_emb, c_emb = labels
+    return parents, children, quantize(p_emb, precision), quantize(c_emb, precision)
+
+
+def _label_bytes(labels) -> int:
+    mats = labels[1] if len(labels) == 2 else labels[2:]
+    return sum(int(m.nbytes) for m in mats)
+
+
+def _top_matrix(labels):
+    return labels[1][0] if len(labels) == 2 else labels[2]
+
+
+def compare_embedder(titles: List[str], model_key: str, args) -> Dict[str, Any]:
+    emb = StubEmbedder(name=model_key, dim=STUB_DIMS.get(model_key, 384)) if args.stub else make_embedder(model_key, args.backend, args.cache_dir, args.workers)
+    labels = load_label_set(args.taxonomy, model_key, emb, cache_dir=args.cache_dir)
+    V = encode_titles(titles, model_key, emb, args.cache_dir, not args.no_title_cache, args.title_cache_max_mb)
+    kw = dict(mode='zero-shot-joint', output_format='pair-array', alpha=args.alpha, topk_parent=args.topk_parent, beam=args.beam)
+    base = score_tags(V, labels, **kw)
+    base_scores = matmul_t(V, _top_matrix(labels))
+
+    out: Dict[str, Any] = {}
+    for precision in PRECISIONS:
+        q_labels = _quantize_labels(labels, precision)
+        t0 = time.perf_counter()
+        pairs = score_tags(V, q_labels, **kw)
+        seconds = time.perf_counter() - t0
+        n = max(1, len(titles))
+        out[precision] = {
+            'agree_t0': round(sum(a[0] == b[0] for a, b in zip(pairs, base)) / n, 4),
+            'agree_label': round(sum(a == b for a, b in zip(pairs, base)) / n, 4),
+            'max_abs_score_diff': float(np.max(np.abs(matmul_t(V, _top_matrix(q_labels)) - base_scores))) if base_scores.size else 0.0,
+            'label_bytes': _label_bytes(q_labels),
+            'title_bytes': int(quantize(V, precision).nbytes),
+            'score_seconds': round(seconds, 4),
+        }
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Compare float16/int8 label and title matrices against float32: top-1 agreement, score error and bytes.')
+    ap.add_argument('--input', '-i', default='ml/data/titles.json', help='Path to input JSON with titles')
+    ap.add_argument('--taxonomy', default='ml/taxonomies/taxonomy.json', help='Path to taxonomy file (JSON or YAML)')
+    ap.add_argument('--embedders', default='minilm', help='Comma-separated embedder keys')
+    ap.add_argument('--alpha', type=float, default=0.3)
+    ap.add_argument('--topk-parent', type=int, default=None)
+    ap.add_argument('--beam', type=int, default=DEFAULT_BEAM, help='Beam width for taxonomies deeper than t0/t1')
+    ap.add_argument('--backend', choices=list(BACKENDS), default='torch')
+    ap.add_argument('--workers', type=int, default=1)
+    ap.add_argument('--cache-dir', default='ml/out', help='Directory for label and title embedding caches')
+    ap.add_argument('--no-title-cache', action='store_true')
+    ap.add_argument('--title-cache-max-mb', type=int, default=1024)
+    ap.add_argument('--stub', action='store_true', help='Smoke check with the offline stub embedder (tools/stub_embedder.py) at each model\'s width; says nothing about real-model precision loss')
+    ap.add_argument('--min-agreement', type=float, default=None, help='Exit non-zero if any precision agrees with float32 on fewer than this share of labels')
+    ap.add_argument('--output', '-o', default=None, help='Write the JSON report here instead of stdout')
+    args = ap.parse_args()
+
+    _user_id, titles = load_titles(args.input)
+    titles = list(dict.fromkeys(titles))
+    report = {'titles': len(titles), 'stub': args.stub, 'embedders': {}}
+    for model_key in [k.strip() for k in args.embedders.split(',') if k.strip()]:
+        report['embedders'][model_key] = compare_embedder(titles, model_key, args)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+        print(args.output)
+    else:
+        print(text)
+
+    if args.min_agreement is not None:
+        worst = min(r['agree_label'] for e in report['embedders'].values() for r in e.values())
+        if worst < args.min_agreement:
+            print(f'agreement {worst:.4f} below --min-agreement {args.min_agreement}', file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
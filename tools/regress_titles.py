@@ -0,0 +1,179 @@
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import yaml
+
+# Ensure project root is on sys.path so 'tools'/'ml' are importable when running from tools/
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from ml.src.profiling import Profiler, peak_rss_mb
+from tools.apply_titles import load_titles, predict_titles, tag_pair
+
+# Accuracy-vs-speed regression check. Runs predict_titles for every setting in a matrix
+# (ml/configs/regression.yaml), compares t0/t1 with a reference labelling and reports titles/sec,
+# peak RSS, agreement and the parents where runs disagree most. Each run gets a fresh process, so
+# peak RSS covers that run only and no model or cache state leaks between runs. Exit code 1 when
+# any run's agreement is below its threshold.
+
+# Matrix keys -> predict_titles keyword arguments
+RUN_KEYS = {
+    'embedder': 'embedder_key',
+    'precision': 'precision',
+    'backend': 'backend',
+    'alpha': 'alpha',
+    'topk_parent': 'topk_parent',
+    'beam': 'beam',
+    'workers': 'workers',
+    'cascade_embedder': 'cascade_embedder',
+    'cascade_margin': 'cascade_margin',
+}
+
+
+def expand_runs(cfg: Dict[str, Any]) -> List[Dict[str, Any]]:
+    matrix = cfg.get('matrix') or {}
+    unknown = set(matrix).union(*[set(r) for r in cfg.get('include') or []]) - set(RUN_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown run settings in regression config: {sorted(unknown)}")
+    keys = list(matrix)
+    runs = [dict(zip(keys, values)) for values in itertools.product(*[matrix[k] for k in keys])]
+    defaults = {k: v[0] for k, v in matrix.items() if v}
+    runs.extend({**defaults, **extra} for extra in cfg.get('include') or [])
+    return runs
+
+
+def run_one(job: Tuple[Dict[str, Any], Dict[str, Any], List[str]]) -> Dict[str, Any]:
+    # Runs in a fresh worker process (see main)
+    cfg, run, titles = job
+    profiler = Profiler()
+    kwargs = {RUN_KEYS[k]: v for k, v in run.items()}
+    t0 = time.perf_counter()
+    mapping = predict_titles(titles, cfg.get('mode', 'zero-shot-joint'), '', cfg['taxonomy'], cache_dir=cfg.get('cache_dir', 'ml/out'), title_cache=cfg.get('title_cache', False), profiler=profiler, **kwargs)
+    seconds = time.perf_counter() - t0
+    stages = profiler.summary()['stages']
+    # Throughput over encode + score only; model load and label caching are reported separately
+    work = sum(stages.get(s, {}).get('wall_s', 0.0) for s in ('encode', 'score')) - stages.get('model_load', {}).get('wall_s', 0.0)
+    return {
+        'mapping': {t: tag_pair(tag) or (None, None) for t, tag in mapping.items()},
+        'seconds': round(seconds, 4),
+        'model_load_s': round(stages.get('model_load', {}).get('wall_s', 0.0), 4),
+        'titles_per_sec': round(len(titles) / work, 1) if work > 0 else None,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def compare(mapping: Dict[str, Tuple], reference: Dict[str, Tuple], hotspots: int) -> Dict[str, Any]:
+    common = [t for t in reference if t in mapping]
+    n = max(1, len(common))
+    per_parent: Dict[str, Dict[str, Any]] = {}
+    for t in common:
+        ref, got = reference[t], mapping[t]
+        p = per_parent.setdefault(ref[0], {'titles': 0, 't0_miss': 0, 't1_miss': 0, 'confused_with': Counter()})
+        p['titles'] += 1
+        if got[0] != ref[0]:
+            p['t0_miss'] += 1
+        if got != ref:
+            p['t1_miss'] += 1
+            p['confused_with'][' > '.join(x for x in got if x)] += 1
+    worst = sorted(per_parent.items(), key=lambda kv: (-kv[1]['t1_miss'], kv[0]))
+    return {
+        'titles': len(common),
+        'missing': len(reference) - len(common),
+        't0': round(sum(mapping[t][0] == reference[t][0] for t in common) / n, 4),
+        't1': round(sum(mapping[t] == reference[t] for t in common) / n, 4),
+        'hotspots': [{
+            't0': name,
+            'titles': p['titles'],
+            't0_agreement': round(1 - p['t0_miss'] / p['titles'], 4),
+            't1_agreement': round(1 - p['t1_miss'] / p['titles'], 4),
+            'confused_with': dict(p['confused_with'].most_common(3)),
+        } for name, p in worst[:hotspots] if p['t1_miss']],
+    }
+
+
+def thresholds_for(cfg: Dict[str, Any], run: Dict[str, Any]) -> Dict[str, float]:
+    return {**(cfg.get('thresholds') or {}), **((cfg.get('embedder_thresholds') or {}).get(run.get('embedder')) or {})}
+
+
+def _label(run: Dict[str, Any]) -> str:
+    return ' '.join(f'{k}={v}' for k, v in run.items())
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Run a matrix of classification settings against a reference labelling; report speed, memory and t0/t1 agreement, and fail on agreement regressions.')
+    ap.add_argument('--config', '-c', default='ml/configs/regression.yaml', help='Regression matrix and thresholds (YAML)')
+    ap.add_argument('--input', '-i', default=None, help='Override the config input titles')
+    ap.add_argument('--reference', default=None, help='Override the config reference labelling')
+    ap.add_argument('--taxonomy', default=None, help='Override the config taxonomy')
+    ap.add_argument('--cache-dir', default=None, help='Override the config cache directory')
+    ap.add_argument('--only', default=None, help='Comma-separated key=value filters, e.g. precision=int8,backend=torch')
+    ap.add_argument('--output', '-o', default=None, help='Write the JSON report here instead of stdout')
+    args = ap.parse_args()
+
+    with open(args.config, 'r', encoding='utf-8') as f:
+        cfg = yaml.safe_load(f) or {}
+    for key in ('input', 'reference', 'taxonomy', 'cache_dir'):
+        if getattr(args, key) is not None:
+            cfg[key] = getattr(args, key)
+    runs = expand_runs(cfg)
+    if args.only:
+        wanted = dict(kv.split('=', 1) for kv in args.only.split(','))
+        runs = [r for r in runs if all(str(r.get(k)) == v for k, v in wanted.items())]
+
+    _user_id, titles = load_titles(cfg['input'])
+    titles = list(dict.fromkeys(titles))
+    with open(cfg['reference'], 'r', encoding='utf-8') as f:
+        ref_doc = json.load(f)
+    reference = {t: tag_pair(tag) or (None, None) for t, tag in ref_doc['titles_to_tag_map'].items()}
+
+    report: Dict[str, Any] = {
+        'titles': len(titles),
+        'reference': {'path': cfg['reference'], **{k: v for k, v in ref_doc.items() if k not in ('titles_to_tag_map', 'user_id')}},
+        'runs': [],
+    }
+    failures: List[str] = []
+    # One fresh process per run: peak RSS is per run and loaded models do not accumulate
+    ctx = multiprocessing.get_context('spawn')
+    for run in runs:
+        with ctx.Pool(1) as pool:
+            try:
+                res = pool.apply(run_one, ((cfg, run, titles),))
+            except Exception as e:
+                report['runs'].append({'settings': run, 'error': f'{type(e).__name__}: {e}'})
+                failures.append(f'{_label(run)}: {type(e).__name__}: {e}')
+                print(f'{_label(run)}: failed ({e})', file=sys.stderr)
+                continue
+        agreement = compare(res.pop('mapping'), reference, int(cfg.get('hotspots', 5)))
+        limits = thresholds_for(cfg, run)
+        failed = [k for k, v in limits.items() if agreement[k] < v]
+        report['runs'].append({'settings': run, **res, 'agreement': agreement, 'thresholds': limits, 'passed': not failed})
+        for k in failed:
+            failures.append(f'{_label(run)}: {k} agreement {agreement[k]:.4f} < {limits[k]}')
+        print(f"{_label(run)}: t0 {agreement['t0']:.3f} t1 {agreement['t1']:.3f}, {res['titles_per_sec']} titles/s, peak {res['peak_rss_mb']} MB{' FAIL' if failed else ''}", file=sys.stderr)
+    report['failures'] = failures
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+        print(args.output)
+    else:
+        print(text)
+    if failures:
+        for line in failures:
+            print(line, file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,308 @@
+import argparse
+import json
+import os
+import queue
+import socketserver
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List
+
+# Ensure project root is on sys.path so 'tools'/'ml' are importable when running from tools/
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+import numpy as np
+
+from ml.src.models import BACKENDS
+from ml.src.quant import PRECISIONS
+from tools.apply_titles import encode_titles, load_label_set, make_embedder, predict_titles, run_metadata, taxonomy_fingerprint
+
+# Warm local classification service.
+#   POST /classify  {"titles": [...], "embedder"?, "mode"?, "alpha"?, "topk_parent"?, "beam"?, "output_format"?, "detail"?, "topk_children"?, "user_id"?}
+#                   -> same document shape as tools/apply_titles.py output
+#   POST /reload    {"taxonomy"?} -> re-reads label embeddings for every resident model if the taxonomy fingerprint changed
+#   GET  /health    -> resident models + taxonomy fingerprint
+# One Embedder and one label tuple stay resident per model key; concurrent /classify requests for the
+# same model are micro-batched into a single encode call.
+
+REQUEST_DEFAULTS = {
+    'mode': 'zero-shot-joint',
+    'alpha': 0.3,
+    'topk_parent': None,
+    'output_format': 'pair-array',
+    'detail': False,
+    'topk_children': 10,
+    'beam': None,
+}
+
+
+class _Pending:
+    def __init__(self, titles: List[str], opts: Dict[str, Any]):
+        self.titles = titles
+        self.opts = opts
+        self.done = threading.Event()
+        self.result = None
+        self.error: Exception | None = None
+
+
+class ModelSlot:
+    def __init__(self, service: 'ClassifierService', model_key: str):
+        self.service = service
+        self.model_key = model_key
+        self.embedder = make_embedder(model_key, service.backend, service.cache_dir)
+        # Guards the embedder (lazy model load, ONNX session) and the labels/fingerprint pair
+        self.lock = threading.Lock()
+        self.labels = None
+        self.fingerprint = None
+        self.load_labels()
+        self.queue: 'queue.Queue[_Pending]' = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name=f'batcher-{model_key}', daemon=True)
+        self.thread.start()
+
+    def load_labels(self) -> bool:
+        # Check, load and swap under the slot lock: label encoding never overlaps the batcher's encode
+        # on the shared embedder, and concurrent reloads of a changed taxonomy load it once
+        with self.lock:
+            fp = taxonomy_fingerprint(self.service.taxonomy_path)
+            if fp == self.fingerprint:
+                return False
+            self.labels = load_label_set(self.service.taxonomy_path, self.model_key, self.embedder, cache_dir=self.service.cache_dir, precision=self.service.precision)
+            self.fingerprint = fp
+        return True
+
+    def submit(self, titles: List[str], opts: Dict[str, Any]):
+        item = _Pending(titles, opts)
+        self.queue.put(item)
+        item.done.wait()
+        if item.error is not None:
+            raise item.error
+        return item.result
+
+    def _collect(self) -> List[_Pending]:
+        # Block for the first request, then gather whatever arrives within the batch window
+        batch = [self.queue.get()]
+        size = len(batch[0].titles)
+        deadline = time.monotonic() + self.service.batch_window
+        while size < self.service.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self.queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(item)
+            size += len(item.titles)
+        return batch
+
+    def _run(self):
+        svc = self.service
+        while True:
+            batch = self._collect()
+            try:
+                unique = list(dict.fromkeys(t for item in batch for t in item.titles))
+                with self.lock:
+                    labels = self.labels
+                    V = encode_titles(unique, self.model_key, self.embedder, svc.cache_dir, svc.title_cache, svc.title_cache_mb, precision=svc.precision) if unique else None
+                row = {t: i for i, t in enumerate(unique)}
+            except Exception as e:
+                for item in batch:
+                    item.error = e
+                    item.done.set()
+                continue
+            for item in batch:
+                if not item.titles:
+                    item.result = {}
+                    item.done.set()
+                    continue
+                try:
+                    rows = np.fromiter((row[t] for t in item.titles), dtype=np.int64, count=len(item.titles))
+                    item.result = predict_titles(
+                        item.titles,
+                        item.opts['mode'],
+                        '',
+                        svc.taxonomy_path,
+                        alpha=item.opts['alpha'],
+                        topk_parent=item.opts['topk_parent'],
+                        output_format=item.opts['output_format'],
+                        embedder_key=self.model_key,
+                        detail=item.opts['detail'],
+                        topk_children=item.opts['topk_children'],
+                        beam=item.opts['beam'],
+                        precision=svc.precision,
+                        embedder=self.embedder,
+                        labels=labels,
+                        vectors=V[rows],
+                    )
+                except Exception as e:
+                    item.error = e
+                item.done.set()
+
+
+class ClassifierService:
+    def __init__(self, taxonomy_path: str, cache_dir: str = 'ml/out', title_cache: bool = True, title_cache_mb: int = 1024, batch_window_ms: float = 5.0, max_batch: int = 4096, backend: str = 'torch', precision: str = 'float32'):
+        self.taxonomy_path = taxonomy_path
+        self.backend = backend
+        self.precision = precision
+        self.cache_dir = cache_dir
+        self.title_cache = title_cache
+        self.title_cache_mb = title_cache_mb
+        self.batch_window = batch_window_ms / 1000.0
+        self.max_batch = max_batch
+        self._slots: Dict[str, ModelSlot] = {}
+        self._loading: Dict[str, Future] = {}
+        self._slots_lock = threading.Lock()
+
+    def slot(self, model_key: str) -> ModelSlot:
+        # A new slot is built outside _slots_lock (its label set may have to be encoded), so health,
+        # reload and other models stay responsive; concurrent requests for the key wait on one future
+        with self._slots_lock:
+            s = self._slots.get(model_key)
+            if s is not None:
+                return s
+            pending = self._loading.get(model_key)
+            if pending is None:
+                pending = self._loading[model_key] = Future()
+                owner = True
+            else:
+                owner = False
+        if not owner:
+            return pending.result()
+        try:
+            s = ModelSlot(self, model_key)
+        except BaseException as e:
+            with self._slots_lock:
+                del self._loading[model_key]
+            pending.set_exception(e)
+            raise
+        with self._slots_lock:
+            self._slots[model_key] = s
+            del self._loading[model_key]
+        pending.set_result(s)
+        return s
+
+    def classify(self, payload: Dict[str, Any], default_embedder: str) -> Dict[str, Any]:
+        titles = payload.get('titles')
+        if not isinstance(titles, list) or not all(isinstance(t, str) for t in titles):
+            raise ValueError("Expected 'titles' to be a list of strings")
+        opts = {k: payload.get(k, v) for k, v in REQUEST_DEFAULTS.items()}
+        if opts['mode'] not in ('zero-shot', 'zero-shot-joint'):
+            raise ValueError(f"Unsupported mode {opts['mode']!r}")
+        model_key = payload.get('embedder') or default_embedder
+        mapping = self.slot(model_key).submit(titles, opts)
+        return {
+            'user_id': payload.get('user_id', ''),
+            'titles_to_tag_map': mapping,
+            **run_metadata(opts['mode'], opts['alpha'], opts['topk_parent'], model_key, self.backend, opts['detail'], opts['topk_children'], opts['beam'], self.precision),
+        }
+
+    def reload(self, taxonomy_path: str | None = None) -> Dict[str, Any]:
+        if taxonomy_path:
+            self.taxonomy_path = taxonomy_path
+        with self._slots_lock:
+            slots = list(self._slots.values())
+        reloaded = [s.model_key for s in slots if s.load_labels()]
+        return {'taxonomy': self.taxonomy_path, 'fingerprint': taxonomy_fingerprint(self.taxonomy_path), 'reloaded': reloaded}
+
+    def health(self) -> Dict[str, Any]:
+        with self._slots_lock:
+            models = {k: {'fingerprint': s.fingerprint, 'queued': s.queue.qsize()} for k, s in self._slots.items()}
+            loading = sorted(self._loading)
+        return {'taxonomy': self.taxonomy_path, 'models': models, 'loading': loading}
+
+
+def make_handler(service: ClassifierService, default_embedder: str):
+    class Handler(BaseHTTPRequestHandler):
+        def address_string(self):
+            # Unix sockets have no (host, port) client address
+            return self.client_address[0] if isinstance(self.client_address, tuple) and self.client_address else 'unix'
+
+        def _reply(self, status: int, obj: Dict[str, Any]):
+            body = json.dumps(obj, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _payload(self) -> Dict[str, Any]:
+            length = int(self.headers.get('Content-Length') or 0)
+            if not length:
+                return {}
+            data = json.loads(self.rfile.read(length).decode('utf-8'))
+            if not isinstance(data, dict):
+                raise ValueError('Expected a JSON object body')
+            return data
+
+        def do_GET(self):
+            if self.path == '/health':
+                self._reply(200, service.health())
+            else:
+                self._reply(404, {'error': f'Unknown path {self.path}'})
+
+        def do_POST(self):
+            try:
+                payload = self._payload()
+                if self.path == '/classify':
+                    self._reply(200, service.classify(payload, default_embedder))
+                elif self.path == '/reload':
+                    self._reply(200, service.reload(payload.get('taxonomy')))
+                else:
+                    self._reply(404, {'error': f'Unknown path {self.path}'})
+            except (ValueError, KeyError, FileNotFoundError) as e:
+                self._reply(400, {'error': str(e)})
+            except Exception as e:
+                self._reply(500, {'error': f'{type(e).__name__}: {e}'})
+
+    return Handler
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Serve zero-shot title classification from a warm local process (HTTP on localhost or a Unix socket).')
+    ap.add_argument('--taxonomy', default='ml/taxonomies/taxonomy.json', help='Path to taxonomy file (JSON or YAML)')
+    ap.add_argument('--embedder', default='minilm', help='Default embedder key; requests may name another (loaded on first use)')
+    ap.add_argument('--backend', choices=list(BACKENDS), default='torch', help='Embedder runtime for every resident model')
+    ap.add_argument('--precision', choices=list(PRECISIONS), default='float32', help='Storage/scoring precision for resident label matrices and title vectors')
+    ap.add_argument('--preload', default='', help='Comma-separated embedder keys to load at startup (default: --embedder)')
+    ap.add_argument('--host', default='127.0.0.1')
+    ap.add_argument('--port', type=int, default=8765)
+    ap.add_argument('--unix', default=None, help='Listen on this Unix socket path instead of TCP')
+    ap.add_argument('--cache-dir', default='ml/out', help='Directory for label and title embedding caches')
+    ap.add_argument('--no-title-cache', action='store_true', help='Do not use the persistent title embedding store')
+    ap.add_argument('--title-cache-max-mb', type=int, default=1024)
+    ap.add_argument('--batch-window-ms', type=float, default=5.0, help='How long the batcher waits for more requests before encoding')
+    ap.add_argument('--max-batch', type=int, default=4096, help='Upper bound on titles per micro-batch')
+    args = ap.parse_args()
+
+    service = ClassifierService(args.taxonomy, args.cache_dir, not args.no_title_cache, args.title_cache_max_mb, args.batch_window_ms, args.max_batch, args.backend, args.precision)
+    for key in [k.strip() for k in (args.preload or args.embedder).split(',') if k.strip()]:
+        service.slot(key)
+    handler = make_handler(service, args.embedder)
+    if args.unix:
+        if os.path.exists(args.unix):
+            os.remove(args.unix)
+        server = ThreadingUnixHTTPServer(args.unix, handler)
+        where = args.unix
+    else:
+        server = ThreadingHTTPServer((args.host, args.port), handler)
+        where = f'http://{args.host}:{args.port}'
+    print(f'Serving title classification on {where}', flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
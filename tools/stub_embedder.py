@@ -0,0 +1,43 @@
+import hashlib
+from typing import List
+
+import numpy as np
+
+# Used by tools/bench_pipeline.py and the tests; the classifier tools never import it.
+
+
+class StubEmbedder:
+    # Deterministic, offline stand-in for Embedder (benchmarks / smoke runs): each token maps to a
+    # fixed pseudo-random vector seeded by its hash, a text is the L2-normalized sum of its tokens.
+    backend = 'stub'
+
+    def __init__(self, name: str = 'stub', dim: int = 384, chunk: int = 4096):
+        self.name = name
+        self.dim = dim
+        self.chunk = chunk
+        self._ids: dict = {}
+        self._table = np.zeros((0, dim), dtype=np.float32)
+
+    def _token_ids(self, toks: List[str]) -> List[int]:
+        new = [t for t in dict.fromkeys(toks) if t not in self._ids]
+        if new:
+            rows = []
+            for t in new:
+                seed = int.from_bytes(hashlib.blake2b(t.encode('utf-8'), digest_size=8).digest(), 'little')
+                rows.append(np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32))
+                self._ids[t] = len(self._ids)
+            self._table = np.concatenate([self._table, np.stack(rows)])
+        return [self._ids[t] for t in toks]
+
+    def load(self):
+        return self
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        out = np.empty((len(texts), self.dim), dtype=np.float32)
+        for s in range(0, len(texts), self.chunk):
+            split = [t.lower().split() or [''] for t in texts[s:s + self.chunk]]
+            ids = self._token_ids([tok for toks in split for tok in toks])
+            starts = np.cumsum([0] + [len(toks) for toks in split[:-1]])
+            out[s:s + len(split)] = np.add.reduceat(self._table[ids], starts, axis=0)
+        out /= np.clip(np.linalg.norm(out, axis=1, keepdims=True), 1e-12, None)
+        return out
@@ -0,0 +1,158 @@
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+# Ensure project root is on sys.path so 'tools'/'ml' are importable when running from tools/
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from ml.src.models import BACKENDS
+from tools.apply_titles import combine_joint_scores, encode_titles, get_cached_label_embeddings, joint_argmax, load_titles, make_embedder
+
+# Grid search over alpha x topk_parent (x embedder) for zero-shot-joint.
+# Titles and labels are encoded once per embedder and p_scores/c_scores are computed once per
+# chunk of titles; each configuration only re-runs the cheap combine + argmax step.
+# Labels are reported as integer codes into one shared [t0, t1] table so configs (and embedders)
+# can be compared directly.
+
+
+def _float_list(s: str) -> List[float]:
+    return [float(x) for x in s.split(',') if x.strip()]
+
+
+def _topk_list(s: str) -> List[int | None]:
+    # 'none' (or 0) means no parent restriction
+    out: List[int | None] = []
+    for x in s.split(','):
+        x = x.strip().lower()
+        if x:
+            out.append(None if x in ('none', '0') else int(x))
+    return out
+
+
+class LabelTable:
+    def __init__(self):
+        self.labels: List[Tuple[str, str | None]] = []
+        self._index: Dict[Tuple[str, str | None], int] = {}
+
+    def code(self, t0: str, t1: str | None) -> int:
+        key = (t0, t1)
+        c = self._index.get(key)
+        if c is None:
+            c = self._index[key] = len(self.labels)
+            self.labels.append(key)
+        return c
+
+
+def sweep_embedder(titles: List[str], model_key: str, configs: List[Tuple[float, int | None]], table: LabelTable, args) -> List[np.ndarray]:
+    emb = make_embedder(model_key, args.backend, args.cache_dir, args.workers)
+    parents, children, p_emb, c_emb = get_cached_label_embeddings(args.taxonomy, model_key, emb, cache_dir=args.cache_dir)
+    if not children:
+        raise ValueError('Sweeps need a taxonomy with t1 children (alpha/topk_parent have no effect otherwise)')
+    V = encode_titles(titles, model_key, emb, args.cache_dir, not args.no_title_cache, args.title_cache_max_mb)
+    # Embedder-local child / parent-fallback indices -> shared label codes
+    child_codes = np.array([table.code(c['p_en'], c['en']) for c in children], dtype=np.int32)
+    parent_codes = np.array([table.code(p['en'], None) for p in parents], dtype=np.int32)
+    child_pidx = np.array([c['p_index'] for c in children], dtype=np.int64)
+    p_emb, c_emb = np.asarray(p_emb), np.asarray(c_emb)
+
+    codes = [np.empty(len(titles), dtype=np.int32) for _ in configs]
+    for start in range(0, len(titles), args.score_chunk):
+        Vc = V[start:start + args.score_chunk]
+        p_scores = Vc @ p_emb.T
+        c_scores = Vc @ c_emb.T
+        for out, (alpha, topk_parent) in zip(codes, configs):
+            combined = combine_joint_scores(p_scores, c_scores, child_pidx, alpha, topk_parent)
+            best, valid, best_parent = joint_argmax(p_scores, combined)
+            out[start:start + len(Vc)] = np.where(valid, child_codes[best], parent_codes[best_parent])
+    return codes
+
+
+def agreement_stats(codes: List[np.ndarray], t0_of: np.ndarray) -> Dict[str, Any]:
+    k = len(codes)
+    C = np.stack(codes)  # [K, N]
+    T0 = t0_of[C]
+    pair = np.ones((k, k))
+    pair_t0 = np.ones((k, k))
+    for i, j in itertools.combinations(range(k), 2):
+        pair[i, j] = pair[j, i] = float(np.mean(C[i] == C[j])) if C.shape[1] else 1.0
+        pair_t0[i, j] = pair_t0[j, i] = float(np.mean(T0[i] == T0[j])) if C.shape[1] else 1.0
+    # Per title: share of configs that agree with the most common label
+    majority = np.zeros(C.shape[1])
+    for i in range(k):
+        np.maximum(majority, (C == C[i]).sum(axis=0) / k, out=majority)
+    return {
+        'pairwise_label': np.round(pair, 4).tolist(),
+        'pairwise_t0': np.round(pair_t0, 4).tolist(),
+        'unanimous_titles': int(np.sum(majority == 1.0)),
+        'mean_majority_share': round(float(majority.mean()), 4) if majority.size else None,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Sweep alpha/topk_parent (and embedders) for zero-shot-joint, encoding titles and labels once per embedder.')
+    ap.add_argument('--input', '-i', default='ml/data/titles.json', help='Path to input JSON with titles')
+    ap.add_argument('--output', '-o', default='ml/out/sweep.json', help='Where to write the sweep report')
+    ap.add_argument('--taxonomy', default='ml/taxonomies/taxonomy.json', help='Path to taxonomy file (JSON or YAML)')
+    ap.add_argument('--embedders', default='minilm', help='Comma-separated embedder keys')
+    ap.add_argument('--alphas', type=_float_list, default=[0.0, 0.1, 0.2, 0.3, 0.5, 0.7], help='Comma-separated alpha values')
+    ap.add_argument('--topk-parents', type=_topk_list, default=[None, 3, 5, 8], help="Comma-separated topk_parent values ('none' = unrestricted)")
+    ap.add_argument('--backend', choices=list(BACKENDS), default='torch')
+    ap.add_argument('--workers', type=int, default=1)
+    ap.add_argument('--cache-dir', default='ml/out', help='Directory for label and title embedding caches')
+    ap.add_argument('--no-title-cache', action='store_true')
+    ap.add_argument('--title-cache-max-mb', type=int, default=1024)
+    ap.add_argument('--score-chunk', type=int, default=65536, help='Titles per scoring chunk (bounds the [N, C] matrices)')
+    ap.add_argument('--no-codes', action='store_true', help='Omit the per-title label codes from the report (stats only)')
+    args = ap.parse_args()
+
+    user_id, titles = load_titles(args.input)
+    titles = list(dict.fromkeys(titles))
+    configs = list(itertools.product(args.alphas, args.topk_parents))
+    table = LabelTable()
+    results: List[Dict[str, Any]] = []
+    all_codes: List[np.ndarray] = []
+    for model_key in [k.strip() for k in args.embedders.split(',') if k.strip()]:
+        t0 = time.perf_counter()
+        codes = sweep_embedder(titles, model_key, configs, table, args)
+        seconds = time.perf_counter() - t0
+        for (alpha, topk_parent), c in zip(configs, codes):
+            results.append({'embedder': model_key, 'alpha': alpha, 'topk_parent': topk_parent, 'codes': c})
+        all_codes.extend(codes)
+        print(f'{model_key}: {len(configs)} configs over {len(titles)} titles in {seconds:.2f}s', file=sys.stderr)
+
+    t0_table = LabelTable()
+    t0_of = np.array([t0_table.code(t0, None) for t0, _t1 in table.labels], dtype=np.int32)
+    for r in results:
+        c = r.pop('codes')
+        counts = np.bincount(c, minlength=len(table.labels))
+        r['distinct_labels'] = int(np.count_nonzero(counts))
+        r['parent_only'] = int(sum(counts[i] for i, (_t0, t1) in enumerate(table.labels) if t1 is None))
+        r['top_labels'] = [[*table.labels[i], int(counts[i])] for i in np.argsort(-counts, kind='stable')[:5] if counts[i]]
+        r['agree_with_first'] = round(float(np.mean(c == all_codes[0])), 4) if len(c) else None
+        if not args.no_codes:
+            r['codes'] = c.tolist()
+
+    report = {
+        'user_id': user_id,
+        'titles': titles if not args.no_codes else len(titles),
+        'labels': [list(l) for l in table.labels],
+        'configs': results,
+        'agreement': agreement_stats(all_codes, t0_of),
+    }
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False)
+    print(args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+# Ensure project root is on sys.path so 'tools'/'ml' are importable when running from tools/
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from ml.src.analytics import TopicState
+from ml.src.embed_store import normalize_text
+from tools.apply_titles import columnar_document, stream_events, tag_pair
+
+# Usage analytics from event exports. Raw exports (local-events.json, or .jsonl) are joined with a
+# classification of their titles (apply_titles.py JSON document or --columnar directory; events
+# written by apply_titles.py --events carry their own "tags"). Counts accumulate in --state, so
+# each run only reads exports that are new or changed and only counts events not seen before.
+
+
+def load_tag_map(path: str) -> Dict[str, Tuple[str, str]]:
+    # normalized title -> (t0, t1)
+    if os.path.isdir(path):
+        doc = columnar_document(path)
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            doc = json.load(f)
+    out: Dict[str, Tuple[str, str]] = {}
+    for title, tag in doc['titles_to_tag_map'].items():
+        pair = tag_pair(tag)
+        if pair is not None:
+            out[normalize_text(title)] = pair
+    return out
+
+
+def _export_paths(patterns: List[str]) -> List[str]:
+    paths: List[str] = []
+    for pattern in patterns:
+        found = sorted(glob.glob(pattern))
+        paths.extend(found if found else [pattern])
+    return [os.path.abspath(p) for p in dict.fromkeys(paths)]
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Per-day/week topic distributions, shorts vs feed shares and topic drift from classified event exports; incremental across runs.')
+    ap.add_argument('--events', '-e', nargs='+', required=True, help='Event exports (local-events.json arrays, .jsonl, or apply_titles.py --events output); globs allowed')
+    ap.add_argument('--tags', '-t', default=None, help='Classification of the titles: apply_titles.py JSON document or --columnar directory')
+    ap.add_argument('--state', default='ml/out/analytics_state.npz', help='Accumulated counts; updated in place')
+    ap.add_argument('--restart', action='store_true', help='Ignore the existing state and rebuild from the given exports')
+    ap.add_argument('--period', choices=['day', 'week'], default='day')
+    ap.add_argument('--level', choices=['t0', 't1'], default='t0', help='Report parents or parent > child pairs')
+    ap.add_argument('--window-days', type=int, default=7, help='Drift: last N days against the N days before')
+    ap.add_argument('--top', type=int, default=10, help='Topics listed per period / movers listed')
+    ap.add_argument('--utc-offset-minutes', type=int, default=0, help='Shift day boundaries to local time (fixed per state)')
+    ap.add_argument('--output', '-o', default=None, help='Write the JSON report here instead of stdout')
+    args = ap.parse_args()
+
+    state = TopicState(args.utc_offset_minutes) if args.restart else TopicState.load(args.state, args.utc_offset_minutes)
+    tag_map = load_tag_map(args.tags) if args.tags else {}
+
+    def tag_for(ev: Dict[str, Any]):
+        if 'tags' in ev:
+            return tag_pair(ev['tags'])
+        return tag_map.get(normalize_text(ev['title']))
+
+    t0 = time.perf_counter()
+    updates: List[Dict[str, Any]] = []
+    for path in _export_paths(args.events):
+        st = os.stat(path)
+        sig = [st.st_size, st.st_mtime_ns]
+        if state.file_done(path, sig):
+            updates.append({'input': path, 'skipped': True})
+            continue
+        stats = state.add_events(stream_events(path), tag_for)
+        # Files with unclassified events are re-read next time, when their tags may exist
+        if not stats['unclassified']:
+            state.files[path] = sig
+        updates.append({'input': path, **stats})
+        print(f"{Path(path).name}: {stats['added']} new events, {stats['duplicates']} already counted, {stats['unclassified']} unclassified", file=sys.stderr)
+    update_s = time.perf_counter() - t0
+    state.save(args.state)
+
+    t0 = time.perf_counter()
+    report = state.report(args.period, args.level, args.window_days, args.top)
+    report['update'] = {'seconds': round(update_s, 4), 'report_seconds': round(time.perf_counter() - t0, 4), 'files': updates}
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+        print(args.output)
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()